@@ -0,0 +1,236 @@
+"""
+Control de admisión delante del pool de conexiones a la base de datos.
+
+Middleware ASGI que, por clase de ruta (lecturas / escrituras / exportaciones):
+- limita la concurrencia con una cola de espera acotada por un presupuesto de latencia
+  (si la espera estimada lo supera, rechaza de inmediato con 503 y Retry-After);
+- aplica token buckets global y por cliente (429 y Retry-After al agotarse).
+
+Cada clase tiene límites independientes, de modo que una ráfaga de lecturas
+masivas no deja sin capacidad a las escrituras. Las exportaciones (/exportar)
+mantienen el cupo de concurrencia mientras dura el stream, por eso van en una
+clase propia y no ocupan los cupos de las lecturas.
+
+Los límites por cliente usan el header ADMISION_HEADER_CLIENTE o, sin él, la IP
+de origen: detrás de un proxy o NAT todos los clientes sin header comparten IP
+(y bucket), y el header lo elige el cliente, así que no es una autenticación.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+
+def _entorno(nombre: str, defecto: float) -> float:
+    return float(os.getenv(nombre, str(defecto)))
+
+ADMISION_HABILITADA = os.getenv("ADMISION_HABILITADA", "1") == "1"
+
+# Header que identifica al cliente; sin él se usa la IP de origen
+ADMISION_HEADER_CLIENTE = os.getenv("ADMISION_HEADER_CLIENTE", "X-API-Key").lower().encode()
+
+# Máximo de clientes con token bucket propio en memoria (LRU)
+ADMISION_MAX_CLIENTES = int(os.getenv("ADMISION_MAX_CLIENTES", "10000"))
+
+# Límites por clase de ruta (0 deshabilita el límite correspondiente)
+LIMITES = {
+    "lectura": {
+        "concurrencia": int(_entorno("ADMISION_LECTURAS_CONCURRENCIA", 10)),
+        "presupuesto": _entorno("ADMISION_LECTURAS_PRESUPUESTO_MS", 500) / 1000,
+        "tasa_global": _entorno("ADMISION_LECTURAS_TASA_GLOBAL", 500),
+        "tasa_cliente": _entorno("ADMISION_LECTURAS_TASA_CLIENTE", 50),
+    },
+    "escritura": {
+        "concurrencia": int(_entorno("ADMISION_ESCRITURAS_CONCURRENCIA", 5)),
+        "presupuesto": _entorno("ADMISION_ESCRITURAS_PRESUPUESTO_MS", 1000) / 1000,
+        "tasa_global": _entorno("ADMISION_ESCRITURAS_TASA_GLOBAL", 100),
+        "tasa_cliente": _entorno("ADMISION_ESCRITURAS_TASA_CLIENTE", 10),
+    },
+    "exportacion": {
+        "concurrencia": int(_entorno("ADMISION_EXPORTACIONES_CONCURRENCIA", 2)),
+        "presupuesto": _entorno("ADMISION_EXPORTACIONES_PRESUPUESTO_MS", 0) / 1000,
+        "tasa_global": _entorno("ADMISION_EXPORTACIONES_TASA_GLOBAL", 5),
+        "tasa_cliente": _entorno("ADMISION_EXPORTACIONES_TASA_CLIENTE", 1),
+    },
+}
+
+class TokenBucket:
+    """Token bucket con ráfaga igual al doble de la tasa por segundo."""
+
+    def __init__(self, tasa: float):
+        self.tasa = tasa
+        self.capacidad = max(tasa * 2, 1.0)
+        self.tokens = self.capacidad
+        self.ultimo = time.monotonic()
+
+    def consumir(self) -> float:
+        """Consumir un token; devuelve 0 si se admitió o los segundos hasta el próximo token."""
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+        self.ultimo = ahora
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.tasa
+
+    def devolver(self):
+        """Reintegrar un token consumido por una request que finalmente se rechazó."""
+        self.tokens = min(self.capacidad, self.tokens + 1)
+
+class LimiteConcurrencia:
+    """
+    Semáforo FIFO que rechaza en lugar de encolar cuando la espera estimada
+    (cola / concurrencia * duración media) supera el presupuesto de latencia.
+    """
+
+    def __init__(self, limite: int, presupuesto: float):
+        self.limite = limite
+        self.presupuesto = presupuesto
+        self.en_curso = 0
+        self._espera = deque()
+        self._duracion_media = 0.05  # Estimación inicial; se ajusta con EWMA
+
+    def espera_estimada(self) -> float:
+        if self.en_curso < self.limite:
+            return 0.0
+        return (len(self._espera) + 1) * self._duracion_media / self.limite
+
+    async def adquirir(self) -> bool:
+        if self.en_curso < self.limite and not self._espera:
+            self.en_curso += 1
+            return True
+        if self.espera_estimada() > self.presupuesto:
+            return False
+
+        turno = asyncio.get_running_loop().create_future()
+        self._espera.append(turno)
+        try:
+            await asyncio.wait({turno}, timeout=self.presupuesto)
+        except asyncio.CancelledError:
+            self._abandonar(turno)
+            raise
+        if turno.done():
+            return True  # El cupo fue transferido por liberar()
+        self._abandonar(turno)
+        return False
+
+    def _abandonar(self, turno: asyncio.Future):
+        if turno.done():
+            self.liberar(None)
+        else:
+            self._espera.remove(turno)
+            turno.cancel()
+
+    def liberar(self, duracion: Optional[float]):
+        if duracion is not None:
+            self._duracion_media = 0.9 * self._duracion_media + 0.1 * duracion
+        # Transferir el cupo al siguiente en la cola sin pasar por en_curso
+        while self._espera:
+            turno = self._espera.popleft()
+            if not turno.done():
+                turno.set_result(True)
+                return
+        self.en_curso -= 1
+
+class ClaseRuta:
+    """Límites de una clase de ruta: concurrencia y tasas global/por cliente."""
+
+    def __init__(self, concurrencia: int, presupuesto: float, tasa_global: float, tasa_cliente: float):
+        self.concurrencia = LimiteConcurrencia(concurrencia, presupuesto) if concurrencia > 0 else None
+        self.bucket_global = TokenBucket(tasa_global) if tasa_global > 0 else None
+        self.tasa_cliente = tasa_cliente
+        self.buckets_cliente = OrderedDict()
+
+    def consumir_tasa(self, cliente: str) -> float:
+        # Primero el bucket del cliente: un cliente que excede su tasa no consume la global
+        bucket = None
+        if self.tasa_cliente > 0:
+            bucket = self.buckets_cliente.get(cliente)
+            if bucket is None:
+                bucket = self.buckets_cliente[cliente] = TokenBucket(self.tasa_cliente)
+                if len(self.buckets_cliente) > ADMISION_MAX_CLIENTES:
+                    self.buckets_cliente.popitem(last=False)
+            else:
+                self.buckets_cliente.move_to_end(cliente)
+            espera = bucket.consumir()
+            if espera:
+                return espera
+        if self.bucket_global is not None:
+            espera = self.bucket_global.consumir()
+            if espera:
+                if bucket is not None:
+                    bucket.devolver()  # Rechazada por la tasa global: no cuenta para el cliente
+                return espera
+        return 0.0
+
+def _rechazo(codigo: int, espera: float, detalle: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=codigo,
+        content={"detail": detalle},
+        headers={"Retry-After": str(max(1, math.ceil(espera)))}
+    )
+
+class ControlAdmision:
+    """Middleware ASGI de control de admisión por clase de ruta."""
+
+    def __init__(self, app, limites: Optional[dict] = None):
+        self.app = app
+        self.clases = {
+            nombre: ClaseRuta(**configuracion)
+            for nombre, configuracion in (limites or LIMITES).items()
+        }
+
+    @staticmethod
+    def _clasificar(scope) -> Optional[str]:
+        ruta = scope["path"]
+        # Fuera de la API (health, docs) o streams de larga duración: sin control
+        if not ruta.startswith("/api/") or ruta.endswith("/eventos"):
+            return None
+        if ruta.endswith("/exportar"):
+            return "exportacion"
+        return "lectura" if scope["method"] in ("GET", "HEAD", "OPTIONS") else "escritura"
+
+    @staticmethod
+    def _cliente(scope) -> str:
+        for nombre, valor in scope["headers"]:
+            if nombre == ADMISION_HEADER_CLIENTE:
+                return "k:" + valor.decode("latin-1")
+        origen = scope.get("client")
+        return "ip:" + (origen[0] if origen else "desconocido")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        nombre_clase = self._clasificar(scope)
+        if nombre_clase is None:
+            return await self.app(scope, receive, send)
+        clase = self.clases[nombre_clase]
+
+        espera = clase.consumir_tasa(self._cliente(scope))
+        if espera:
+            respuesta = _rechazo(
+                status.HTTP_429_TOO_MANY_REQUESTS, espera,
+                "Límite de solicitudes excedido, reintente más tarde"
+            )
+            return await respuesta(scope, receive, send)
+
+        if clase.concurrencia is None:
+            return await self.app(scope, receive, send)
+
+        if not await clase.concurrencia.adquirir():
+            respuesta = _rechazo(
+                status.HTTP_503_SERVICE_UNAVAILABLE, clase.concurrencia.espera_estimada(),
+                "Servicio saturado, reintente más tarde"
+            )
+            return await respuesta(scope, receive, send)
+
+        inicio = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            clase.concurrencia.liberar(time.monotonic() - inicio)
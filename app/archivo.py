@@ -0,0 +1,108 @@
+"""
+Archivo de tareas completadas antiguas.
+
+Mueve, en lotes pequeños y transacciones cortas, las tareas completadas sin
+cambios desde hace más de ARCHIVO_DIAS a la tabla tareas_archivadas. Así los
+índices que usa listar_tareas solo contienen el conjunto activo.
+SKIP LOCKED evita esperar por tareas que otra transacción está editando.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select, insert, delete, and_, or_
+
+from app.database import sesion_shard, NUM_SHARDS
+from app.models import Tarea, TareaArchivada
+from app import eventos
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_HABILITADO = os.getenv("ARCHIVO_HABILITADO", "1") == "1"
+ARCHIVO_DIAS = float(os.getenv("ARCHIVO_DIAS", "90"))
+ARCHIVO_LOTE = int(os.getenv("ARCHIVO_LOTE", "500"))
+ARCHIVO_INTERVALO_SEGUNDOS = float(os.getenv("ARCHIVO_INTERVALO_SEGUNDOS", "3600"))
+
+# Pausa entre lotes consecutivos para no competir con el tráfico interactivo
+ARCHIVO_PAUSA_SEGUNDOS = float(os.getenv("ARCHIVO_PAUSA_SEGUNDOS", "0.2"))
+
+# Columnas copiadas de tareas a tareas_archivadas (fecha_archivado usa su default)
+_COLUMNAS = [columna.name for columna in Tarea.__table__.columns]
+
+def archivar_lote(limite: int = ARCHIVO_LOTE, dias: float = ARCHIVO_DIAS, indice: int = 0) -> int:
+    """Archivar hasta `limite` tareas del shard `indice` en una transacción corta; devuelve cuántas movió."""
+    db = sesion_shard(indice)
+    try:
+        corte = datetime.now(timezone.utc) - timedelta(days=dias)
+        candidatas = db.execute(
+            select(Tarea.id, Tarea.proyecto_id)
+            .where(
+                Tarea.estado == "completada",
+                or_(
+                    Tarea.fecha_actualizacion < corte,
+                    and_(Tarea.fecha_actualizacion.is_(None), Tarea.fecha_creacion < corte)
+                )
+            )
+            .order_by(Tarea.id)
+            .limit(limite)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not candidatas:
+            return 0
+
+        ids = [fila.id for fila in candidatas]
+        db.execute(
+            insert(TareaArchivada).from_select(
+                _COLUMNAS, select(*Tarea.__table__.columns).where(Tarea.id.in_(ids))
+            )
+        )
+        db.execute(delete(Tarea).where(Tarea.id.in_(ids)))
+
+        por_proyecto = {}
+        for fila in candidatas:
+            por_proyecto.setdefault(fila.proyecto_id, []).append(fila.id)
+        for proyecto_id, tarea_ids in por_proyecto.items():
+            eventos.registrar_evento(db, proyecto_id, "tarea_archivada", {"tarea_ids": tarea_ids})
+
+        db.commit()
+        return len(ids)
+    finally:
+        db.close()
+
+async def _archivar_periodicamente():
+    while True:
+        try:
+            total = 0
+            for indice in range(NUM_SHARDS):
+                while True:
+                    movidas = await asyncio.to_thread(archivar_lote, ARCHIVO_LOTE, ARCHIVO_DIAS, indice)
+                    total += movidas
+                    if movidas < ARCHIVO_LOTE:
+                        break
+                    await asyncio.sleep(ARCHIVO_PAUSA_SEGUNDOS)
+            if total:
+                logger.info("Tareas archivadas: %s", total)
+        except Exception:
+            logger.exception("Error al archivar tareas")
+        await asyncio.sleep(ARCHIVO_INTERVALO_SEGUNDOS)
+
+_tarea: Optional[asyncio.Task] = None
+
+def iniciar():
+    """Arrancar el archivado periódico en segundo plano."""
+    global _tarea
+    if ARCHIVO_HABILITADO:
+        _tarea = asyncio.create_task(_archivar_periodicamente())
+
+async def detener():
+    global _tarea
+    if _tarea is not None:
+        _tarea.cancel()
+        try:
+            await _tarea
+        except asyncio.CancelledError:
+            pass
+        _tarea = None
@@ -0,0 +1,238 @@
+"""
+Autocompletado de usuarios por nombre y email.
+
+Una sugerencia coincide si el texto buscado (sin distinguir mayúsculas) es
+prefijo del nombre, de alguna palabra del nombre o del email. Orden: primero
+coincidencias al inicio del nombre, luego en otra palabra del nombre, luego en
+el email; dentro de cada grupo, nombres más cortos primero.
+
+Dos implementaciones con el mismo resultado:
+- Índice en memoria (AUTOCOMPLETAR_MEMORIA=1): lista ordenada de sufijos del
+  nombre (desde cada palabra) y emails; una búsqueda es un bisect más el
+  recorrido del rango con ese prefijo. Los prefijos con rangos grandes (los de
+  una o dos letras) guardan su selección en caché hasta la próxima escritura
+  que los afecte; con alcance de proyecto se recorre el rango o los miembros,
+  lo que sea menor. Se reconstruye desde la base cada
+  AUTOCOMPLETAR_REFRESCO_SEGUNDOS y las escrituras de esta instancia lo
+  actualizan al momento (las de otras instancias, en el siguiente refresco).
+- Consulta SQL con LIKE, respaldada en PostgreSQL por índices GIN de trigramas
+  sobre lower(nombre) y lower(email). Se usa mientras el índice en memoria no
+  está cargado o si está deshabilitado.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import threading
+from bisect import bisect_left, insort
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import select, or_, case, func
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Usuario, proyecto_usuario_association
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETAR_MEMORIA = os.getenv("AUTOCOMPLETAR_MEMORIA", "1") == "1"
+AUTOCOMPLETAR_REFRESCO_SEGUNDOS = float(os.getenv("AUTOCOMPLETAR_REFRESCO_SEGUNDOS", "60"))
+
+# Rango de cada coincidencia: menor es mejor
+EN_NOMBRE, EN_PALABRA, EN_EMAIL = 0, 1, 2
+
+# Máximo de sugerencias por búsqueda (y tamaño de cada selección en caché)
+LIMITE_MAXIMO = 50
+
+# Entradas con el prefijo a partir de las cuales se guarda la selección en caché
+UMBRAL_CACHE = 2000
+
+# Claves promedio por usuario (nombre, una o dos palabras más y email), para estimar costes
+CLAVES_POR_USUARIO = 4
+
+def normalizar(texto: str) -> str:
+    return texto.strip().lower()
+
+def _claves(nombre: str, email: str):
+    """Claves indexadas de un usuario: (texto, rango)."""
+    nombre = nombre.lower()
+    yield nombre, EN_NOMBRE
+    posicion = nombre.find(" ")
+    while posicion != -1:
+        # Sufijo desde cada palabra: equivale a LIKE '% q%' sobre el nombre completo
+        yield nombre[posicion + 1:], EN_PALABRA
+        posicion = nombre.find(" ", posicion + 1)
+    yield email.lower(), EN_EMAIL
+
+class IndicePrefijos:
+    """Lista ordenada de (clave, rango, id) para búsquedas por prefijo con bisect."""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._entradas = []
+        self._usuarios = {}  # id -> (nombre, email, rol)
+        self._cache = {}  # prefijo -> mejores LIMITE_MAXIMO candidatos
+        self.cargado = False
+
+    def reemplazar(self, usuarios: Iterable[tuple]):
+        """Reconstruir el índice completo a partir de filas (id, nombre, email, rol)."""
+        datos = {fila[0]: tuple(fila[1:]) for fila in usuarios}
+        entradas = sorted(
+            (clave, rango, usuario_id)
+            for usuario_id, (nombre, email, _) in datos.items()
+            for clave, rango in _claves(nombre, email)
+        )
+        with self._mutex:
+            self._entradas, self._usuarios = entradas, datos
+            self._cache = {}
+            self.cargado = True
+
+    def guardar(self, usuario_id: int, nombre: str, email: str, rol: str):
+        """Agregar o actualizar un usuario."""
+        with self._mutex:
+            self._quitar(usuario_id)
+            self._usuarios[usuario_id] = (nombre, email, rol)
+            self._invalidar(nombre, email)
+            for clave, rango in _claves(nombre, email):
+                insort(self._entradas, (clave, rango, usuario_id))
+
+    def quitar(self, usuario_id: int):
+        with self._mutex:
+            self._quitar(usuario_id)
+
+    def _quitar(self, usuario_id: int):
+        datos = self._usuarios.pop(usuario_id, None)
+        if datos is None:
+            return
+        self._invalidar(datos[0], datos[1])
+        for clave, rango in _claves(datos[0], datos[1]):
+            posicion = bisect_left(self._entradas, (clave, rango, usuario_id))
+            if posicion < len(self._entradas) and self._entradas[posicion] == (clave, rango, usuario_id):
+                del self._entradas[posicion]
+
+    def _invalidar(self, nombre: str, email: str):
+        """Descartar las selecciones en caché de los prefijos que incluyen a este usuario."""
+        if not self._cache:
+            return
+        for clave, _ in _claves(nombre, email):
+            for largo in range(1, len(clave) + 1):
+                self._cache.pop(clave[:largo], None)
+
+    def _candidato(self, usuario_id: int, rango: int) -> tuple:
+        nombre = self._usuarios[usuario_id][0]
+        return rango, len(nombre), nombre.lower(), usuario_id
+
+    def _seleccionar(self, inicio: int, fin: int, limite: int, permitidos: Optional[Set[int]]) -> list:
+        """Recorrer las entradas [inicio, fin) con el prefijo y quedarse con las `limite` mejores."""
+        mejores = {}
+        for _, rango, usuario_id in self._entradas[inicio:fin]:
+            if permitidos is not None and usuario_id not in permitidos:
+                continue
+            if rango < mejores.get(usuario_id, EN_EMAIL + 1):
+                mejores[usuario_id] = rango
+        return heapq.nsmallest(limite, (self._candidato(usuario_id, rango) for usuario_id, rango in mejores.items()))
+
+    def _seleccionar_miembros(self, texto: str, limite: int, permitidos: Set[int]) -> list:
+        """Evaluar cada usuario permitido (más barato que el rango si son pocos)."""
+        candidatos = []
+        for usuario_id in permitidos:
+            datos = self._usuarios.get(usuario_id)
+            if datos is None:
+                continue
+            rangos = [rango for clave, rango in _claves(datos[0], datos[1]) if clave.startswith(texto)]
+            if rangos:
+                candidatos.append(self._candidato(usuario_id, min(rangos)))
+        return heapq.nsmallest(limite, candidatos)
+
+    def buscar(self, texto: str, limite: int, permitidos: Optional[Set[int]] = None) -> List[dict]:
+        """Mejores `limite` usuarios cuyo nombre, palabra del nombre o email empieza por `texto`."""
+        with self._mutex:
+            inicio = bisect_left(self._entradas, (texto,))
+            fin = bisect_left(self._entradas, (texto + "\U0010ffff",))
+            if permitidos is not None:
+                if len(permitidos) * CLAVES_POR_USUARIO < fin - inicio:
+                    seleccion = self._seleccionar_miembros(texto, limite, permitidos)
+                else:
+                    seleccion = self._seleccionar(inicio, fin, limite, permitidos)
+            elif fin - inicio > UMBRAL_CACHE:
+                seleccion = self._cache.get(texto)
+                if seleccion is None:
+                    seleccion = self._cache[texto] = self._seleccionar(inicio, fin, LIMITE_MAXIMO, None)
+                seleccion = seleccion[:limite]
+            else:
+                seleccion = self._seleccionar(inicio, fin, limite, None)
+            return [
+                dict(zip(("id", "nombre", "email", "rol"), (usuario_id,) + self._usuarios[usuario_id]))
+                for *_, usuario_id in seleccion
+            ]
+
+indice = IndicePrefijos()
+
+def consulta_sql(texto: str, limite: int, proyecto_id: Optional[int] = None):
+    """Misma búsqueda y orden que el índice en memoria, en SQL (LIKE sobre lower(...))."""
+    nombre = func.lower(Usuario.nombre)
+    email = func.lower(Usuario.email)
+    en_nombre = nombre.startswith(texto, autoescape=True)
+    en_palabra = nombre.contains(" " + texto, autoescape=True)
+    rango = case((en_nombre, EN_NOMBRE), (en_palabra, EN_PALABRA), else_=EN_EMAIL)
+
+    consulta = select(Usuario.id, Usuario.nombre, Usuario.email, Usuario.rol).where(
+        or_(en_nombre, en_palabra, email.startswith(texto, autoescape=True))
+    )
+    if proyecto_id is not None:
+        consulta = consulta.join(
+            proyecto_usuario_association,
+            (proyecto_usuario_association.c.usuario_id == Usuario.id)
+            & (proyecto_usuario_association.c.proyecto_id == proyecto_id)
+        )
+    return consulta.order_by(rango, func.length(Usuario.nombre), nombre, Usuario.id).limit(limite)
+
+def buscar(db: Session, texto: str, limite: int, proyecto_id: Optional[int] = None) -> List[dict]:
+    """
+    Sugerencias para `texto`. `db` es una sesión del shard del proyecto si se filtra
+    por él (los usuarios están replicados en todos los shards).
+    """
+    texto = normalizar(texto)
+    if not texto:
+        return []
+    if not indice.cargado:
+        return [dict(fila._mapping) for fila in db.execute(consulta_sql(texto, limite, proyecto_id))]
+    permitidos = None
+    if proyecto_id is not None:
+        permitidos = set(db.scalars(
+            select(proyecto_usuario_association.c.usuario_id)
+            .where(proyecto_usuario_association.c.proyecto_id == proyecto_id)
+        ))
+    return indice.buscar(texto, limite, permitidos)
+
+def recargar():
+    """Reconstruir el índice en memoria desde la copia principal de usuarios."""
+    with SessionLocal() as db:
+        indice.reemplazar(db.execute(select(Usuario.id, Usuario.nombre, Usuario.email, Usuario.rol)))
+
+async def _refrescar_periodicamente():
+    while True:
+        try:
+            await asyncio.to_thread(recargar)
+        except Exception:
+            logger.exception("Error al recargar el índice de autocompletado")
+        await asyncio.sleep(AUTOCOMPLETAR_REFRESCO_SEGUNDOS)
+
+_tarea: Optional[asyncio.Task] = None
+
+def iniciar():
+    """Cargar el índice en memoria y refrescarlo periódicamente."""
+    global _tarea
+    if AUTOCOMPLETAR_MEMORIA:
+        _tarea = asyncio.create_task(_refrescar_periodicamente())
+
+async def detener():
+    global _tarea
+    if _tarea is not None:
+        _tarea.cancel()
+        try:
+            await _tarea
+        except asyncio.CancelledError:
+            pass
+        _tarea = None
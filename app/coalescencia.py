@@ -0,0 +1,67 @@
+"""
+Coalescencia de lecturas idénticas en vuelo (single-flight).
+
+Requests concurrentes con la misma clave comparten una única ejecución de la
+consulta (en un hilo, fuera del event loop) y el mismo cuerpo JSON serializado.
+No es un caché: al terminar la ejecución la clave se libera, y la siguiente
+request vuelve a consultar la base de datos.
+"""
+
+import asyncio
+import os
+from typing import Callable, Hashable
+
+from app import plazos
+
+# Máximo de claves en vuelo; por encima se ejecuta sin coalescer
+COALESCENCIA_MAX_CLAVES = int(os.getenv("COALESCENCIA_MAX_CLAVES", "1000"))
+
+class _Ejecucion:
+    """Ejecución compartida: se cancela en la base de datos cuando todos sus participantes se desconectan."""
+
+    def __init__(self, funcion: Callable[[], bytes]):
+        self.cancelacion = plazos.Cancelacion()
+        self.participantes = 0
+        self.futuro = asyncio.ensure_future(asyncio.to_thread(plazos.con_cancelacion(self.cancelacion, funcion)))
+
+    def unirse(self):
+        self.participantes += 1
+        cancelacion = plazos.cancelacion_actual()
+        if cancelacion is not None:
+            cancelacion.al_cancelar(self._abandonar)
+
+    def _abandonar(self):
+        self.participantes -= 1
+        if self.participantes == 0 and not self.futuro.done():
+            self.cancelacion.cancelar()
+
+class SingleFlight:
+    """Agrupa ejecuciones concurrentes de una función síncrona por clave."""
+
+    def __init__(self, max_claves: int):
+        self._max_claves = max_claves
+        self._en_vuelo = {}
+
+    async def ejecutar(self, clave: Hashable, funcion: Callable[[], bytes]) -> bytes:
+        """
+        Ejecutar `funcion` o unirse a una ejecución en curso con la misma clave.
+        Las excepciones (p. ej. HTTPException 404) se propagan a todos los participantes.
+        """
+        ejecucion = self._en_vuelo.get(clave)
+        if ejecucion is None:
+            if len(self._en_vuelo) >= self._max_claves:
+                return await asyncio.to_thread(funcion)
+            # Tarea independiente: si el primer cliente se desconecta, el resto sigue esperando
+            ejecucion = _Ejecucion(funcion)
+            self._en_vuelo[clave] = ejecucion
+            ejecucion.futuro.add_done_callback(lambda _: self._finalizar(clave, ejecucion))
+        ejecucion.unirse()
+        return await asyncio.shield(ejecucion.futuro)
+
+    def _finalizar(self, clave: Hashable, ejecucion: _Ejecucion):
+        if self._en_vuelo.get(clave) is ejecucion:
+            del self._en_vuelo[clave]
+        if not ejecucion.futuro.cancelled():
+            ejecucion.futuro.exception()  # Marcar la excepción como recuperada aunque nadie espere
+
+single_flight = SingleFlight(COALESCENCIA_MAX_CLAVES)
@@ -0,0 +1,43 @@
+"""
+Consultas calientes compartidas por los routers: obtención por clave primaria y
+comprobaciones de existencia y de pertenencia a un proyecto.
+
+Se construyen con lambda_stmt: SQLAlchemy guarda la sentencia compilada según
+el código de la lambda y solo extrae los valores del cierre como parámetros,
+sin reconstruir ni recompilar el select() en cada request. Las comprobaciones
+son SELECT EXISTS(...) sobre columnas de la clave, sin cargar entidades en la
+sesión ni colecciones de relaciones (ver benchmarks/bench_consultas.py).
+"""
+
+from typing import Optional
+
+from sqlalchemy import exists, lambda_stmt, select
+from sqlalchemy.orm import Session
+
+from app.models import Usuario, proyecto_usuario_association
+
+def obtener(db: Session, modelo, id_):
+    """Entidad `modelo` con ese ID, o None."""
+    return db.execute(
+        lambda_stmt(lambda: select(modelo).where(modelo.id == id_))
+    ).scalars().first()
+
+def existe(db: Session, modelo, id_) -> bool:
+    """Si hay una fila de `modelo` con ese ID (sin cargar la entidad)."""
+    return db.scalar(lambda_stmt(lambda: select(exists().where(modelo.id == id_))))
+
+def es_miembro(db: Session, proyecto_id: int, usuario_id: int) -> bool:
+    """Si el usuario está asignado al proyecto (sin cargar la colección de miembros)."""
+    asociacion = proyecto_usuario_association
+    return db.scalar(lambda_stmt(lambda: select(exists().where(
+        asociacion.c.proyecto_id == proyecto_id,
+        asociacion.c.usuario_id == usuario_id,
+    ))))
+
+def email_en_uso(db: Session, email: str, excluir_id: Optional[int] = None) -> bool:
+    """Si otro usuario ya tiene el email."""
+    if excluir_id is None:
+        return db.scalar(lambda_stmt(lambda: select(exists().where(Usuario.email == email))))
+    return db.scalar(lambda_stmt(lambda: select(exists().where(
+        Usuario.email == email, Usuario.id != excluir_id
+    ))))
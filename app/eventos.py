@@ -0,0 +1,296 @@
+"""
+Bus de eventos de cambios por proyecto (tareas y membresías).
+Alimenta el stream SSE de /proyectos/{id}/eventos.
+
+- PostgreSQL: los eventos se emiten con NOTIFY dentro de la misma transacción
+  (solo se entregan si hay commit) y cada instancia los recibe con LISTEN.
+- Otros motores (tests, SQLite): pub/sub en proceso tras el commit.
+
+Cada suscriptor tiene una cola acotada; si no consume a tiempo se le desconecta
+y debe reanudar con Last-Event-ID, de modo que un cliente lento no retiene memoria.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from collections import deque
+from typing import List, Optional
+
+from sqlalchemy import event, func
+from sqlalchemy import select as sql_select
+
+from app.database import SessionLocal, engine, engines
+from app import outbox
+
+logger = logging.getLogger(__name__)
+
+# Canal de LISTEN/NOTIFY en PostgreSQL
+CANAL = "proyecto_eventos"
+
+# PostgreSQL rechaza payloads de NOTIFY de 8000 bytes o más: los eventos más grandes
+# (operaciones masivas con listas de IDs) se envían en fragmentos "#id:indice:total:texto"
+NOTIFY_MAX_BYTES = 7900
+_NOTIFY_CABECERA_BYTES = 100
+
+# Eventos fragmentados incompletos que conserva cada oyente
+_FRAGMENTADOS_MAX = 100
+
+# Backend: "postgres", "memoria" o automático según el motor configurado
+EVENTOS_BACKEND = os.getenv(
+    "EVENTOS_BACKEND",
+    "postgres" if engine.dialect.name == "postgresql" else "memoria"
+)
+
+# Eventos recientes conservados para reanudar streams (Last-Event-ID)
+EVENTOS_HISTORIAL = int(os.getenv("EVENTOS_HISTORIAL", "5000"))
+
+# Eventos pendientes máximos por suscriptor antes de desconectarlo
+EVENTOS_COLA_SUSCRIPTOR = int(os.getenv("EVENTOS_COLA_SUSCRIPTOR", "200"))
+
+# Intervalo de latidos (comentarios SSE) para mantener viva la conexión
+EVENTOS_LATIDO_SEGUNDOS = float(os.getenv("EVENTOS_LATIDO_SEGUNDOS", "15"))
+
+_INSTANCIA = uuid.uuid4().hex[:8]
+_secuencia = itertools.count(1)
+
+def _nuevo_evento(proyecto_id: int, tipo: str, datos: dict) -> dict:
+    """Construir un evento con identificador único entre instancias."""
+    return {
+        "id": f"{int(time.time() * 1000)}-{_INSTANCIA}-{next(_secuencia)}",
+        "tipo": tipo,
+        "proyecto_id": proyecto_id,
+        # Normalizar a tipos JSON (fechas como texto) para NOTIFY y SSE
+        "datos": json.loads(json.dumps(datos, default=str)),
+    }
+
+class Suscripcion:
+    """Suscripción de un cliente SSE a los eventos de un proyecto."""
+
+    def __init__(self, proyecto_id: int, tamano_cola: int):
+        self.proyecto_id = proyecto_id
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=tamano_cola)
+
+class BusEventos:
+    """
+    Pub/sub en proceso con historial acotado.
+    Todas las operaciones sobre el estado se ejecutan en el event loop.
+    """
+
+    def __init__(self, historial: int, tamano_cola: int):
+        self._historial = deque(maxlen=historial)
+        self._suscripciones = {}
+        self._tamano_cola = tamano_cola
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def configurar_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def publicar(self, evento: dict):
+        """Publicar un evento; seguro de llamar desde cualquier hilo."""
+        if self._loop is None:
+            return
+        try:
+            en_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            en_loop = False
+        if en_loop:
+            self._distribuir(evento)
+        else:
+            self._loop.call_soon_threadsafe(self._distribuir, evento)
+
+    def _distribuir(self, evento: dict):
+        self._historial.append(evento)
+        for suscripcion in list(self._suscripciones.get(evento["proyecto_id"], ())):
+            try:
+                suscripcion.cola.put_nowait(evento)
+            except asyncio.QueueFull:
+                # Cliente lento: liberar su cola y avisarle que debe reconectar
+                self.desuscribir(suscripcion)
+                while not suscripcion.cola.empty():
+                    suscripcion.cola.get_nowait()
+                suscripcion.cola.put_nowait(None)
+
+    def suscribir(self, proyecto_id: int, ultimo_id: Optional[str] = None):
+        """
+        Registrar una suscripción y calcular los eventos a reenviar.
+        Devuelve (suscripcion, eventos_pendientes, requiere_reset).
+        """
+        suscripcion = Suscripcion(proyecto_id, self._tamano_cola)
+        self._suscripciones.setdefault(proyecto_id, set()).add(suscripcion)
+
+        if not ultimo_id:
+            return suscripcion, [], False
+
+        ids = [evento["id"] for evento in self._historial]
+        if ultimo_id not in ids:
+            # El evento ya salió del historial: el cliente debe recargar el estado
+            return suscripcion, [], True
+
+        posicion = ids.index(ultimo_id)
+        pendientes = [
+            evento for evento in list(self._historial)[posicion + 1:]
+            if evento["proyecto_id"] == proyecto_id
+        ]
+        return suscripcion, pendientes, False
+
+    def desuscribir(self, suscripcion: Suscripcion):
+        suscripciones = self._suscripciones.get(suscripcion.proyecto_id)
+        if suscripciones is not None:
+            suscripciones.discard(suscripcion)
+            if not suscripciones:
+                del self._suscripciones[suscripcion.proyecto_id]
+
+bus = BusEventos(EVENTOS_HISTORIAL, EVENTOS_COLA_SUSCRIPTOR)
+
+# ===== REGISTRO TRANSACCIONAL DE EVENTOS =====
+
+def registrar_evento(db, proyecto_id: int, tipo: str, datos: Optional[dict] = None):
+    """
+    Registrar un evento de cambio en la transacción actual de la sesión.
+    Solo se publica si la transacción confirma (commit); se descarta en rollback.
+    También se agrega al outbox de webhooks en la misma transacción.
+    """
+    evento = _nuevo_evento(proyecto_id, tipo, datos or {})
+    db.info.setdefault("eventos_pendientes", []).append(evento)
+    outbox.encolar(db, evento)
+
+def payloads_notify(evento: dict) -> List[str]:
+    """Payloads de NOTIFY de un evento: el JSON completo o, si excede el límite, sus fragmentos."""
+    texto = json.dumps(evento)  # ensure_ascii: un carácter por byte
+    if len(texto) < NOTIFY_MAX_BYTES:
+        return [texto]
+    tamano = NOTIFY_MAX_BYTES - _NOTIFY_CABECERA_BYTES
+    partes = [texto[inicio:inicio + tamano] for inicio in range(0, len(texto), tamano)]
+    return [f"#{evento['id']}:{indice}:{len(partes)}:{parte}" for indice, parte in enumerate(partes)]
+
+@event.listens_for(SessionLocal, "before_commit")
+def _notificar_antes_de_commit(session):
+    if EVENTOS_BACKEND != "postgres":
+        return
+    for evento in session.info.get("eventos_pendientes", []):
+        # NOTIFY es transaccional: se entrega a los oyentes solo tras el commit (y en orden)
+        for payload in payloads_notify(evento):
+            session.execute(sql_select(func.pg_notify(CANAL, payload)))
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publicar_tras_commit(session):
+    pendientes = session.info.pop("eventos_pendientes", [])
+    if EVENTOS_BACKEND == "memoria":
+        for evento in pendientes:
+            bus.publicar(evento)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_tras_rollback(session):
+    session.info.pop("eventos_pendientes", None)
+
+# ===== OYENTE LISTEN/NOTIFY =====
+
+class OyentePostgres(threading.Thread):
+    """Hilo que escucha NOTIFY en una conexión dedicada y publica en el bus local."""
+
+    def __init__(self, motor, bus_destino: BusEventos):
+        super().__init__(name="oyente-eventos", daemon=True)
+        self._motor = motor
+        self._bus = bus_destino
+        self._detener = threading.Event()
+        self._fragmentos = {}  # id de evento -> {indice: texto}
+
+    def recibir(self, payload: str):
+        """Publicar un evento recibido por NOTIFY, reensamblándolo si llega fragmentado."""
+        if not payload.startswith("#"):
+            self._bus.publicar(json.loads(payload))
+            return
+        evento_id, indice, total, parte = payload[1:].split(":", 3)
+        fragmentos = self._fragmentos.setdefault(evento_id, {})
+        fragmentos[int(indice)] = parte
+        if len(fragmentos) == int(total):
+            del self._fragmentos[evento_id]
+            self._bus.publicar(json.loads("".join(fragmentos[i] for i in range(int(total)))))
+        elif len(self._fragmentos) > _FRAGMENTADOS_MAX:
+            self._fragmentos.pop(next(iter(self._fragmentos)))
+
+    def detener(self):
+        self._detener.set()
+
+    def run(self):
+        while not self._detener.is_set():
+            conexion = None
+            try:
+                # Conexión fuera del pool: queda ocupada mientras dure el LISTEN
+                conexion = self._motor.raw_connection()
+                conexion.detach()
+                pg = conexion.driver_connection
+                pg.autocommit = True
+                pg.cursor().execute(f"LISTEN {CANAL}")
+                self._fragmentos.clear()
+
+                while not self._detener.is_set():
+                    if select.select([pg], [], [], 1.0) == ([], [], []):
+                        continue
+                    pg.poll()
+                    while pg.notifies:
+                        self.recibir(pg.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("Error en el oyente de eventos; reintentando")
+                self._detener.wait(1.0)
+            finally:
+                if conexion is not None:
+                    conexion.close()
+
+# Un oyente por shard: cada NOTIFY se emite en la base del proyecto que cambió
+_oyentes: List[OyentePostgres] = []
+
+def iniciar():
+    """Enlazar el bus al event loop y arrancar los oyentes de PostgreSQL si corresponde."""
+    bus.configurar_loop(asyncio.get_running_loop())
+    if EVENTOS_BACKEND == "postgres":
+        for motor in engines:
+            oyente = OyentePostgres(motor, bus)
+            oyente.start()
+            _oyentes.append(oyente)
+
+def detener():
+    """Detener los oyentes de PostgreSQL."""
+    while _oyentes:
+        _oyentes.pop().detener()
+
+# ===== FORMATO SSE =====
+
+def _formatear_sse(tipo: str, datos: dict, evento_id: Optional[str] = None) -> str:
+    lineas = []
+    if evento_id:
+        lineas.append(f"id: {evento_id}")
+    lineas.append(f"event: {tipo}")
+    lineas.append(f"data: {json.dumps(datos, default=str)}")
+    return "\n".join(lineas) + "\n\n"
+
+async def generar_stream(request, suscripcion: Suscripcion, pendientes: list, requiere_reset: bool):
+    """Generador SSE: reenvía pendientes, emite eventos nuevos y latidos."""
+    try:
+        yield "retry: 3000\n\n"
+        if requiere_reset:
+            yield _formatear_sse("reset", {"motivo": "historial_expirado"})
+        for evento in pendientes:
+            yield _formatear_sse(evento["tipo"], evento, evento["id"])
+
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=EVENTOS_LATIDO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                yield ": latido\n\n"
+                continue
+            if evento is None:
+                # Desconectado por no consumir a tiempo: reanudar con Last-Event-ID
+                yield _formatear_sse("reset", {"motivo": "cliente_lento"})
+                break
+            yield _formatear_sse(evento["tipo"], evento, evento["id"])
+    finally:
+        bus.desuscribir(suscripcion)
@@ -0,0 +1,265 @@
+"""
+Soporte de Idempotency-Key para los endpoints POST de la API.
+
+La primera request con una clave inserta una fila "en_proceso" que actúa como
+lock: los duplicados concurrentes esperan a que termine y reciben la misma
+respuesta. Las respuestas (< 500) se guardan comprimidas durante
+IDEMPOTENCIA_TTL_HORAS y se reenvían sin tocar las tablas de negocio.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import status
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import select, delete, update
+from sqlalchemy.exc import IntegrityError
+
+from app.database import SessionLocal
+from app.models import ClaveIdempotencia
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCIA_TTL_HORAS = float(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24"))
+
+# Tiempo máximo que una ejecución en curso retiene la clave (si el proceso muere, se libera)
+IDEMPOTENCIA_LOCK_SEGUNDOS = float(os.getenv("IDEMPOTENCIA_LOCK_SEGUNDOS", "60"))
+
+# Espera máxima de un duplicado concurrente antes de responder 409
+IDEMPOTENCIA_ESPERA_SEGUNDOS = float(os.getenv("IDEMPOTENCIA_ESPERA_SEGUNDOS", "5"))
+
+IDEMPOTENCIA_PURGA_SEGUNDOS = float(os.getenv("IDEMPOTENCIA_PURGA_SEGUNDOS", "600"))
+
+HEADER_CLAVE = b"idempotency-key"
+HEADER_CLIENTE = b"x-api-key"
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+# ===== OPERACIONES DE BASE DE DATOS (se ejecutan en hilos) =====
+
+def reservar(clave: str, huella: str):
+    """
+    Intentar tomar la clave. Devuelve una tupla (resultado, registro):
+    "nueva", "repetir" (con la respuesta guardada), "en_proceso" o "conflicto".
+    """
+    db = SessionLocal()
+    try:
+        for _ in range(2):
+            ahora = _ahora()
+            try:
+                db.add(ClaveIdempotencia(
+                    clave=clave, huella=huella, estado="en_proceso",
+                    expira_en=ahora + timedelta(seconds=IDEMPOTENCIA_LOCK_SEGUNDOS)
+                ))
+                db.commit()
+                return "nueva", None
+            except IntegrityError:
+                db.rollback()
+
+            fila = db.execute(
+                select(
+                    ClaveIdempotencia.huella, ClaveIdempotencia.estado,
+                    ClaveIdempotencia.codigo_estado, ClaveIdempotencia.tipo_contenido,
+                    ClaveIdempotencia.cuerpo, (ClaveIdempotencia.expira_en > ahora).label("vigente")
+                ).where(ClaveIdempotencia.clave == clave)
+            ).first()
+            if fila is None:
+                continue
+            if not fila.vigente:
+                # Respuesta expirada o lock abandonado: liberar y reintentar
+                db.execute(delete(ClaveIdempotencia).where(
+                    ClaveIdempotencia.clave == clave, ClaveIdempotencia.expira_en <= ahora
+                ))
+                db.commit()
+                continue
+            if fila.huella != huella:
+                return "conflicto", None
+            if fila.estado == "completada":
+                return "repetir", fila
+            return "en_proceso", None
+        return "en_proceso", None
+    finally:
+        db.close()
+
+def guardar(clave: str, codigo_estado: int, tipo_contenido: Optional[str], cuerpo: bytes):
+    """Guardar la respuesta de la primera ejecución y extender la vigencia al TTL."""
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(ClaveIdempotencia)
+            .where(ClaveIdempotencia.clave == clave)
+            .values(
+                estado="completada",
+                codigo_estado=codigo_estado,
+                tipo_contenido=tipo_contenido,
+                cuerpo=zlib.compress(cuerpo),
+                expira_en=_ahora() + timedelta(hours=IDEMPOTENCIA_TTL_HORAS)
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def liberar(clave: str):
+    """Liberar la clave tras un error para que un reintento vuelva a ejecutarse."""
+    db = SessionLocal()
+    try:
+        db.execute(delete(ClaveIdempotencia).where(
+            ClaveIdempotencia.clave == clave, ClaveIdempotencia.estado == "en_proceso"
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+def purgar_expiradas() -> int:
+    """Eliminar claves expiradas."""
+    db = SessionLocal()
+    try:
+        resultado = db.execute(delete(ClaveIdempotencia).where(ClaveIdempotencia.expira_en <= _ahora()))
+        db.commit()
+        return resultado.rowcount
+    finally:
+        db.close()
+
+# ===== MIDDLEWARE =====
+
+def _respuesta_guardada(fila) -> Response:
+    return Response(
+        content=zlib.decompress(fila.cuerpo),
+        status_code=fila.codigo_estado,
+        media_type=fila.tipo_contenido,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+class ControlIdempotencia:
+    """Middleware ASGI que aplica Idempotency-Key a los POST de /api/."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith("/api/"):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        clave_cliente = headers.get(HEADER_CLAVE)
+        if clave_cliente is None:
+            return await self.app(scope, receive, send)
+        if not 0 < len(clave_cliente) <= 255:
+            respuesta = JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"detail": "Idempotency-Key debe tener entre 1 y 255 caracteres"}
+            )
+            return await respuesta(scope, receive, send)
+
+        # Leer el cuerpo completo para calcular la huella y reenviarlo a la aplicación
+        cuerpo = b""
+        while True:
+            mensaje = await receive()
+            cuerpo += mensaje.get("body", b"")
+            if not mensaje.get("more_body", False):
+                break
+
+        # Las claves se aíslan por cliente cuando se identifica con X-API-Key
+        clave = (headers.get(HEADER_CLIENTE, b"") + b":" + clave_cliente).decode("latin-1")
+        huella = hashlib.sha256(
+            scope["method"].encode() + b" " + scope["path"].encode() + b"?"
+            + scope.get("query_string", b"") + b"\n" + cuerpo
+        ).hexdigest()
+
+        resultado, fila = await asyncio.to_thread(reservar, clave, huella)
+        esperado = 0.0
+        while resultado == "en_proceso" and esperado < IDEMPOTENCIA_ESPERA_SEGUNDOS:
+            # Duplicado concurrente: esperar a que la primera ejecución termine
+            await asyncio.sleep(0.1)
+            esperado += 0.1
+            resultado, fila = await asyncio.to_thread(reservar, clave, huella)
+
+        if resultado == "repetir":
+            return await _respuesta_guardada(fila)(scope, receive, send)
+        if resultado == "conflicto":
+            respuesta = JSONResponse(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                content={"detail": "Idempotency-Key ya utilizada con una petición distinta"}
+            )
+            return await respuesta(scope, receive, send)
+        if resultado == "en_proceso":
+            respuesta = JSONResponse(
+                status_code=status.HTTP_409_CONFLICT,
+                content={"detail": "Una petición con la misma Idempotency-Key está en curso"},
+                headers={"Retry-After": "1"}
+            )
+            return await respuesta(scope, receive, send)
+
+        await self._ejecutar(scope, cuerpo, send, clave)
+
+    async def _ejecutar(self, scope, cuerpo: bytes, send, clave: str):
+        """Ejecutar la request original capturando la respuesta para guardarla."""
+        entregado = False
+
+        async def receive_repetido():
+            nonlocal entregado
+            if entregado:
+                return {"type": "http.disconnect"}
+            entregado = True
+            return {"type": "http.request", "body": cuerpo, "more_body": False}
+
+        capturada = {"codigo": None, "tipo": None, "cuerpo": []}
+
+        async def send_capturando(mensaje):
+            if mensaje["type"] == "http.response.start":
+                capturada["codigo"] = mensaje["status"]
+                for nombre, valor in mensaje.get("headers", []):
+                    if nombre.lower() == b"content-type":
+                        capturada["tipo"] = valor.decode("latin-1")
+            elif mensaje["type"] == "http.response.body":
+                capturada["cuerpo"].append(mensaje.get("body", b""))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive_repetido, send_capturando)
+        except BaseException:
+            await asyncio.to_thread(liberar, clave)
+            raise
+
+        if capturada["codigo"] is not None and capturada["codigo"] < 500:
+            await asyncio.to_thread(
+                guardar, clave, capturada["codigo"], capturada["tipo"], b"".join(capturada["cuerpo"])
+            )
+        else:
+            await asyncio.to_thread(liberar, clave)
+
+# ===== PURGA PERIÓDICA =====
+
+_tarea: Optional[asyncio.Task] = None
+
+async def _purgar_periodicamente():
+    while True:
+        try:
+            eliminadas = await asyncio.to_thread(purgar_expiradas)
+            if eliminadas:
+                logger.info("Claves de idempotencia expiradas eliminadas: %s", eliminadas)
+        except Exception:
+            logger.exception("Error al purgar claves de idempotencia")
+        await asyncio.sleep(IDEMPOTENCIA_PURGA_SEGUNDOS)
+
+def iniciar():
+    """Arrancar la purga periódica de claves expiradas."""
+    global _tarea
+    _tarea = asyncio.create_task(_purgar_periodicamente())
+
+async def detener():
+    global _tarea
+    if _tarea is not None:
+        _tarea.cancel()
+        try:
+            await _tarea
+        except asyncio.CancelledError:
+            pass
+        _tarea = None
@@ -0,0 +1,68 @@
+"""
+Instrumentación de las consultas SQL emitidas por una request.
+
+Los listeners del engine solo se registran al llamar a activar(); mientras
+nadie lo haga no añaden ningún coste. Quien quiera medir abre un colector con
+capturar(): las consultas emitidas en su contexto (incluidos los hilos de
+asyncio.to_thread y del threadpool, que copian el contexto) se anotan con su
+duración.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.database import engines
+
+# Longitud máxima con la que se guardan los parámetros de cada sentencia
+MAX_PARAMETROS = 500
+
+class ColectorConsultas:
+    """Cantidad y tiempo acumulado de las consultas de un contexto."""
+
+    def __init__(self, guardar_sentencias: bool = False):
+        self.guardar_sentencias = guardar_sentencias
+        self.cantidad = 0
+        self.segundos = 0.0
+        self.sentencias = []
+
+    def registrar(self, sentencia: str, parametros, segundos: float):
+        self.cantidad += 1
+        self.segundos += segundos
+        if self.guardar_sentencias:
+            self.sentencias.append((segundos, sentencia, repr(parametros)[:MAX_PARAMETROS]))
+
+_colector: ContextVar[Optional[ColectorConsultas]] = ContextVar("colector_consultas", default=None)
+_activa = False
+
+def _antes_de_ejecutar(conexion, cursor, sentencia, parametros, contexto, executemany):
+    if _colector.get() is not None:
+        contexto._inicio_instrumentacion = time.perf_counter()
+
+def _despues_de_ejecutar(conexion, cursor, sentencia, parametros, contexto, executemany):
+    colector = _colector.get()
+    inicio = getattr(contexto, "_inicio_instrumentacion", None)
+    if colector is not None and inicio is not None:
+        colector.registrar(sentencia, parametros, time.perf_counter() - inicio)
+
+def activar():
+    """Registrar los listeners en el engine de cada shard (idempotente)."""
+    global _activa
+    if not _activa:
+        for motor in engines:
+            event.listen(motor, "before_cursor_execute", _antes_de_ejecutar)
+            event.listen(motor, "after_cursor_execute", _despues_de_ejecutar)
+        _activa = True
+
+@contextmanager
+def capturar(guardar_sentencias: bool = False):
+    """Anotar en un colector nuevo las consultas emitidas dentro del bloque."""
+    colector = ColectorConsultas(guardar_sentencias)
+    token = _colector.set(colector)
+    try:
+        yield colector
+    finally:
+        _colector.reset(token)
@@ -0,0 +1,149 @@
+"""
+Actualización del esquema de bases creadas por versiones anteriores.
+
+create_all crea las tablas que faltan pero no modifica las existentes. Cada paso
+inspecciona el esquema y aplica solo lo que falta, de modo que la actualización es
+idempotente y se ejecuta en cada arranque (create_tables), en cada shard, después
+de create_all.
+"""
+
+import logging
+
+from sqlalchemy import MetaData, inspect
+from sqlalchemy.schema import CreateTable
+
+logger = logging.getLogger(__name__)
+
+# Tablas con columna `version` (concurrencia optimista, ver app/versiones.py)
+TABLAS_VERSIONADAS = ("usuarios", "proyectos", "tareas")
+
+def _agregar_version(conexion):
+    inspector = inspect(conexion)
+    for tabla in TABLAS_VERSIONADAS:
+        if not inspector.has_table(tabla):
+            continue  # Shard sin esa tabla (create_all solo crea las de los modelos importados)
+        columnas = {columna["name"] for columna in inspector.get_columns(tabla)}
+        if "version" not in columnas:
+            logger.info("Agregando la columna version a %s", tabla)
+            conexion.exec_driver_sql(f"ALTER TABLE {tabla} ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+def _destinos_outbox(conexion):
+    """Columna destinos_entregados del outbox (entrega por URL, ver app/outbox.py)."""
+    inspector = inspect(conexion)
+    if not inspector.has_table("outbox_eventos"):
+        return
+    columnas = {columna["name"] for columna in inspector.get_columns("outbox_eventos")}
+    if "destinos_entregados" not in columnas:
+        logger.info("Agregando la columna destinos_entregados a outbox_eventos")
+        conexion.exec_driver_sql("ALTER TABLE outbox_eventos ADD COLUMN destinos_entregados TEXT")
+
+def _clave_proyecto_usuario(conexion):
+    """
+    Clave (proyecto_id, usuario_id) en proyecto_usuario, que ON CONFLICT DO NOTHING necesita
+    para descartar asignaciones repetidas. Antes se eliminan las filas duplicadas.
+    """
+    inspector = inspect(conexion)
+    if not inspector.has_table("proyecto_usuario"):
+        return
+    if inspector.get_pk_constraint("proyecto_usuario")["constrained_columns"]:
+        return
+    if any(indice["unique"] for indice in inspector.get_indexes("proyecto_usuario")):
+        return
+    logger.info("Eliminando asignaciones duplicadas y agregando la clave de proyecto_usuario")
+    conexion.exec_driver_sql("DELETE FROM proyecto_usuario WHERE proyecto_id IS NULL OR usuario_id IS NULL")
+    if conexion.dialect.name == "postgresql":
+        conexion.exec_driver_sql(
+            "DELETE FROM proyecto_usuario a USING proyecto_usuario b "
+            "WHERE a.ctid > b.ctid AND a.proyecto_id = b.proyecto_id AND a.usuario_id = b.usuario_id"
+        )
+        conexion.exec_driver_sql("ALTER TABLE proyecto_usuario ADD PRIMARY KEY (proyecto_id, usuario_id)")
+    else:
+        # SQLite no permite agregar una clave primaria: un índice único cumple la misma función
+        conexion.exec_driver_sql(
+            "DELETE FROM proyecto_usuario WHERE rowid NOT IN "
+            "(SELECT min(rowid) FROM proyecto_usuario GROUP BY proyecto_id, usuario_id)"
+        )
+        conexion.exec_driver_sql(
+            "CREATE UNIQUE INDEX ux_proyecto_usuario ON proyecto_usuario (proyecto_id, usuario_id)"
+        )
+
+def _autoincremento_tareas(conexion):
+    """
+    SQLite: reconstruir `tareas` con AUTOINCREMENT si se creó sin él. Sin AUTOINCREMENT,
+    archivar la tarea de mayor ID permite que la siguiente tarea nueva reciba ese mismo ID,
+    que luego choca con la copia en tareas_archivadas al archivarla.
+    """
+    if conexion.dialect.name != "sqlite" or not inspect(conexion).has_table("tareas"):
+        return
+    definicion = conexion.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tareas'"
+    ).scalar()
+    if "AUTOINCREMENT" not in definicion.upper():
+        from app.models import Tarea
+
+        logger.info("Reconstruyendo la tabla tareas con AUTOINCREMENT")
+        tabla = Tarea.__table__
+        columnas = ", ".join(columna.name for columna in tabla.columns)
+        # Crear la nueva con otro nombre y renombrarla: renombrar la existente haría que
+        # SQLite redirigiera hacia ella las claves foráneas de otras tablas
+        destino = MetaData()
+        for referida in {clave.column.table for clave in tabla.foreign_keys}:
+            referida.to_metadata(destino)  # Para resolver las claves foráneas al compilar
+        conexion.execute(CreateTable(tabla.to_metadata(destino, name="tareas_nueva")))
+        conexion.exec_driver_sql(f"INSERT INTO tareas_nueva ({columnas}) SELECT {columnas} FROM tareas")
+        conexion.exec_driver_sql("DROP TABLE tareas")
+        conexion.exec_driver_sql("ALTER TABLE tareas_nueva RENAME TO tareas")
+        for indice in tabla.indexes:
+            indice.create(conexion, checkfirst=True)
+
+    # Los IDs nuevos siguen al mayor de activas y archivadas
+    if inspect(conexion).has_table("tareas_archivadas"):
+        maximo = conexion.exec_driver_sql(
+            "SELECT max(coalesce((SELECT max(id) FROM tareas), 0), "
+            "coalesce((SELECT max(id) FROM tareas_archivadas), 0))"
+        ).scalar()
+        if maximo:
+            actualizadas = conexion.exec_driver_sql(
+                "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'tareas'", (maximo,)
+            ).rowcount
+            if not actualizadas:
+                conexion.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('tareas', ?)", (maximo,))
+
+def _extension_trigramas(conexion):
+    """
+    PostgreSQL: extensión pg_trgm para los índices GIN de autocompletado. En tablas nuevas la
+    crea el DDL before_create de usuarios (app/models.py), que no corre si la tabla ya existe.
+    """
+    if conexion.dialect.name == "postgresql":
+        conexion.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+def _crear_indices(conexion):
+    """
+    Índices de los modelos que falten en tablas existentes (create_all solo los crea junto
+    con su tabla). Respeta las condiciones por dialecto (p. ej. los GIN solo en PostgreSQL).
+    """
+    from app.database import Base
+
+    inspector = inspect(conexion)
+    for tabla in Base.metadata.sorted_tables:
+        if not tabla.indexes or not inspector.has_table(tabla.name):
+            continue
+        existentes = {indice["name"] for indice in inspector.get_indexes(tabla.name)}
+        faltantes = [indice for indice in tabla.indexes if indice.name not in existentes]
+        for indice in faltantes:
+            indice.create(conexion, checkfirst=True)  # No emite nada si ddl_if excluye el dialecto
+        if faltantes:
+            creados = {indice["name"] for indice in inspect(conexion).get_indexes(tabla.name)} - existentes
+            if creados:
+                logger.info("Índices creados en %s: %s", tabla.name, ", ".join(sorted(creados)))
+
+PASOS = [
+    _agregar_version, _destinos_outbox, _clave_proyecto_usuario, _autoincremento_tareas,
+    _extension_trigramas, _crear_indices,  # La extensión antes de los índices de trigramas
+]
+
+def aplicar(motor):
+    """Aplicar en una transacción los pasos pendientes sobre la base de `motor`."""
+    with motor.begin() as conexion:
+        for paso in PASOS:
+            paso(conexion)
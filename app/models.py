@@ -3,17 +3,18 @@ Modelos SQLAlchemy para usuarios, proyectos y tareas.
 Implementa relaciones y restricciones para garantizar integridad ACID.
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Table, Index, LargeBinary, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
 # Tabla de asociación para relación muchos-a-muchos entre proyectos y usuarios
+# La clave primaria compuesta impide asignaciones duplicadas (ON CONFLICT DO NOTHING)
 proyecto_usuario_association = Table(
     'proyecto_usuario',
     Base.metadata,
-    Column('proyecto_id', Integer, ForeignKey('proyectos.id', ondelete='CASCADE')),
-    Column('usuario_id', Integer, ForeignKey('usuarios.id', ondelete='CASCADE'))
+    Column('proyecto_id', Integer, ForeignKey('proyectos.id', ondelete='CASCADE'), primary_key=True),
+    Column('usuario_id', Integer, ForeignKey('usuarios.id', ondelete='CASCADE'), primary_key=True)
 )
 
 class Usuario(Base):
@@ -29,14 +30,37 @@ class Usuario(Base):
     rol = Column(String(50), default="desarrollador")
     fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
     fecha_actualizacion = Column(DateTime(timezone=True), onupdate=func.now())
+    # Versión de la fila para concurrencia optimista (ver app/versiones.py)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relaciones
-    proyectos = relationship("Proyecto", secondary=proyecto_usuario_association, back_populates="usuarios")
-    tareas_asignadas = relationship("Tarea", back_populates="usuario_responsable")
+    # passive_deletes: al borrar, la base de datos aplica CASCADE / SET NULL sin cargar colecciones
+    proyectos = relationship("Proyecto", secondary=proyecto_usuario_association, back_populates="usuarios", passive_deletes=True)
+    tareas_asignadas = relationship("Tarea", back_populates="usuario_responsable", passive_deletes=True)
+
+    __table_args__ = (
+        # Autocompletado (LIKE 'q%' y '% q%' sobre nombre / email): índices de trigramas en PostgreSQL
+        Index(
+            "ix_usuarios_nombre_trgm", func.lower(nombre).label("nombre_minusculas"),
+            postgresql_using="gin", postgresql_ops={"nombre_minusculas": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_usuarios_email_trgm", func.lower(email).label("email_minusculas"),
+            postgresql_using="gin", postgresql_ops={"email_minusculas": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
+
+    __mapper_args__ = {"version_id_col": version}
 
     def __repr__(self):
         return f"<Usuario(id={self.id}, nombre='{self.nombre}', email='{self.email}')>"
 
+# Los índices de trigramas requieren la extensión pg_trgm
+event.listen(
+    Usuario.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
 class Proyecto(Base):
     """
     Modelo para gestión de proyectos.
@@ -52,10 +76,14 @@ class Proyecto(Base):
     fecha_fin = Column(DateTime(timezone=True), nullable=True)
     fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
     fecha_actualizacion = Column(DateTime(timezone=True), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relaciones
-    usuarios = relationship("Usuario", secondary=proyecto_usuario_association, back_populates="proyectos")
-    tareas = relationship("Tarea", back_populates="proyecto", cascade="all, delete-orphan")
+    # passive_deletes: las tareas y asignaciones se eliminan con ON DELETE CASCADE en la base de datos
+    usuarios = relationship("Usuario", secondary=proyecto_usuario_association, back_populates="proyectos", passive_deletes=True)
+    tareas = relationship("Tarea", back_populates="proyecto", cascade="all, delete-orphan", passive_deletes=True)
+
+    __mapper_args__ = {"version_id_col": version}
 
     def __repr__(self):
         return f"<Proyecto(id={self.id}, nombre='{self.nombre}', estado='{self.estado}')>"
@@ -75,6 +103,7 @@ class Tarea(Base):
     fecha_vencimiento = Column(DateTime(timezone=True), nullable=True)
     fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
     fecha_actualizacion = Column(DateTime(timezone=True), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Claves foráneas
     proyecto_id = Column(Integer, ForeignKey("proyectos.id", ondelete="CASCADE"), nullable=False)
@@ -84,5 +113,168 @@ class Tarea(Base):
     proyecto = relationship("Proyecto", back_populates="tareas")
     usuario_responsable = relationship("Usuario", back_populates="tareas_asignadas")
 
+    __table_args__ = (
+        # Candidatas a archivar: solo tareas completadas (índice parcial en PostgreSQL)
+        Index(
+            "ix_tareas_completadas_actualizacion", "fecha_actualizacion",
+            postgresql_where=(estado == "completada")
+        ),
+        # Tablero: tareas de un proyecto particionadas por estado
+        Index("ix_tareas_proyecto_estado", "proyecto_id", "estado"),
+        # Vencidas / por vencer: índices parciales sobre tareas abiertas con vencimiento
+        Index(
+            "ix_tareas_abiertas_proyecto_vencimiento", "proyecto_id", "fecha_vencimiento",
+            postgresql_where=((estado != "completada") & fecha_vencimiento.isnot(None)),
+            sqlite_where=((estado != "completada") & fecha_vencimiento.isnot(None))
+        ),
+        Index(
+            "ix_tareas_abiertas_responsable_vencimiento", "usuario_responsable_id", "fecha_vencimiento",
+            postgresql_where=((estado != "completada") & fecha_vencimiento.isnot(None)),
+            sqlite_where=((estado != "completada") & fecha_vencimiento.isnot(None))
+        ),
+        Index(
+            "ix_tareas_abiertas_vencimiento", "fecha_vencimiento",
+            postgresql_where=((estado != "completada") & fecha_vencimiento.isnot(None)),
+            sqlite_where=((estado != "completada") & fecha_vencimiento.isnot(None))
+        ),
+        # Carga de trabajo por usuario: cubre la agregación por proyecto y prioridad
+        Index(
+            "ix_tareas_abiertas_responsable_proyecto", "usuario_responsable_id", "proyecto_id", "prioridad",
+            postgresql_where=(estado != "completada"),
+            sqlite_where=(estado != "completada")
+        ),
+        # SQLite: sin AUTOINCREMENT reutilizaría el ID de la última tarea al archivarla,
+        # y ese ID chocaría luego con el de tareas_archivadas
+        {"sqlite_autoincrement": True},
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
+    def __repr__(self):
+        return f"<Tarea(id={self.id}, titulo='{self.titulo}', estado='{self.estado}', proyecto_id={self.proyecto_id})>"
+
+class TareaArchivada(Base):
+    """
+    Tareas completadas y antiguas movidas fuera de la tabla de tareas activas.
+    Mantiene el mismo ID y columnas que Tarea para poder consultarlas igual.
+    Componente: GestorTareas (archivo)
+    """
+    __tablename__ = "tareas_archivadas"
+
+    id = Column(Integer, primary_key=True)
+    titulo = Column(String(200), nullable=False)
+    descripcion = Column(Text)
+    estado = Column(String(50))
+    prioridad = Column(String(20))
+    fecha_vencimiento = Column(DateTime(timezone=True), nullable=True)
+    fecha_creacion = Column(DateTime(timezone=True))
+    fecha_actualizacion = Column(DateTime(timezone=True))
+    version = Column(Integer)
+    fecha_archivado = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Claves foráneas (mismas reglas de borrado que en tareas)
+    proyecto_id = Column(Integer, ForeignKey("proyectos.id", ondelete="CASCADE"), nullable=False, index=True)
+    usuario_responsable_id = Column(Integer, ForeignKey("usuarios.id", ondelete="SET NULL"), nullable=True, index=True)
+
+    # Relaciones (solo lectura)
+    usuario_responsable = relationship("Usuario", viewonly=True)
+
+    # Marca para los schemas de respuesta
+    archivada = True
+
+    def __repr__(self):
+        return f"<TareaArchivada(id={self.id}, titulo='{self.titulo}', proyecto_id={self.proyecto_id})>"
+
+class EventoOutbox(Base):
+    """
+    Evento de cambio pendiente de entrega por webhook (transactional outbox).
+    Se inserta en la misma transacción que el cambio que lo origina.
+    Componente: Outbox
+    """
+    __tablename__ = "outbox_eventos"
+
+    id = Column(Integer, primary_key=True)
+    evento_id = Column(String(64), nullable=False, unique=True)
+    tipo = Column(String(50), nullable=False)
+    proyecto_id = Column(Integer, nullable=False)  # Sin FK: el evento sobrevive al borrado del proyecto
+    payload = Column(Text, nullable=False)
+    estado = Column(String(20), nullable=False, default="pendiente")  # pendiente, descartado
+    intentos = Column(Integer, nullable=False, default=0)
+    proximo_intento = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    ultimo_error = Column(Text, nullable=True)
+    destinos_entregados = Column(Text, nullable=True)  # JSON: URLs que ya confirmaron el evento
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_outbox_eventos_estado_proximo", "estado", "proximo_intento"),
+    )
+
+    def __repr__(self):
+        return f"<EventoOutbox(id={self.id}, tipo='{self.tipo}', estado='{self.estado}', intentos={self.intentos})>"
+
+class ClaveIdempotencia(Base):
+    """
+    Respuesta almacenada para un header Idempotency-Key.
+    Mientras la primera ejecución está en curso la fila actúa como lock.
+    Componente: Idempotencia
+    """
+    __tablename__ = "claves_idempotencia"
+
+    clave = Column(String(320), primary_key=True)
+    huella = Column(String(64), nullable=False)  # SHA-256 de método, ruta y cuerpo
+    estado = Column(String(20), nullable=False, default="en_proceso")  # en_proceso, completada
+    codigo_estado = Column(Integer, nullable=True)
+    tipo_contenido = Column(String(100), nullable=True)
+    cuerpo = Column(LargeBinary, nullable=True)  # Comprimido con zlib
+    expira_en = Column(DateTime(timezone=True), nullable=False, index=True)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ClaveIdempotencia(clave='{self.clave}', estado='{self.estado}', codigo_estado={self.codigo_estado})>"
+
+class ResumenVencimientos(Base):
+    """
+    Contadores precalculados de tareas abiertas vencidas y por vencer,
+    por proyecto y usuario responsable. Los recalcula el escáner periódico.
+    Componente: GestorTareas (vencimientos)
+    """
+    __tablename__ = "resumen_vencimientos"
+
+    id = Column(Integer, primary_key=True)
+    proyecto_id = Column(Integer, ForeignKey("proyectos.id", ondelete="CASCADE"), nullable=False, index=True)
+    usuario_responsable_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=True, index=True)
+    vencidas = Column(Integer, nullable=False, default=0)
+    vencen_pronto = Column(Integer, nullable=False, default=0)
+    calculado_en = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<ResumenVencimientos(proyecto_id={self.proyecto_id}, usuario_responsable_id={self.usuario_responsable_id}, vencidas={self.vencidas})>"
+
+class Trabajo(Base):
+    """
+    Operación larga ejecutada en segundo plano (borrados, reasignaciones, exportaciones).
+    Persistida para sobrevivir reinicios: un trabajo en curso cuya reserva vence se retoma.
+    Componente: Trabajos
+    """
+    __tablename__ = "trabajos"
+
+    id = Column(String(32), primary_key=True)  # UUID en hexadecimal
+    tipo = Column(String(50), nullable=False)
+    estado = Column(String(20), nullable=False, default="pendiente")  # pendiente, en_curso, completado, fallido
+    parametros = Column(Text, nullable=False)  # JSON
+    progreso = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=True)
+    resultado = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    intentos = Column(Integer, nullable=False, default=0)
+    reservado_hasta = Column(DateTime(timezone=True), nullable=True)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+    fecha_inicio = Column(DateTime(timezone=True), nullable=True)
+    fecha_fin = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_trabajos_estado_reservado", "estado", "reservado_hasta"),
+    )
+
     def __repr__(self):
-        return f"<Tarea(id={self.id}, titulo='{self.titulo}', estado='{self.estado}', proyecto_id={self.proyecto_id})>"
\ No newline at end of file
+        return f"<Trabajo(id='{self.id}', tipo='{self.tipo}', estado='{self.estado}', progreso={self.progreso})>"
@@ -0,0 +1,134 @@
+"""
+Modo SQLite embebido para despliegues de un solo nodo.
+
+Con una URL sqlite:///archivo.db el motor se ajusta para concurrencia:
+- WAL: los lectores no bloquean al escritor ni al revés.
+- synchronous=NORMAL (seguro con WAL), busy_timeout, mmap y caché de páginas.
+- Pool de conexiones de lectura (SQLITE_LECTORES) que consultan en paralelo:
+  sqlite3 libera el GIL mientras ejecuta cada sentencia.
+- Escritor único: SQLite admite un solo escritor por base. En lugar de que los
+  hilos compitan por el lock del archivo (reintentos con espera del busy handler
+  y errores "database is locked"), la primera sentencia de escritura de una
+  transacción toma turno en una cola FIFO del proceso y lo libera cuando la
+  conexión vuelve al pool, tras el commit o el rollback.
+
+Las bases en memoria (sqlite://) solo activan las claves foráneas.
+"""
+
+import logging
+import os
+import re
+import threading
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+
+# Espera máxima por el lock de escritura (cola del proceso y lock del archivo)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+
+# Conexiones del pool (lecturas en paralelo); el exceso espera una conexión libre
+SQLITE_LECTORES = int(os.getenv("SQLITE_LECTORES", "8"))
+
+SQLITE_ESCRITOR_UNICO = os.getenv("SQLITE_ESCRITOR_UNICO", "1") == "1"
+
+_ESCRITURA = re.compile(r"\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", re.IGNORECASE)
+
+def es_archivo(url: str) -> bool:
+    """True si la URL apunta a una base SQLite en archivo (no en memoria)."""
+    url = make_url(url)
+    return (
+        url.get_backend_name() == "sqlite"
+        and url.database not in (None, "", ":memory:")
+        and url.query.get("mode") != "memory"
+    )
+
+def opciones_motor(url: str) -> dict:
+    """Argumentos adicionales de create_engine para una base SQLite en archivo."""
+    if not es_archivo(url):
+        return {}
+    return {
+        "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        "poolclass": QueuePool,
+        "pool_size": SQLITE_LECTORES,
+        "max_overflow": 0,
+        "pool_timeout": 30,
+    }
+
+class ColaEscritura:
+    """Lock FIFO: los escritores toman turno en orden de llegada y el turno se cede directamente."""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._ocupada = False
+        self._espera = deque()
+
+    def adquirir(self, timeout: float) -> bool:
+        with self._mutex:
+            if not self._ocupada:
+                self._ocupada = True
+                return True
+            turno = threading.Event()
+            self._espera.append(turno)
+        if turno.wait(timeout):
+            return True
+        with self._mutex:
+            if turno.is_set():  # El turno llegó justo al vencer la espera
+                return True
+            self._espera.remove(turno)
+            return False
+
+    def liberar(self):
+        with self._mutex:
+            if self._espera:
+                self._espera.popleft().set()  # Sigue ocupada: pasa al siguiente en la cola
+            else:
+                self._ocupada = False
+
+def configurar(motor):
+    """Registrar los pragmas y, en bases de archivo, la cola de escritura en el motor."""
+    archivo = es_archivo(str(motor.url))
+
+    @event.listens_for(motor, "connect")
+    def _aplicar_pragmas(conexion_dbapi, _registro):
+        # SQLite no aplica claves foráneas (ni ON DELETE CASCADE / SET NULL) salvo que se active
+        conexion_dbapi.execute("PRAGMA foreign_keys=ON")
+        if archivo:
+            conexion_dbapi.execute("PRAGMA journal_mode=WAL")
+            conexion_dbapi.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            conexion_dbapi.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            conexion_dbapi.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+            conexion_dbapi.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")  # Negativo: KiB
+            conexion_dbapi.execute("PRAGMA temp_store=MEMORY")
+
+    if not (archivo and SQLITE_ESCRITOR_UNICO):
+        return
+
+    cola = ColaEscritura()
+
+    @event.listens_for(motor, "before_cursor_execute")
+    def _tomar_turno(conexion, cursor, sentencia, parametros, contexto, executemany):
+        # conexion.info es el del registro del pool: dura hasta que la conexión vuelve al pool
+        if conexion.info.get("turno_escritura") or not _ESCRITURA.match(sentencia):
+            return
+        if cola.adquirir(SQLITE_BUSY_TIMEOUT_MS / 1000):
+            conexion.info["turno_escritura"] = True
+        else:
+            # Sin turno: se intenta igual y decide el busy_timeout de SQLite
+            logger.warning("Espera de la cola de escritura SQLite agotada (%s ms)", SQLITE_BUSY_TIMEOUT_MS)
+
+    def _ceder_turno(_conexion_dbapi, registro, *_):
+        if registro is not None and registro.info.pop("turno_escritura", False):
+            cola.liberar()
+
+    # checkin ocurre tras el commit o el rollback de devolución al pool
+    event.listen(motor, "checkin", _ceder_turno)
+    event.listen(motor, "invalidate", _ceder_turno)
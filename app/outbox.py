@@ -0,0 +1,233 @@
+"""
+Transactional outbox y despachador de webhooks.
+
+Los cambios registrados con eventos.registrar_evento se guardan también en la
+tabla outbox_eventos dentro de la misma transacción. Un despachador asyncio,
+fuera del camino de las requests, los entrega en lotes a WEBHOOK_URLS con
+reintentos (backoff exponencial), concurrencia acotada y dead-letter.
+
+Cada evento registra las URLs que ya lo confirmaron: si un destino falla, los
+reintentos solo van a los destinos pendientes. Aun así la entrega es "al menos
+una vez" por destino (un timeout tras recibir el lote lo reenvía): los receptores
+deben deduplicar por el "id" del evento.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import httpx
+from sqlalchemy import select, update, delete
+
+from app.database import sesion_shard, NUM_SHARDS
+from app.models import EventoOutbox
+
+logger = logging.getLogger(__name__)
+
+# URLs destino separadas por coma; sin URLs el outbox queda deshabilitado
+WEBHOOK_URLS = [url.strip() for url in os.getenv("WEBHOOK_URLS", "").split(",") if url.strip()]
+
+OUTBOX_LOTE = int(os.getenv("OUTBOX_LOTE", "100"))
+OUTBOX_CONCURRENCIA = int(os.getenv("OUTBOX_CONCURRENCIA", "4"))
+OUTBOX_MAX_INTENTOS = int(os.getenv("OUTBOX_MAX_INTENTOS", "8"))
+OUTBOX_INTERVALO_SEGUNDOS = float(os.getenv("OUTBOX_INTERVALO_SEGUNDOS", "1"))
+OUTBOX_TIMEOUT_SEGUNDOS = float(os.getenv("OUTBOX_TIMEOUT_SEGUNDOS", "10"))
+
+# Tiempo durante el cual un lote reclamado no es visible para otros despachadores
+OUTBOX_RESERVA_SEGUNDOS = OUTBOX_TIMEOUT_SEGUNDOS * 3
+
+def habilitado() -> bool:
+    return bool(WEBHOOK_URLS)
+
+def encolar(db, evento: dict):
+    """Agregar un evento al outbox en la transacción actual de la sesión."""
+    if not habilitado():
+        return
+    db.add(EventoOutbox(
+        evento_id=evento["id"],
+        tipo=evento["tipo"],
+        proyecto_id=evento["proyecto_id"],
+        payload=json.dumps(evento),
+    ))
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _espera_reintento(intentos: int) -> timedelta:
+    """Backoff exponencial acotado: 2, 4, 8... hasta 10 minutos."""
+    return timedelta(seconds=min(2 ** intentos, 600))
+
+# ===== OPERACIONES DE BASE DE DATOS (se ejecutan en hilos) =====
+
+def reclamar_lote(limite: int, shard: int = 0) -> List[dict]:
+    """
+    Reservar un lote de eventos pendientes y vencidos del outbox de un shard.
+    SKIP LOCKED permite varias instancias despachando sin entregar dos veces el mismo lote.
+    """
+    db = sesion_shard(shard)
+    try:
+        ahora = _ahora()
+        filas = db.execute(
+            select(EventoOutbox.id, EventoOutbox.evento_id, EventoOutbox.intentos, EventoOutbox.payload,
+                   EventoOutbox.destinos_entregados)
+            .where(EventoOutbox.estado == "pendiente", EventoOutbox.proximo_intento <= ahora)
+            .order_by(EventoOutbox.id)
+            .limit(limite)
+            .with_for_update(skip_locked=True)
+        ).all()
+        lote = [
+            {**fila._asdict(), "destinos_entregados": json.loads(fila.destinos_entregados or "[]")}
+            for fila in filas
+        ]
+        if lote:
+            db.execute(
+                update(EventoOutbox)
+                .where(EventoOutbox.id.in_([evento["id"] for evento in lote]))
+                .values(proximo_intento=ahora + timedelta(seconds=OUTBOX_RESERVA_SEGUNDOS))
+            )
+        db.commit()
+        return lote
+    finally:
+        db.close()
+
+def confirmar_entrega(ids: List[int], shard: int = 0):
+    """Eliminar del outbox los eventos entregados."""
+    db = sesion_shard(shard)
+    try:
+        db.execute(delete(EventoOutbox).where(EventoOutbox.id.in_(ids)))
+        db.commit()
+    finally:
+        db.close()
+
+def registrar_fallo(lote: List[dict], error: str, shard: int = 0):
+    """
+    Reprogramar el lote con backoff o moverlo a dead-letter si agotó los intentos,
+    guardando los destinos que ya lo confirmaron.
+    """
+    db = sesion_shard(shard)
+    try:
+        ahora = _ahora()
+        for evento in lote:
+            intentos = evento["intentos"] + 1
+            valores = {
+                "intentos": intentos,
+                "ultimo_error": error[:1000],
+                "destinos_entregados": json.dumps(evento["destinos_entregados"]),
+            }
+            if intentos >= OUTBOX_MAX_INTENTOS:
+                valores["estado"] = "descartado"
+                logger.error("Evento %s descartado tras %s intentos: %s", evento["evento_id"], intentos, error)
+            else:
+                valores["proximo_intento"] = ahora + _espera_reintento(intentos)
+            db.execute(update(EventoOutbox).where(EventoOutbox.id == evento["id"]).values(**valores))
+        db.commit()
+    finally:
+        db.close()
+
+# ===== DESPACHADOR =====
+
+class DespachadorWebhooks:
+    """
+    Bucle asyncio que entrega lotes del outbox con concurrencia acotada.
+    Cada evento vive en el outbox del shard donde se registró: los shards se
+    recorren por turnos y solo se espera tras una vuelta completa sin eventos.
+    """
+
+    def __init__(self, urls: List[str], lote: int, concurrencia: int):
+        self._urls = urls
+        self._lote = lote
+        self._semaforo = asyncio.Semaphore(concurrencia)
+        self._entregas = set()
+
+    async def ejecutar(self):
+        async with httpx.AsyncClient(timeout=OUTBOX_TIMEOUT_SEGUNDOS) as cliente:
+            try:
+                shard = 0
+                vacios = 0  # Shards consecutivos sin eventos pendientes
+                while True:
+                    await self._semaforo.acquire()
+                    try:
+                        lote = await asyncio.to_thread(reclamar_lote, self._lote, shard)
+                    except Exception:
+                        logger.exception("Error al reclamar eventos del outbox")
+                        lote = []
+                    lote_shard, shard = shard, (shard + 1) % NUM_SHARDS
+                    if not lote:
+                        self._semaforo.release()
+                        vacios += 1
+                        if vacios >= NUM_SHARDS:
+                            vacios = 0
+                            await asyncio.sleep(OUTBOX_INTERVALO_SEGUNDOS)
+                        continue
+                    vacios = 0
+                    entrega = asyncio.create_task(self._entregar_lote(cliente, lote, lote_shard))
+                    self._entregas.add(entrega)
+                    entrega.add_done_callback(self._fin_entrega)
+            finally:
+                for entrega in list(self._entregas):
+                    entrega.cancel()
+
+    def _fin_entrega(self, entrega: asyncio.Task):
+        self._entregas.discard(entrega)
+        self._semaforo.release()
+
+    async def _entregar_lote(self, cliente: httpx.AsyncClient, lote: List[dict], shard: int):
+        try:
+            payloads = {evento["id"]: json.loads(evento["payload"]) for evento in lote}
+            # Cada destino recibe solo los eventos que todavía no confirmó
+            envios = {}
+            for url in self._urls:
+                pendientes = [evento for evento in lote if url not in evento["destinos_entregados"]]
+                if pendientes:
+                    envios[url] = pendientes
+            resultados = await asyncio.gather(
+                *(cliente.post(url, json={"eventos": [payloads[evento["id"]] for evento in pendientes]})
+                  for url, pendientes in envios.items()),
+                return_exceptions=True
+            )
+
+            errores = []
+            for (url, pendientes), resultado in zip(envios.items(), resultados):
+                if isinstance(resultado, Exception):
+                    errores.append(f"{url}: {resultado!r}")
+                elif resultado.status_code >= 300:
+                    errores.append(f"{url}: HTTP {resultado.status_code}")
+                else:
+                    for evento in pendientes:
+                        evento["destinos_entregados"].append(url)
+
+            entregados = [
+                evento for evento in lote
+                if all(url in evento["destinos_entregados"] for url in self._urls)
+            ]
+            if entregados:
+                await asyncio.to_thread(confirmar_entrega, [evento["id"] for evento in entregados], shard)
+            if len(entregados) < len(lote):
+                fallidos = [evento for evento in lote if evento not in entregados]
+                await asyncio.to_thread(registrar_fallo, fallidos, "; ".join(errores), shard)
+        except Exception:
+            # El lote reaparece al expirar la reserva
+            logger.exception("Error al entregar un lote del outbox")
+
+_tarea: Optional[asyncio.Task] = None
+
+def iniciar():
+    """Arrancar el despachador si hay webhooks configurados."""
+    global _tarea
+    if habilitado():
+        despachador = DespachadorWebhooks(WEBHOOK_URLS, OUTBOX_LOTE, OUTBOX_CONCURRENCIA)
+        _tarea = asyncio.create_task(despachador.ejecutar())
+
+async def detener():
+    """Cancelar el despachador; los lotes en curso se reintentan al expirar su reserva."""
+    global _tarea
+    if _tarea is not None:
+        _tarea.cancel()
+        try:
+            await _tarea
+        except asyncio.CancelledError:
+            pass
+        _tarea = None
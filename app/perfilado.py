@@ -0,0 +1,118 @@
+"""
+Perfilado bajo demanda de requests individuales para depurar en producción.
+
+Con PERFILADO_HABILITADO=1 y un PERFILADO_TOKEN configurado, una request que
+envíe el header X-Perfilar con ese token se ejecuta bajo cProfile y se
+registran las sentencias SQL que emitió. El resultado se escribe en
+PERFILADO_DIR (un .prof para pstats/snakeviz y un .txt legible) y la respuesta
+lleva el nombre del perfil en el header X-Perfil.
+
+Deshabilitado, main.py no registra el middleware ni los listeners SQL: el
+coste es nulo. cProfile mide el hilo del event loop, por lo que el perfil
+también incluye lo que otras requests concurrentes ejecuten en él; el trabajo
+en hilos (asyncio.to_thread) aparece como espera, pero sus consultas SQL sí se
+registran.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import re
+import time
+import uuid
+
+from app import instrumentacion
+
+logger = logging.getLogger(__name__)
+
+PERFILADO_TOKEN = os.getenv("PERFILADO_TOKEN", "")
+
+# Sin token no se habilita, aunque se pida
+PERFILADO_HABILITADO = os.getenv("PERFILADO_HABILITADO", "0") == "1" and bool(PERFILADO_TOKEN)
+
+PERFILADO_DIR = os.getenv("PERFILADO_DIR", "/tmp/perfiles")
+
+# Funciones listadas en el resumen de texto
+PERFILADO_LINEAS = int(os.getenv("PERFILADO_LINEAS", "60"))
+
+HEADER_PERFILAR = b"x-perfilar"
+HEADER_PERFIL = b"x-perfil"
+
+def _escribir_perfil(nombre: str, descripcion: str, perfil: cProfile.Profile, consultas) -> str:
+    """Guardar el perfil binario y un resumen de texto; devuelve la ruta del resumen."""
+    os.makedirs(PERFILADO_DIR, exist_ok=True)
+    base = os.path.join(PERFILADO_DIR, nombre)
+    perfil.dump_stats(base + ".prof")
+
+    salida = io.StringIO()
+    salida.write(descripcion + "\n\n")
+    salida.write(f"== SQL: {consultas.cantidad} consultas, {consultas.segundos * 1000:.1f} ms ==\n")
+    for segundos, sentencia, parametros in consultas.sentencias:
+        salida.write(f"\n[{segundos * 1000:.2f} ms] {sentencia}\n    {parametros}\n")
+
+    salida.write("\n== Perfil (tiempo acumulado) ==\n")
+    estadisticas = pstats.Stats(perfil, stream=salida).sort_stats("cumulative")
+    estadisticas.print_stats(PERFILADO_LINEAS)
+    salida.write("\n== Árbol de llamadas ==\n")
+    estadisticas.print_callees(PERFILADO_LINEAS)
+
+    with open(base + ".txt", "w", encoding="utf-8") as archivo:
+        archivo.write(salida.getvalue())
+    return base + ".txt"
+
+class ControlPerfilado:
+    """Middleware ASGI que perfila las requests autorizadas con X-Perfilar."""
+
+    def __init__(self, app):
+        self.app = app
+        self._token = PERFILADO_TOKEN.encode()
+        # cProfile admite un solo perfil activo por hilo: se perfila una request a la vez
+        self._lock = asyncio.Lock()
+        instrumentacion.activar()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = dict(scope["headers"]).get(HEADER_PERFILAR)
+        if token is None or not hmac.compare_digest(token, self._token):
+            return await self.app(scope, receive, send)
+
+        async with self._lock:
+            await self._perfilar(scope, receive, send)
+
+    async def _perfilar(self, scope, receive, send):
+        ruta = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "raiz"
+        nombre = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{ruta}-{uuid.uuid4().hex[:8]}"
+        codigo = None
+
+        async def send_con_perfil(mensaje):
+            nonlocal codigo
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+                mensaje = {**mensaje, "headers": [*mensaje.get("headers", []), (HEADER_PERFIL, nombre.encode())]}
+            await send(mensaje)
+
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        with instrumentacion.capturar(guardar_sentencias=True) as consultas:
+            perfil.enable()
+            try:
+                await self.app(scope, receive, send_con_perfil)
+            finally:
+                perfil.disable()
+                duracion = time.perf_counter() - inicio
+                consulta = scope.get("query_string", b"").decode("latin-1")
+                descripcion = (
+                    f"{scope['method']} {scope['path']}{'?' + consulta if consulta else ''}"
+                    f" -> {codigo} en {duracion * 1000:.1f} ms"
+                )
+                try:
+                    archivo = await asyncio.to_thread(_escribir_perfil, nombre, descripcion, perfil, consultas)
+                    logger.info("Perfil guardado en %s (%s)", archivo, descripcion)
+                except Exception:
+                    logger.exception("Error al guardar el perfil %s", nombre)
@@ -0,0 +1,249 @@
+"""
+Plazos de ejecución de consultas y cancelación al desconectarse el cliente.
+
+Middleware ASGI que fija, por clase de ruta, el tiempo máximo de cada sentencia
+SQL de la request (más corto en lecturas interactivas que en exportaciones):
+- PostgreSQL: SET LOCAL statement_timeout al comenzar cada transacción.
+- SQLite: un progress handler interrumpe la sentencia al vencer el plazo.
+Una sentencia que excede su plazo responde 503.
+
+Además vigila la conexión del cliente: si se desconecta antes de recibir la
+respuesta, las consultas en curso de esa request se cancelan en el servidor
+(psycopg2 cancel() / sqlite3 interrupt()) y las siguientes fallan sin
+ejecutarse, de modo que las conexiones vuelven al pool de inmediato. Solo es
+efectivo cuando la consulta corre fuera del event loop (single-flight, hilos).
+
+Las sesiones abiertas fuera de una request (trabajos, tareas periódicas) no
+tienen plazo ni cancelación.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+PLAZOS_HABILITADO = os.getenv("PLAZOS_HABILITADO", "1") == "1"
+
+# Plazo por sentencia y clase de ruta, en milisegundos (0: sin plazo)
+PLAZOS_MS = {
+    "lectura": int(os.getenv("PLAZO_LECTURA_MS", "5000")),
+    "escritura": int(os.getenv("PLAZO_ESCRITURA_MS", "10000")),
+    "exportacion": int(os.getenv("PLAZO_EXPORTACION_MS", "300000")),
+}
+
+# Plazos por prefijo de ruta, prioritarios sobre la clase: "/api/v1/usuarios/carga=15000,..."
+PLAZO_RUTAS = sorted(
+    (
+        (prefijo.strip(), int(plazo))
+        for prefijo, _, plazo in (
+            item.partition("=") for item in os.getenv("PLAZO_RUTAS", "").split(",") if item.strip()
+        )
+    ),
+    key=lambda item: len(item[0]),
+    reverse=True,
+)
+
+CANCELAR_AL_DESCONECTAR = os.getenv("CANCELAR_AL_DESCONECTAR", "1") == "1"
+
+# Instrucciones de la VM de SQLite entre comprobaciones del plazo
+SQLITE_INSTRUCCIONES_PLAZO = 10000
+
+# Código de estado registrado cuando el cliente se fue antes de la respuesta (convención de nginx)
+ESTADO_CLIENTE_DESCONECTADO = 499
+
+_plazo_ms: ContextVar[Optional[int]] = ContextVar("plazo_ms", default=None)
+_cancelacion: ContextVar[Optional["Cancelacion"]] = ContextVar("cancelacion", default=None)
+_limite_sqlite: ContextVar[Optional[float]] = ContextVar("limite_sqlite", default=None)
+
+def plazo_de_ruta(scope) -> Optional[int]:
+    """Plazo en milisegundos de una request, o None si no se limita."""
+    ruta = scope["path"]
+    for prefijo, plazo in PLAZO_RUTAS:
+        if ruta.startswith(prefijo):
+            return plazo or None
+    if not ruta.startswith("/api/"):
+        return None
+    if ruta.endswith("/exportar"):
+        clase = "exportacion"
+    else:
+        clase = "lectura" if scope["method"] in ("GET", "HEAD") else "escritura"
+    return PLAZOS_MS[clase] or None
+
+def _interrumpir(conexion_dbapi):
+    try:
+        if isinstance(conexion_dbapi, sqlite3.Connection):
+            conexion_dbapi.interrupt()
+        else:
+            conexion_dbapi.cancel()  # psycopg2: envía la cancelación por una conexión aparte
+    except Exception:
+        logger.warning("No se pudo cancelar la consulta en curso", exc_info=True)
+
+class Cancelacion:
+    """Conexiones en uso por una request (o ejecución compartida) que se cancelan juntas."""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._conexiones = set()
+        self._oyentes = []
+        self.cancelada = False
+
+    def registrar(self, conexion_dbapi):
+        with self._mutex:
+            if self.cancelada:
+                raise HTTPException(
+                    status_code=ESTADO_CLIENTE_DESCONECTADO,
+                    detail="Consulta cancelada: el cliente cerró la conexión"
+                )
+            self._conexiones.add(conexion_dbapi)
+
+    def quitar(self, conexion_dbapi):
+        with self._mutex:
+            self._conexiones.discard(conexion_dbapi)
+
+    def al_cancelar(self, funcion: Callable[[], None]):
+        """Ejecutar `funcion` al cancelar (de inmediato si ya está cancelada)."""
+        with self._mutex:
+            if not self.cancelada:
+                self._oyentes.append(funcion)
+                return
+        funcion()
+
+    def cancelar(self):
+        with self._mutex:
+            if self.cancelada:
+                return
+            self.cancelada = True
+            conexiones, self._conexiones = list(self._conexiones), set()
+            oyentes, self._oyentes = self._oyentes, []
+        for conexion_dbapi in conexiones:
+            _interrumpir(conexion_dbapi)
+        for funcion in oyentes:
+            funcion()
+
+def cancelacion_actual() -> Optional[Cancelacion]:
+    return _cancelacion.get()
+
+def con_cancelacion(cancelacion: Cancelacion, funcion: Callable):
+    """Envolver `funcion` para que sus consultas se registren en `cancelacion` (p. ej. en otro hilo)."""
+    def _ejecutar():
+        _cancelacion.set(cancelacion)  # asyncio.to_thread ejecuta en una copia del contexto
+        return funcion()
+    return _ejecutar
+
+def _es_cancelacion(error) -> bool:
+    if isinstance(error, sqlite3.OperationalError):
+        return str(error) == "interrupted"
+    # query_canceled (statement_timeout o cancel())
+    return getattr(error, "pgcode", None) == "57014"
+
+def configurar(motor):
+    """Registrar en el motor la aplicación de plazos y el seguimiento de conexiones cancelables."""
+    if not PLAZOS_HABILITADO:
+        return
+    es_sqlite = motor.dialect.name == "sqlite"
+
+    if es_sqlite:
+        def _plazo_vencido():
+            limite = _limite_sqlite.get()
+            return limite is not None and time.monotonic() > limite
+
+        @event.listens_for(motor, "connect")
+        def _instalar_plazo(conexion_dbapi, _registro):
+            conexion_dbapi.set_progress_handler(_plazo_vencido, SQLITE_INSTRUCCIONES_PLAZO)
+    else:
+        @event.listens_for(motor, "begin")
+        def _fijar_statement_timeout(conexion):
+            plazo = _plazo_ms.get()
+            if plazo:
+                conexion.exec_driver_sql(f"SET LOCAL statement_timeout = {int(plazo)}")
+
+    @event.listens_for(motor, "before_cursor_execute")
+    def _antes_de_ejecutar(conexion, cursor, sentencia, parametros, contexto, executemany):
+        if es_sqlite:
+            plazo = _plazo_ms.get()
+            _limite_sqlite.set(time.monotonic() + plazo / 1000 if plazo else None)
+        cancelacion = _cancelacion.get()
+        if cancelacion is not None and conexion.info.get("cancelacion") is not cancelacion:
+            # Registrada hasta que vuelve al pool: en SQLite las filas se leen después de execute()
+            cancelacion.registrar(cursor.connection)
+            conexion.info["cancelacion"] = cancelacion
+
+    def _liberar(conexion_dbapi, registro, *_):
+        cancelacion = registro.info.pop("cancelacion", None) if registro is not None else None
+        if cancelacion is not None:
+            cancelacion.quitar(conexion_dbapi)
+
+    event.listen(motor, "checkin", _liberar)
+    event.listen(motor, "invalidate", _liberar)
+
+    @event.listens_for(motor, "handle_error")
+    def _traducir_cancelacion(contexto):
+        if not _es_cancelacion(contexto.original_exception):
+            return
+        cancelacion = _cancelacion.get()
+        if cancelacion is not None and cancelacion.cancelada:
+            raise HTTPException(
+                status_code=ESTADO_CLIENTE_DESCONECTADO,
+                detail="Consulta cancelada: el cliente cerró la conexión"
+            ) from contexto.original_exception
+        if _plazo_ms.get():
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"La consulta superó el tiempo límite ({_plazo_ms.get()} ms)"
+            ) from contexto.original_exception
+
+class ControlPlazos:
+    """Middleware ASGI: plazo por clase de ruta y cancelación de consultas si el cliente se desconecta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        plazo = plazo_de_ruta(scope)
+        cancelacion = Cancelacion() if CANCELAR_AL_DESCONECTAR else None
+        token_plazo = _plazo_ms.set(plazo)
+        token_cancelacion = _cancelacion.set(cancelacion)
+        try:
+            if cancelacion is None:
+                return await self.app(scope, receive, send)
+            await self._vigilar_desconexion(scope, receive, send, cancelacion)
+        finally:
+            _plazo_ms.reset(token_plazo)
+            _cancelacion.reset(token_cancelacion)
+
+    async def _vigilar_desconexion(self, scope, receive, send, cancelacion: Cancelacion):
+        # Un único lector de `receive`: reenvía los mensajes a la aplicación y detecta la desconexión
+        mensajes = asyncio.Queue()
+        respondida = False
+
+        async def _leer():
+            while True:
+                mensaje = await receive()
+                mensajes.put_nowait(mensaje)
+                if mensaje["type"] == "http.disconnect":
+                    if not respondida:
+                        cancelacion.cancelar()
+                    return
+
+        async def _enviar(mensaje):
+            nonlocal respondida
+            if mensaje["type"] == "http.response.body" and not mensaje.get("more_body", False):
+                respondida = True
+            await send(mensaje)
+
+        lector = asyncio.create_task(_leer())
+        try:
+            await self.app(scope, mensajes.get, _enviar)
+        finally:
+            lector.cancel()
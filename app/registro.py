@@ -0,0 +1,139 @@
+"""
+Logging estructurado (JSON) y log de acceso sin bloquear el event loop.
+
+configurar() envía todos los registros a una cola en memoria (QueueHandler);
+un hilo de QueueListener es el único que formatea y escribe en stdout, así la
+E/S nunca ocurre dentro de una request.
+
+RegistroAcceso es el middleware ASGI del log de acceso: una línea por request
+con la plantilla de ruta, estado, latencia, tiempo de base de datos y cantidad
+de consultas. Las respuestas correctas y rápidas se muestrean con
+LOG_MUESTREO_EXITOS; los errores (>= 400) y las requests lentas se registran siempre.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from app import instrumentacion
+
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+
+LOG_ACCESO_HABILITADO = os.getenv("LOG_ACCESO_HABILITADO", "1") == "1"
+
+# Fracción de respuestas 2xx/3xx rápidas que se registran (1 = todas)
+LOG_MUESTREO_EXITOS = float(os.getenv("LOG_MUESTREO_EXITOS", "0.1"))
+
+# Por encima de esta latencia la request se registra siempre
+LOG_LENTO_MS = float(os.getenv("LOG_LENTO_MS", "500"))
+
+logger_acceso = logging.getLogger("app.acceso")
+
+# Atributos estándar de LogRecord; el resto (pasados con extra=) van al JSON
+_ATRIBUTOS_ESTANDAR = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos de `extra` al mismo nivel."""
+
+    def format(self, registro: logging.LogRecord) -> str:
+        datos = {
+            "ts": datetime.fromtimestamp(registro.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": registro.levelname,
+            "logger": registro.name,
+            "mensaje": registro.getMessage(),
+        }
+        for clave, valor in vars(registro).items():
+            if clave not in _ATRIBUTOS_ESTANDAR:
+                datos[clave] = valor
+        if registro.exc_info:
+            datos["excepcion"] = self.formatException(registro.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler_cola: Optional[logging.handlers.QueueHandler] = None
+
+def configurar():
+    """Instalar el handler con cola en el logger raíz y arrancar el hilo escritor."""
+    global _listener, _handler_cola
+    detener()
+
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormateadorJSON())
+    cola = queue.SimpleQueue()
+    _handler_cola = logging.handlers.QueueHandler(cola)
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=True)
+
+    raiz = logging.getLogger()
+    raiz.addHandler(_handler_cola)
+    raiz.setLevel(LOG_NIVEL)
+
+    # Los logs de uvicorn pasan por la misma cola; su access log lo reemplaza RegistroAcceso
+    for nombre in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(nombre).handlers.clear()
+        logging.getLogger(nombre).propagate = True
+    logging.getLogger("uvicorn.access").disabled = True
+
+    _listener.start()
+
+def detener():
+    """Vaciar la cola y detener el hilo escritor."""
+    global _listener, _handler_cola
+    if _handler_cola is not None:
+        logging.getLogger().removeHandler(_handler_cola)
+        _handler_cola = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+class RegistroAcceso:
+    """Middleware ASGI que emite una línea de log estructurada por request."""
+
+    def __init__(self, app):
+        self.app = app
+        instrumentacion.activar()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        codigo = 500
+        inicio = time.perf_counter()
+
+        async def send_registrando(mensaje):
+            nonlocal codigo
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+            await send(mensaje)
+
+        with instrumentacion.capturar() as consultas:
+            try:
+                await self.app(scope, receive, send_registrando)
+            finally:
+                self._registrar(scope, codigo, time.perf_counter() - inicio, consultas)
+
+    def _registrar(self, scope, codigo: int, segundos: float, consultas):
+        latencia_ms = segundos * 1000
+        lenta = latencia_ms >= LOG_LENTO_MS
+        if codigo < 400 and not lenta and random.random() >= LOG_MUESTREO_EXITOS:
+            return
+
+        ruta = scope.get("route")
+        nivel = logging.ERROR if codigo >= 500 else logging.WARNING if codigo >= 400 or lenta else logging.INFO
+        logger_acceso.log(nivel, "%s %s %s", scope["method"], scope["path"], codigo, extra={
+            "metodo": scope["method"],
+            "ruta": getattr(ruta, "path", None),  # Plantilla, p. ej. /api/v1/tareas/{tarea_id}
+            "path": scope["path"],
+            "estado": codigo,
+            "latencia_ms": round(latencia_ms, 2),
+            "db_ms": round(consultas.segundos * 1000, 2),
+            "consultas": consultas.cantidad,
+            "muestreo": 1.0 if codigo >= 400 or lenta else LOG_MUESTREO_EXITOS,
+            "cliente": (scope.get("client") or (None,))[0],
+        })
@@ -0,0 +1,66 @@
+"""
+Router de trabajos en segundo plano - consulta de progreso y resultado.
+Los trabajos se crean desde los endpoints pesados con ?asincrono=true (respuesta 202).
+"""
+
+import os
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models import Trabajo
+from app.schemas import TrabajoResponse, ErrorResponse
+from app.trabajos import archivo_resultado
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"],
+    responses={404: {"model": ErrorResponse}},
+)
+
+def _obtener_trabajo(db: Session, trabajo_id: str) -> Trabajo:
+    trabajo = db.get(Trabajo, trabajo_id)
+    if trabajo is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Trabajo con ID {trabajo_id} no encontrado"
+        )
+    return trabajo
+
+@router.get("/{trabajo_id}", response_model=TrabajoResponse)
+async def obtener_trabajo(
+    trabajo_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Obtener el estado, el progreso y, al terminar, el resultado o el error de un trabajo.
+
+    - **trabajo_id**: ID devuelto por el endpoint que creó el trabajo (respuesta 202)
+    """
+    return _obtener_trabajo(db, trabajo_id)
+
+@router.get("/{trabajo_id}/archivo", response_class=FileResponse)
+async def descargar_archivo_trabajo(
+    trabajo_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Descargar el archivo generado por un trabajo completado (p. ej. exportación CSV).
+
+    - **trabajo_id**: ID del trabajo
+    """
+    trabajo = _obtener_trabajo(db, trabajo_id)
+    resultado = TrabajoResponse.model_validate(trabajo).resultado
+    if trabajo.estado != "completado" or not isinstance(resultado, dict) or "archivo" not in resultado:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="El trabajo no tiene un archivo disponible"
+        )
+    ruta = archivo_resultado(trabajo.id, resultado["formato"])
+    if not os.path.exists(ruta):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="El archivo del trabajo ya no está disponible"
+        )
+    return FileResponse(ruta, media_type=resultado["media_type"], filename=resultado["archivo"])
@@ -4,16 +4,28 @@ Implementa endpoints CRUD y asignación de usuarios con validaciones cruzadas.
 Servicio sin estado (stateless) - cada request es independiente.
 """
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import select, insert, delete, literal, null, func, case
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 
-from app.database import get_db
-from app.models import Proyecto, Usuario
+from app.database import (
+    get_db_proyecto, insert_ignorando_duplicados, sesion_proyecto,
+    consultar_shards, paginar_shards, reservar_id, shard_de_id, NUM_SHARDS
+)
+from app import consultas, eventos, trabajos
+from app.coalescencia import single_flight
+from app.versiones import etag, verificar_if_match, conflicto_concurrente
+from app.models import Proyecto, Usuario, Tarea, TareaArchivada, proyecto_usuario_association
+from app.routers.tareas import _filtrar_tareas
 from app.schemas import (
-    ProyectoCreate, ProyectoUpdate, ProyectoResponse, 
-    AsignarUsuarioProyecto, ErrorResponse, SuccessResponse
+    ProyectoCreate, ProyectoUpdate, ProyectoResponse, ClonarProyecto,
+    ProyectoDetalle, ProyectoCompuestoResponse, TareaDetalle, UsuarioResponse,
+    AsignarUsuarioProyecto, AsignarUsuariosProyecto, ErrorResponse, SuccessResponse,
+    OperacionMasivaResponse, ResultadoItem, TrabajoResponse, TableroResponse, ColumnaTablero
 )
 
 router = APIRouter(
@@ -22,35 +34,51 @@ router = APIRouter(
     responses={404: {"model": ErrorResponse}},
 )
 
+def _nombre_en_uso(nombre: str, excluir_id: Optional[int] = None) -> bool:
+    """Verificar en todos los shards si otro proyecto ya usa el nombre."""
+    def _buscar(db):
+        consulta = db.query(Proyecto.id).filter(Proyecto.nombre == nombre)
+        if excluir_id is not None:
+            consulta = consulta.filter(Proyecto.id != excluir_id)
+        return consulta.first() is not None
+    
+    return any(consultar_shards(_buscar))
+
 @router.post("/", response_model=ProyectoResponse, status_code=status.HTTP_201_CREATED)
 async def crear_proyecto(
-    proyecto: ProyectoCreate,
-    db: Session = Depends(get_db)
+    proyecto: ProyectoCreate
 ):
     """
     Crear un nuevo proyecto en el sistema.
+    Con varios shards, el ID reservado determina el shard que aloja el proyecto.
     
     - **nombre**: Nombre del proyecto (3-200 caracteres)
     - **descripcion**: Descripción opcional del proyecto
     - **estado**: Estado del proyecto (activo, pausado, completado)
     - **fecha_fin**: Fecha de finalización estimada (opcional)
     """
+    # Verificar si ya existe un proyecto con el mismo nombre
+    if _nombre_en_uso(proyecto.nombre):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ya existe un proyecto con el nombre '{proyecto.nombre}'"
+        )
+    
+    proyecto_id = reservar_id("proyectos", 0)  # None con un único shard: autoincremental
+    db = sesion_proyecto(proyecto_id)
     try:
-        # Verificar si ya existe un proyecto con el mismo nombre
-        proyecto_existente = db.query(Proyecto).filter(Proyecto.nombre == proyecto.nombre).first()
-        if proyecto_existente:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Ya existe un proyecto con el nombre '{proyecto.nombre}'"
-            )
-        
         # Crear nuevo proyecto
-        db_proyecto = Proyecto(**proyecto.model_dump())
+        db_proyecto = Proyecto(id=proyecto_id, **proyecto.model_dump())
         db.add(db_proyecto)
+        db.flush()  # Obtener el ID antes del commit para el evento
+        eventos.registrar_evento(db, db_proyecto.id, "proyecto_creado", {
+            "nombre": db_proyecto.nombre,
+            "estado": db_proyecto.estado
+        })
         db.commit()  # Commit explícito para ACID
         db.refresh(db_proyecto)
         
-        return db_proyecto
+        return ProyectoResponse.model_validate(db_proyecto)
         
     except IntegrityError:
         db.rollback()  # Rollback en caso de error para mantener ACID
@@ -58,61 +86,211 @@ async def crear_proyecto(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Error de integridad en la base de datos"
         )
+    finally:
+        db.close()
 
 @router.get("/", response_model=List[ProyectoResponse])
 async def listar_proyectos(
     skip: int = 0,
     limit: int = 100,
-    estado: str = None,
-    db: Session = Depends(get_db)
+    estado: str = None
 ):
     """
     Obtener lista de todos los proyectos con sus usuarios asignados.
     Soporta filtrado por estado y paginación para escalabilidad.
+    Con varios shards, combina por ID las páginas de cada uno (scatter-gather).
     
     - **skip**: Número de registros a omitir (default: 0)
     - **limit**: Número máximo de registros a devolver (default: 100)
     - **estado**: Filtrar por estado (activo, pausado, completado)
     """
-    query = db.query(Proyecto)
-    
-    # Filtrar por estado si se proporciona
-    if estado:
-        query = query.filter(Proyecto.estado == estado)
+    def _pagina(db, offset, limite):
+        query = db.query(Proyecto)
+        
+        # Filtrar por estado si se proporciona
+        if estado:
+            query = query.filter(Proyecto.estado == estado)
+        
+        proyectos = query.order_by(Proyecto.id).offset(offset).limit(limite).all()
+        return [ProyectoResponse.model_validate(proyecto) for proyecto in proyectos]
     
-    proyectos = query.offset(skip).limit(limit).all()
-    return proyectos
+    return paginar_shards(_pagina, skip, limit)
+
+def _cargar_proyecto_json(proyecto_id: int):
+    """Consultar y serializar un proyecto (se ejecuta una vez por grupo coalescido); devuelve (cuerpo, versión)."""
+    with sesion_proyecto(proyecto_id) as db:
+        proyecto = consultas.obtener(db, Proyecto, proyecto_id)
+        
+        if not proyecto:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Proyecto con ID {proyecto_id} no encontrado"
+            )
+        
+        return ProyectoResponse.model_validate(proyecto).model_dump_json().encode(), proyecto.version
 
-@router.get("/{proyecto_id}", response_model=ProyectoResponse)
+# Relaciones admitidas en ?include= (tareas.usuario_responsable implica tareas)
+INCLUDES_PROYECTO = {"tareas", "usuarios", "tareas.usuario_responsable"}
+
+def _cargar_proyecto_compuesto_json(proyecto_id: int, incluir: frozenset, skip: int, limit: int, filtros: dict) -> bytes:
+    """
+    Documento compuesto en una cantidad fija de consultas: proyecto, miembros,
+    página de tareas y responsables que no sean miembros (un IN por lote).
+    """
+    with sesion_proyecto(proyecto_id) as db:
+        proyecto = consultas.obtener(db, Proyecto, proyecto_id)
+        if not proyecto:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Proyecto con ID {proyecto_id} no encontrado"
+            )
+        documento = ProyectoCompuestoResponse(proyecto=ProyectoDetalle.model_validate(proyecto))
+        usuarios = {}
+        
+        if "usuarios" in incluir:
+            pu = proyecto_usuario_association
+            miembros = db.scalars(
+                select(Usuario).join(pu, pu.c.usuario_id == Usuario.id)
+                .where(pu.c.proyecto_id == proyecto_id).order_by(Usuario.id)
+            ).all()
+            documento.usuario_ids = [usuario.id for usuario in miembros]
+            usuarios.update((usuario.id, usuario) for usuario in miembros)
+        
+        if "tareas" in incluir:
+            tareas = db.scalars(
+                _filtrar_tareas(select(Tarea), Tarea, proyecto_id=proyecto_id, **filtros)
+                .order_by(Tarea.id).offset(skip).limit(limit)
+            ).all()
+            documento.tareas = [TareaDetalle.model_validate(tarea) for tarea in tareas]
+            
+            if "tareas.usuario_responsable" in incluir:
+                faltantes = {tarea.usuario_responsable_id for tarea in tareas} - set(usuarios) - {None}
+                if faltantes:
+                    usuarios.update(
+                        (usuario.id, usuario)
+                        for usuario in db.scalars(select(Usuario).where(Usuario.id.in_(faltantes)))
+                    )
+        
+        documento.usuarios = [UsuarioResponse.model_validate(usuarios[clave]) for clave in sorted(usuarios)]
+        return documento.model_dump_json().encode()
+
+@router.get("/{proyecto_id}", response_model=Union[ProyectoResponse, ProyectoCompuestoResponse])
 async def obtener_proyecto(
     proyecto_id: int,
-    db: Session = Depends(get_db)
+    include: Optional[str] = None,
+    tareas_skip: int = Query(0, ge=0),
+    tareas_limit: int = Query(100, ge=1, le=1000),
+    tareas_estado: Optional[str] = None,
+    tareas_usuario_responsable_id: Optional[int] = None
 ):
     """
     Obtener información detallada de un proyecto específico.
     Incluye usuarios asignados al proyecto.
+    Requests concurrentes idénticas comparten una única consulta (single-flight).
+    La versión se devuelve en el header ETag (para usar con If-Match en PUT).
+    
+    Con include, devuelve un documento compuesto (ProyectoCompuestoResponse) con el
+    proyecto y sus relaciones en una sola respuesta, sin usuarios duplicados y sin ETag.
     
     - **proyecto_id**: ID único del proyecto
+    - **include**: Relaciones separadas por coma: tareas, usuarios, tareas.usuario_responsable
+    - **tareas_skip**: Tareas a omitir (default: 0)
+    - **tareas_limit**: Máximo de tareas (1-1000, default: 100)
+    - **tareas_estado**: Filtrar las tareas por estado
+    - **tareas_usuario_responsable_id**: Filtrar las tareas por responsable
     """
-    proyecto = db.query(Proyecto).filter(Proyecto.id == proyecto_id).first()
+    if include:
+        incluir = frozenset(parte.strip() for parte in include.split(",") if parte.strip())
+        desconocidos = incluir - INCLUDES_PROYECTO
+        if desconocidos:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"include no admitido: {', '.join(sorted(desconocidos))}. "
+                       f"Valores posibles: {', '.join(sorted(INCLUDES_PROYECTO))}"
+            )
+        if "tareas.usuario_responsable" in incluir:
+            incluir |= {"tareas"}
+        filtros = {"estado": tareas_estado, "usuario_responsable_id": tareas_usuario_responsable_id}
+        cuerpo = await single_flight.ejecutar(
+            ("obtener_proyecto_compuesto", proyecto_id, incluir, tareas_skip, tareas_limit, *filtros.values()),
+            lambda: _cargar_proyecto_compuesto_json(proyecto_id, incluir, tareas_skip, tareas_limit, filtros)
+        )
+        return Response(content=cuerpo, media_type="application/json")
     
-    if not proyecto:
+    cuerpo, version = await single_flight.ejecutar(
+        ("obtener_proyecto", proyecto_id),
+        lambda: _cargar_proyecto_json(proyecto_id)
+    )
+    return Response(content=cuerpo, media_type="application/json", headers={"ETag": etag(version)})
+
+# Columnas del tablero, en orden
+ESTADOS_TABLERO = ("pendiente", "en_progreso", "completada")
+
+def consulta_tablero(proyecto_id: int, limite: int):
+    """
+    Primeras `limite` tareas de cada estado del proyecto, con el total de su columna.
+    Una sola consulta: ROW_NUMBER() y COUNT(*) particionados por estado sobre las
+    tareas del proyecto; solo las filas numeradas hasta `limite` salen de la base.
+    """
+    orden_prioridad = case({"alta": 0, "media": 1, "baja": 2}, value=Tarea.prioridad, else_=3)
+    numeradas = select(
+        Tarea,
+        func.row_number().over(
+            partition_by=Tarea.estado,
+            order_by=(orden_prioridad, Tarea.fecha_vencimiento.asc().nulls_last(), Tarea.id)
+        ).label("fila"),
+        func.count().over(partition_by=Tarea.estado).label("total"),
+    ).where(Tarea.proyecto_id == proyecto_id).subquery()
+    tarea = aliased(Tarea, numeradas)
+    return (
+        select(tarea, numeradas.c.total)
+        .where(numeradas.c.fila <= limite)
+        .order_by(numeradas.c.estado, numeradas.c.fila)
+    )
+
+@router.get("/{proyecto_id}/tablero", response_model=TableroResponse)
+async def obtener_tablero(
+    proyecto_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db_proyecto)
+):
+    """
+    Tablero del proyecto: las primeras tareas de cada columna (pendiente, en_progreso,
+    completada) ordenadas por prioridad y vencimiento (sin vencimiento al final),
+    más el total de tareas de cada columna.
+    
+    - **proyecto_id**: ID único del proyecto
+    - **limit**: Máximo de tareas por columna (1-100, default: 20)
+    """
+    columnas = {estado: ColumnaTablero(estado=estado, total=0, tareas=[]) for estado in ESTADOS_TABLERO}
+    for tarea, total in db.execute(consulta_tablero(proyecto_id, limit)):
+        columna = columnas.get(tarea.estado)
+        if columna is None:
+            continue
+        columna.total = total
+        columna.tareas.append(TareaDetalle.model_validate(tarea))
+    
+    # Sin filas: el proyecto no tiene tareas o no existe
+    if not any(columna.total for columna in columnas.values()) and not consultas.existe(db, Proyecto, proyecto_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Proyecto con ID {proyecto_id} no encontrado"
         )
     
-    return proyecto
+    return TableroResponse(proyecto_id=proyecto_id, limite=limit, columnas=list(columnas.values()))
 
 @router.put("/{proyecto_id}", response_model=ProyectoResponse)
 async def actualizar_proyecto(
     proyecto_id: int,
     proyecto_update: ProyectoUpdate,
-    db: Session = Depends(get_db)
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db_proyecto)
 ):
     """
     Actualizar información de un proyecto existente.
     Solo actualiza los campos proporcionados (PATCH semantics).
+    Con If-Match, responde 412 si el proyecto cambió desde que se leyó (ETag).
     
     - **proyecto_id**: ID único del proyecto
     - **nombre**: Nuevo nombre (opcional)
@@ -121,7 +299,7 @@ async def actualizar_proyecto(
     - **fecha_fin**: Nueva fecha de finalización (opcional)
     """
     # Buscar proyecto existente
-    db_proyecto = db.query(Proyecto).filter(Proyecto.id == proyecto_id).first()
+    db_proyecto = consultas.obtener(db, Proyecto, proyecto_id)
     
     if not db_proyecto:
         raise HTTPException(
@@ -129,17 +307,15 @@ async def actualizar_proyecto(
             detail=f"Proyecto con ID {proyecto_id} no encontrado"
         )
     
+    verificar_if_match(if_match, db_proyecto.version)
+    
     try:
         # Actualizar solo los campos proporcionados
         update_data = proyecto_update.model_dump(exclude_unset=True)
         
-        # Verificar nombre único si se está actualizando
+        # Verificar nombre único (en todos los shards) si se está actualizando
         if "nombre" in update_data:
-            existing_nombre = db.query(Proyecto).filter(
-                Proyecto.nombre == update_data["nombre"],
-                Proyecto.id != proyecto_id
-            ).first()
-            if existing_nombre:
+            if _nombre_en_uso(update_data["nombre"], excluir_id=proyecto_id):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Ya existe un proyecto con el nombre '{update_data['nombre']}'"
@@ -149,11 +325,16 @@ async def actualizar_proyecto(
         for field, value in update_data.items():
             setattr(db_proyecto, field, value)
         
-        db.commit()  # Commit explícito para ACID
+        eventos.registrar_evento(db, proyecto_id, "proyecto_actualizado", {"campos": update_data})
+        db.commit()  # Commit explícito para ACID (UPDATE ... WHERE id = ? AND version = ?)
         db.refresh(db_proyecto)
         
+        response.headers["ETag"] = etag(db_proyecto.version)
         return db_proyecto
         
+    except StaleDataError:
+        db.rollback()
+        raise conflicto_concurrente(if_match)
     except IntegrityError:
         db.rollback()
         raise HTTPException(
@@ -161,41 +342,193 @@ async def actualizar_proyecto(
             detail="Error de integridad en la base de datos"
         )
 
-@router.delete("/{proyecto_id}", status_code=status.HTTP_204_NO_CONTENT)
+@trabajos.tipo("eliminar_proyecto")
+def _trabajo_eliminar_proyecto(parametros: dict, progreso: trabajos.Progreso) -> dict:
+    """
+    Eliminar las tareas del proyecto en lotes de TRABAJOS_LOTE (transacciones cortas que no
+    bloquean la tabla) y luego el proyecto. Repetible: un reintento continúa donde quedó.
+    """
+    proyecto_id = parametros["proyecto_id"]
+    with sesion_proyecto(proyecto_id) as db:
+        total = sum(
+            db.scalar(select(func.count()).select_from(modelo).where(modelo.proyecto_id == proyecto_id))
+            for modelo in (Tarea, TareaArchivada)
+        )
+        progreso(0, total)
+        
+        eliminadas = 0
+        for modelo in (Tarea, TareaArchivada):
+            while True:
+                lote = select(modelo.id).where(modelo.proyecto_id == proyecto_id).limit(trabajos.TRABAJOS_LOTE)
+                cantidad = db.execute(delete(modelo).where(modelo.id.in_(lote))).rowcount
+                db.commit()
+                if cantidad == 0:
+                    break
+                eliminadas += cantidad
+                progreso(eliminadas, total)
+        
+        eliminado = db.execute(
+            delete(Proyecto).where(Proyecto.id == proyecto_id).returning(Proyecto.id)
+        ).first()
+        if eliminado is not None:
+            eventos.registrar_evento(db, proyecto_id, "proyecto_eliminado")
+        db.commit()
+    
+    return {"proyecto_id": proyecto_id, "tareas_eliminadas": eliminadas}
+
+@router.delete("/{proyecto_id}", status_code=status.HTTP_204_NO_CONTENT, responses={202: {"model": TrabajoResponse}})
 async def eliminar_proyecto(
     proyecto_id: int,
-    db: Session = Depends(get_db)
+    asincrono: bool = False,
+    db: Session = Depends(get_db_proyecto)
 ):
     """
     Eliminar un proyecto del sistema.
     También elimina todas las tareas asociadas (CASCADE).
+    Un único DELETE: las tareas y asignaciones las elimina la base de datos
+    (ON DELETE CASCADE), sin cargarlas en la sesión.
     
     - **proyecto_id**: ID único del proyecto a eliminar
+    - **asincrono**: Eliminar en segundo plano, las tareas por lotes; responde 202 con el
+      trabajo (progreso en GET /api/v1/jobs/{id})
     """
-    db_proyecto = db.query(Proyecto).filter(Proyecto.id == proyecto_id).first()
+    if asincrono:
+        if not consultas.existe(db, Proyecto, proyecto_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Proyecto con ID {proyecto_id} no encontrado"
+            )
+        return trabajos.respuesta_aceptada(trabajos.encolar("eliminar_proyecto", {"proyecto_id": proyecto_id}))
     
-    if not db_proyecto:
+    try:
+        eliminado = db.execute(
+            delete(Proyecto).where(Proyecto.id == proyecto_id).returning(Proyecto.id)
+        ).first()
+        
+        if eliminado is None:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Proyecto con ID {proyecto_id} no encontrado"
+            )
+        
+        eventos.registrar_evento(db, proyecto_id, "proyecto_eliminado")
+        db.commit()  # Commit explícito para ACID
+        
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Proyecto con ID {proyecto_id} no encontrado"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No se puede eliminar el proyecto debido a dependencias"
+        )
+
+@router.post("/{proyecto_id}/clonar", response_model=ProyectoResponse, status_code=status.HTTP_201_CREATED)
+async def clonar_proyecto(
+    proyecto_id: int,
+    clonacion: ClonarProyecto
+):
+    """
+    Crear un proyecto como copia de otro (plantilla), en una transacción.
+    Usuarios y tareas se copian con INSERT ... SELECT: unas pocas sentencias
+    independientemente del tamaño del proyecto. El clon queda en el shard de la plantilla.
+    
+    - **proyecto_id**: ID del proyecto plantilla
+    - **nombre**: Nombre del nuevo proyecto
+    - **descripcion**: Descripción (opcional, por defecto la de la plantilla)
+    - **fecha_fin**: Fecha de finalización estimada (opcional)
+    - **incluir_usuarios**: Copiar los usuarios asignados (default: true)
+    - **incluir_tareas**: Copiar las tareas (default: true)
+    - **incluir_completadas**: Copiar también las tareas completadas (default: true)
+    - **reiniciar_estado**: Dejar las tareas en pendiente (default: true)
+    - **conservar_responsables**: Mantener los responsables de las tareas (default: false)
+    - **conservar_vencimientos**: Mantener las fechas de vencimiento (default: false)
+    """
+    if _nombre_en_uso(clonacion.nombre):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ya existe un proyecto con el nombre '{clonacion.nombre}'"
         )
     
+    db = sesion_proyecto(proyecto_id)
     try:
-        db.delete(db_proyecto)
-        db.commit()  # Commit explícito para ACID
+        plantilla = consultas.obtener(db, Proyecto, proyecto_id)
+        if not plantilla:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Proyecto con ID {proyecto_id} no encontrado"
+            )
+        
+        # Tareas a copiar: se fija el ID máximo para que las creadas mientras tanto no entren
+        condiciones = [Tarea.proyecto_id == proyecto_id]
+        if not clonacion.incluir_completadas:
+            condiciones.append(Tarea.estado != "completada")
+        cantidad, max_id = db.execute(select(func.count(), func.max(Tarea.id)).where(*condiciones)).one() \
+            if clonacion.incluir_tareas else (0, None)
+        
+        # Con varios shards, los IDs se reservan antes de escribir (el clon queda junto a la plantilla)
+        shard = shard_de_id(proyecto_id)
+        nuevo_id = reservar_id("proyectos", 0, en_shard=shard)
+        primer_tarea_id = reservar_id("tareas", shard, cantidad) if cantidad else None
+        
+        nuevo = Proyecto(
+            id=nuevo_id,
+            nombre=clonacion.nombre,
+            descripcion=clonacion.descripcion if clonacion.descripcion is not None else plantilla.descripcion,
+            fecha_fin=clonacion.fecha_fin
+        )
+        db.add(nuevo)
+        db.flush()
+        
+        if clonacion.incluir_usuarios:
+            pu = proyecto_usuario_association
+            db.execute(insert(pu).from_select(
+                ["proyecto_id", "usuario_id"],
+                select(literal(nuevo.id), pu.c.usuario_id).where(pu.c.proyecto_id == proyecto_id)
+            ))
+        
+        if cantidad:
+            columnas = {
+                "titulo": Tarea.titulo,
+                "descripcion": Tarea.descripcion,
+                "estado": literal("pendiente") if clonacion.reiniciar_estado else Tarea.estado,
+                "prioridad": Tarea.prioridad,
+                "fecha_vencimiento": Tarea.fecha_vencimiento if clonacion.conservar_vencimientos else null(),
+                "usuario_responsable_id": Tarea.usuario_responsable_id if clonacion.conservar_responsables else null(),
+                "proyecto_id": literal(nuevo.id),
+            }
+            if primer_tarea_id is not None:
+                # IDs del bloque reservado, en el orden de la plantilla
+                columnas["id"] = primer_tarea_id + (func.row_number().over(order_by=Tarea.id) - 1) * NUM_SHARDS
+            db.execute(insert(Tarea).from_select(
+                list(columnas),
+                select(*columnas.values()).where(*condiciones, Tarea.id <= max_id)
+                .order_by(Tarea.id).limit(cantidad)
+            ))
+        
+        eventos.registrar_evento(db, nuevo.id, "proyecto_creado", {
+            "nombre": nuevo.nombre,
+            "estado": nuevo.estado,
+            "clonado_de": proyecto_id
+        })
+        db.commit()  # Commit explícito para ACID: proyecto, usuarios y tareas juntos
+        db.refresh(nuevo)
+        
+        return ProyectoResponse.model_validate(nuevo)
         
     except IntegrityError:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No se puede eliminar el proyecto debido a dependencias"
+            detail="Error de integridad al clonar el proyecto"
         )
+    finally:
+        db.close()
 
 @router.post("/{proyecto_id}/asignar_usuario", response_model=SuccessResponse)
 async def asignar_usuario_proyecto(
     proyecto_id: int,
     asignacion: AsignarUsuarioProyecto,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_proyecto)
 ):
     """
     Asignar un usuario existente a un proyecto.
@@ -205,7 +538,7 @@ async def asignar_usuario_proyecto(
     - **usuario_id**: ID único del usuario a asignar
     """
     # Verificar que el proyecto existe
-    proyecto = db.query(Proyecto).filter(Proyecto.id == proyecto_id).first()
+    proyecto = consultas.obtener(db, Proyecto, proyecto_id)
     if not proyecto:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -213,7 +546,7 @@ async def asignar_usuario_proyecto(
         )
     
     # Verificar que el usuario existe (validación cruzada con GestorUsuarios)
-    usuario = db.query(Usuario).filter(Usuario.id == asignacion.usuario_id).first()
+    usuario = consultas.obtener(db, Usuario, asignacion.usuario_id)
     if not usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -221,15 +554,16 @@ async def asignar_usuario_proyecto(
         )
     
     # Verificar si el usuario ya está asignado al proyecto
-    if usuario in proyecto.usuarios:
+    if consultas.es_miembro(db, proyecto_id, usuario.id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"El usuario {usuario.nombre} ya está asignado al proyecto {proyecto.nombre}"
         )
     
     try:
-        # Asignar usuario al proyecto
-        proyecto.usuarios.append(usuario)
+        # Asignar usuario al proyecto (sin cargar la colección de miembros)
+        db.execute(insert(proyecto_usuario_association).values(proyecto_id=proyecto_id, usuario_id=usuario.id))
+        eventos.registrar_evento(db, proyecto_id, "usuario_asignado", {"usuario_ids": [usuario.id]})
         db.commit()  # Commit explícito para ACID
         
         return SuccessResponse(
@@ -253,7 +587,7 @@ async def asignar_usuario_proyecto(
 async def desasignar_usuario_proyecto(
     proyecto_id: int,
     usuario_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_proyecto)
 ):
     """
     Desasignar un usuario de un proyecto.
@@ -262,7 +596,7 @@ async def desasignar_usuario_proyecto(
     - **usuario_id**: ID único del usuario a desasignar
     """
     # Verificar que el proyecto existe
-    proyecto = db.query(Proyecto).filter(Proyecto.id == proyecto_id).first()
+    proyecto = consultas.obtener(db, Proyecto, proyecto_id)
     if not proyecto:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -270,7 +604,7 @@ async def desasignar_usuario_proyecto(
         )
     
     # Verificar que el usuario existe
-    usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
+    usuario = consultas.obtener(db, Usuario, usuario_id)
     if not usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -278,15 +612,19 @@ async def desasignar_usuario_proyecto(
         )
     
     # Verificar si el usuario está asignado al proyecto
-    if usuario not in proyecto.usuarios:
+    if not consultas.es_miembro(db, proyecto_id, usuario.id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"El usuario {usuario.nombre} no está asignado al proyecto {proyecto.nombre}"
         )
     
     try:
-        # Desasignar usuario del proyecto
-        proyecto.usuarios.remove(usuario)
+        # Desasignar usuario del proyecto (sin cargar la colección de miembros)
+        db.execute(delete(proyecto_usuario_association).where(
+            proyecto_usuario_association.c.proyecto_id == proyecto_id,
+            proyecto_usuario_association.c.usuario_id == usuario.id
+        ))
+        eventos.registrar_evento(db, proyecto_id, "usuario_desasignado", {"usuario_ids": [usuario.id]})
         db.commit()  # Commit explícito para ACID
         
         return SuccessResponse(
@@ -304,4 +642,163 @@ async def desasignar_usuario_proyecto(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Error al desasignar usuario del proyecto"
-        )
\ No newline at end of file
+        )
+
+@router.post("/{proyecto_id}/asignar_usuarios", response_model=OperacionMasivaResponse)
+async def asignar_usuarios_proyecto(
+    proyecto_id: int,
+    asignacion: AsignarUsuariosProyecto,
+    db: Session = Depends(get_db_proyecto)
+):
+    """
+    Asignar varios usuarios a un proyecto en una sola operación.
+    La validación es por conjuntos: una consulta de usuarios existentes y un único
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING, independientemente de la cantidad.
+    
+    - **proyecto_id**: ID único del proyecto
+    - **usuario_ids**: IDs de los usuarios a asignar (máximo 1000)
+    """
+    # Verificar que el proyecto existe (sin cargar la entidad completa)
+    if not consultas.existe(db, Proyecto, proyecto_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Proyecto con ID {proyecto_id} no encontrado"
+        )
+    
+    usuario_ids = list(dict.fromkeys(asignacion.usuario_ids))  # Quitar duplicados conservando el orden
+    
+    try:
+        existentes = set(db.scalars(select(Usuario.id).where(Usuario.id.in_(usuario_ids))))
+        
+        # Insertar solo usuarios existentes; las asignaciones previas se ignoran por la PK compuesta
+        asignacion_stmt = insert_ignorando_duplicados(db, proyecto_usuario_association).from_select(
+            ["proyecto_id", "usuario_id"],
+            select(literal(proyecto_id), Usuario.id).where(Usuario.id.in_(usuario_ids))
+        ).returning(proyecto_usuario_association.c.usuario_id)
+        asignados = set(db.scalars(asignacion_stmt))
+        if asignados:
+            eventos.registrar_evento(db, proyecto_id, "usuario_asignado", {"usuario_ids": sorted(asignados)})
+        db.commit()  # Commit explícito para ACID
+        
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Error al asignar usuarios al proyecto"
+        )
+    
+    resultados = []
+    for usuario_id in usuario_ids:
+        if usuario_id in asignados:
+            resultados.append(ResultadoItem(id=usuario_id, resultado="asignado"))
+        elif usuario_id in existentes:
+            resultados.append(ResultadoItem(
+                id=usuario_id, resultado="ya_asignado",
+                detalle="El usuario ya está asignado al proyecto"
+            ))
+        else:
+            resultados.append(ResultadoItem(
+                id=usuario_id, resultado="usuario_no_encontrado",
+                detalle=f"Usuario con ID {usuario_id} no encontrado"
+            ))
+    
+    return OperacionMasivaResponse(
+        message=f"{len(asignados)} de {len(usuario_ids)} usuarios asignados al proyecto {proyecto_id}",
+        procesados=len(usuario_ids),
+        exitosos=len(asignados),
+        resultados=resultados
+    )
+
+@router.post("/{proyecto_id}/desasignar_usuarios", response_model=OperacionMasivaResponse)
+async def desasignar_usuarios_proyecto(
+    proyecto_id: int,
+    desasignacion: AsignarUsuariosProyecto,
+    db: Session = Depends(get_db_proyecto)
+):
+    """
+    Desasignar varios usuarios de un proyecto en una sola operación.
+    Usa un único DELETE ... WHERE usuario_id IN (...) con RETURNING.
+    
+    - **proyecto_id**: ID único del proyecto
+    - **usuario_ids**: IDs de los usuarios a desasignar (máximo 1000)
+    """
+    # Verificar que el proyecto existe (sin cargar la entidad completa)
+    if not consultas.existe(db, Proyecto, proyecto_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Proyecto con ID {proyecto_id} no encontrado"
+        )
+    
+    usuario_ids = list(dict.fromkeys(desasignacion.usuario_ids))
+    
+    try:
+        existentes = set(db.scalars(select(Usuario.id).where(Usuario.id.in_(usuario_ids))))
+        
+        desasignacion_stmt = delete(proyecto_usuario_association).where(
+            proyecto_usuario_association.c.proyecto_id == proyecto_id,
+            proyecto_usuario_association.c.usuario_id.in_(usuario_ids)
+        ).returning(proyecto_usuario_association.c.usuario_id)
+        desasignados = set(db.scalars(desasignacion_stmt))
+        if desasignados:
+            eventos.registrar_evento(db, proyecto_id, "usuario_desasignado", {"usuario_ids": sorted(desasignados)})
+        db.commit()  # Commit explícito para ACID
+        
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Error al desasignar usuarios del proyecto"
+        )
+    
+    resultados = []
+    for usuario_id in usuario_ids:
+        if usuario_id in desasignados:
+            resultados.append(ResultadoItem(id=usuario_id, resultado="desasignado"))
+        elif usuario_id in existentes:
+            resultados.append(ResultadoItem(
+                id=usuario_id, resultado="no_asignado",
+                detalle="El usuario no está asignado al proyecto"
+            ))
+        else:
+            resultados.append(ResultadoItem(
+                id=usuario_id, resultado="usuario_no_encontrado",
+                detalle=f"Usuario con ID {usuario_id} no encontrado"
+            ))
+    
+    return OperacionMasivaResponse(
+        message=f"{len(desasignados)} de {len(usuario_ids)} usuarios desasignados del proyecto {proyecto_id}",
+        procesados=len(usuario_ids),
+        exitosos=len(desasignados),
+        resultados=resultados
+    )
+
+@router.get("/{proyecto_id}/eventos")
+async def stream_eventos_proyecto(
+    proyecto_id: int,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    db: Session = Depends(get_db_proyecto)
+):
+    """
+    Stream Server-Sent Events con los cambios de tareas y membresías del proyecto.
+    Reemplaza el polling de listar_tareas?proyecto_id=.
+    
+    - **proyecto_id**: ID único del proyecto
+    - **Last-Event-ID**: (header) reanudar a partir del último evento recibido.
+      Si ya no está en el historial se emite un evento `reset` y el cliente debe recargar.
+    """
+    if not consultas.existe(db, Proyecto, proyecto_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Proyecto con ID {proyecto_id} no encontrado"
+        )
+    
+    # Devolver la conexión al pool: el stream puede durar horas
+    db.close()
+    
+    suscripcion, pendientes, requiere_reset = eventos.bus.suscribir(proyecto_id, last_event_id)
+    return StreamingResponse(
+        eventos.generar_stream(request, suscripcion, pendientes, requiere_reset),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
@@ -4,16 +4,35 @@ Implementa endpoints CRUD con validaciones cruzadas entre usuarios y proyectos.
 Servicio sin estado (stateless) - cada request es independiente.
 """
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+import csv
+import heapq
+import io
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, status
+from fastapi.responses import Response, StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import select, update, delete, case, or_
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 
-from app.database import get_db
-from app.models import Tarea, Usuario, Proyecto
+from app.database import (
+    get_db, get_db_tarea, sesion_proyecto, sesion_shard, shard_de_id, agrupar_por_shard,
+    indices_para_proyecto, consultar_shards, paginar_shards, reservar_id, NUM_SHARDS
+)
+from app import consultas, eventos, trabajos
+from app.coalescencia import single_flight
+from app.versiones import etag, verificar_if_match, conflicto_concurrente
+from app.models import (
+    Tarea, TareaArchivada, Usuario, Proyecto, ResumenVencimientos, proyecto_usuario_association
+)
 from app.schemas import (
     TareaCreate, TareaUpdate, TareaResponse, 
-    AsignarUsuarioTarea, ErrorResponse, SuccessResponse
+    AsignarUsuarioTarea, AsignarUsuarioTareas, ErrorResponse, SuccessResponse,
+    OperacionMasivaResponse, ResultadoItem, ResumenVencimientosResponse, ResumenVencimientosItem,
+    TransicionTareas, TransicionTareasResponse
 )
 
 router = APIRouter(
@@ -22,13 +41,23 @@ router = APIRouter(
     responses={404: {"model": ErrorResponse}},
 )
 
+def _datos_evento_tarea(tarea: Tarea) -> dict:
+    """Campos de la tarea incluidos en los eventos de cambio."""
+    return {
+        "tarea_id": tarea.id,
+        "titulo": tarea.titulo,
+        "estado": tarea.estado,
+        "prioridad": tarea.prioridad,
+        "fecha_vencimiento": tarea.fecha_vencimiento,
+        "usuario_responsable_id": tarea.usuario_responsable_id,
+    }
+
 @router.post("/", response_model=TareaResponse, status_code=status.HTTP_201_CREATED)
 async def crear_tarea(
-    tarea: TareaCreate,
-    db: Session = Depends(get_db)
+    tarea: TareaCreate
 ):
     """
-    Crear una nueva tarea en el sistema.
+    Crear una nueva tarea en el sistema (en el shard de su proyecto).
     Valida que el proyecto especificado exista (validación cruzada con GestorProyectos).
     
     - **titulo**: Título de la tarea (3-200 caracteres)
@@ -38,22 +67,24 @@ async def crear_tarea(
     - **fecha_vencimiento**: Fecha de vencimiento (opcional)
     - **proyecto_id**: ID del proyecto al que pertenece (requerido)
     """
-    # Verificar que el proyecto existe (validación cruzada con GestorProyectos)
-    proyecto = db.query(Proyecto).filter(Proyecto.id == tarea.proyecto_id).first()
-    if not proyecto:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Proyecto con ID {tarea.proyecto_id} no encontrado"
-        )
-    
+    db = sesion_proyecto(tarea.proyecto_id)
     try:
-        # Crear nueva tarea
-        db_tarea = Tarea(**tarea.model_dump())
+        # Verificar que el proyecto existe (validación cruzada con GestorProyectos)
+        if not consultas.existe(db, Proyecto, tarea.proyecto_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Proyecto con ID {tarea.proyecto_id} no encontrado"
+            )
+        
+        # Crear nueva tarea (con varios shards, el ID se reserva en el shard del proyecto)
+        db_tarea = Tarea(id=reservar_id("tareas", shard_de_id(tarea.proyecto_id)), **tarea.model_dump())
         db.add(db_tarea)
+        db.flush()  # Obtener el ID antes del commit para el evento
+        eventos.registrar_evento(db, db_tarea.proyecto_id, "tarea_creada", _datos_evento_tarea(db_tarea))
         db.commit()  # Commit explícito para ACID
         db.refresh(db_tarea)
         
-        return db_tarea
+        return TareaResponse.model_validate(db_tarea)
         
     except IntegrityError:
         db.rollback()  # Rollback en caso de error para mantener ACID
@@ -61,6 +92,49 @@ async def crear_tarea(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Error de integridad en la base de datos"
         )
+    finally:
+        db.close()
+
+_lista_tareas_adapter = TypeAdapter(List[TareaResponse])
+
+def _filtrar_tareas(consulta, modelo, proyecto_id=None, estado=None, usuario_responsable_id=None,
+                    vence_desde=None, vence_hasta=None):
+    """Aplicar los filtros de listado a una consulta sobre tareas activas o archivadas."""
+    if proyecto_id:
+        consulta = consulta.filter(modelo.proyecto_id == proyecto_id)
+    if estado:
+        consulta = consulta.filter(modelo.estado == estado)
+    if usuario_responsable_id:
+        consulta = consulta.filter(modelo.usuario_responsable_id == usuario_responsable_id)
+    if vence_desde:
+        consulta = consulta.filter(modelo.fecha_vencimiento >= vence_desde)
+    if vence_hasta:
+        consulta = consulta.filter(modelo.fecha_vencimiento <= vence_hasta)
+    return consulta
+
+def _cargar_tareas_json(skip, limit, incluir_archivadas, **filtros) -> bytes:
+    """
+    Consultar y serializar una página de tareas (una vez por grupo coalescido).
+    Sin filtro de proyecto y con varios shards, combina por ID las páginas de cada shard.
+    """
+    def _pagina(db, offset, limite):
+        if not incluir_archivadas:
+            # Camino habitual: solo el conjunto activo
+            consulta = _filtrar_tareas(db.query(Tarea), Tarea, **filtros)
+            if NUM_SHARDS > 1:
+                consulta = consulta.order_by(Tarea.id)  # Orden común para combinar shards
+            tareas = consulta.offset(offset).limit(limite).all()
+        else:
+            # Paginación combinada por ID: cada tabla aporta como máximo offset + limite filas
+            activas = _filtrar_tareas(db.query(Tarea), Tarea, **filtros) \
+                .order_by(Tarea.id).limit(offset + limite).all()
+            archivadas = _filtrar_tareas(db.query(TareaArchivada), TareaArchivada, **filtros) \
+                .order_by(TareaArchivada.id).limit(offset + limite).all()
+            tareas = list(heapq.merge(activas, archivadas, key=lambda tarea: tarea.id))[offset:offset + limite]
+        return _lista_tareas_adapter.validate_python(tareas, from_attributes=True)
+    
+    tareas = paginar_shards(_pagina, skip, limit, indices=indices_para_proyecto(filtros["proyecto_id"]))
+    return _lista_tareas_adapter.dump_json(tareas)
 
 @router.get("/", response_model=List[TareaResponse])
 async def listar_tareas(
@@ -69,43 +143,256 @@ async def listar_tareas(
     proyecto_id: int = None,
     estado: str = None,
     usuario_responsable_id: int = None,
-    db: Session = Depends(get_db)
+    vence_desde: Optional[datetime] = None,
+    vence_hasta: Optional[datetime] = None,
+    incluir_archivadas: bool = False
 ):
     """
     Obtener lista de todas las tareas con filtros opcionales.
-    Soporta filtrado por proyecto, estado, usuario responsable y paginación.
+    Soporta filtrado por proyecto, estado, usuario responsable, rango de vencimiento y paginación.
+    Requests concurrentes idénticas comparten una única consulta (single-flight).
     
     - **skip**: Número de registros a omitir (default: 0)
     - **limit**: Número máximo de registros a devolver (default: 100)
     - **proyecto_id**: Filtrar por proyecto específico
     - **estado**: Filtrar por estado (pendiente, en_progreso, completada)
     - **usuario_responsable_id**: Filtrar por usuario responsable
+    - **vence_desde** / **vence_hasta**: Filtrar por fecha de vencimiento (inclusive)
+    - **incluir_archivadas**: Incluir tareas archivadas (resultado ordenado por ID)
+    """
+    filtros = {
+        "proyecto_id": proyecto_id,
+        "estado": estado,
+        "usuario_responsable_id": usuario_responsable_id,
+        "vence_desde": vence_desde,
+        "vence_hasta": vence_hasta,
+    }
+    cuerpo = await single_flight.ejecutar(
+        ("listar_tareas", skip, limit, incluir_archivadas) + tuple(filtros.values()),
+        lambda: _cargar_tareas_json(skip, limit, incluir_archivadas, **filtros)
+    )
+    return Response(content=cuerpo, media_type="application/json")
+
+_COLUMNAS_EXPORTACION = [
+    "id", "titulo", "descripcion", "estado", "prioridad", "fecha_vencimiento",
+    "proyecto_id", "usuario_responsable_id", "fecha_creacion", "fecha_actualizacion"
+]
+
+def _generar_csv(incluir_archivadas: bool, filtros: dict, progreso=None):
+    """
+    Generar el CSV por bloques, leyendo las filas por lotes (yield_per), shard por shard.
+    `progreso`, si se indica, recibe la cantidad de filas escritas tras cada bloque.
     """
-    query = db.query(Tarea)
+    filas_escritas = 0
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(_COLUMNAS_EXPORTACION + ["archivada"])
     
-    # Aplicar filtros
-    if proyecto_id:
-        query = query.filter(Tarea.proyecto_id == proyecto_id)
-    if estado:
-        query = query.filter(Tarea.estado == estado)
-    if usuario_responsable_id:
-        query = query.filter(Tarea.usuario_responsable_id == usuario_responsable_id)
+    for indice in indices_para_proyecto(filtros["proyecto_id"]) or range(NUM_SHARDS):
+        with sesion_shard(indice) as db:
+            modelos = [Tarea, TareaArchivada] if incluir_archivadas else [Tarea]
+            for modelo in modelos:
+                consulta = select(*(getattr(modelo, columna) for columna in _COLUMNAS_EXPORTACION))
+                consulta = _filtrar_tareas(consulta, modelo, **filtros).order_by(modelo.id)
+                resultado = db.execute(consulta.execution_options(yield_per=1000))
+                for filas in resultado.partitions():
+                    for fila in filas:
+                        escritor.writerow(list(fila) + [modelo is TareaArchivada])
+                    filas_escritas += len(filas)
+                    if progreso is not None:
+                        progreso(filas_escritas)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate(0)
+    
+    yield buffer.getvalue()
+
+@router.get("/exportar", response_class=StreamingResponse)
+async def exportar_tareas(
+    proyecto_id: int = None,
+    estado: str = None,
+    usuario_responsable_id: int = None,
+    vence_desde: Optional[datetime] = None,
+    vence_hasta: Optional[datetime] = None,
+    incluir_archivadas: bool = False,
+    asincrono: bool = False
+):
+    """
+    Exportar tareas en formato CSV (streaming, sin cargar todo en memoria).
+    En cada shard, primero las tareas activas y, si se solicita, luego las archivadas.
     
-    tareas = query.offset(skip).limit(limit).all()
-    return tareas
+    - **proyecto_id**: Filtrar por proyecto específico
+    - **estado**: Filtrar por estado (pendiente, en_progreso, completada)
+    - **usuario_responsable_id**: Filtrar por usuario responsable
+    - **vence_desde** / **vence_hasta**: Filtrar por fecha de vencimiento (inclusive)
+    - **incluir_archivadas**: Incluir tareas archivadas
+    - **asincrono**: Generar el archivo en segundo plano; responde 202 con el trabajo
+      (descarga en GET /api/v1/jobs/{id}/archivo al completarse)
+    """
+    filtros = {
+        "proyecto_id": proyecto_id,
+        "estado": estado,
+        "usuario_responsable_id": usuario_responsable_id,
+        "vence_desde": vence_desde,
+        "vence_hasta": vence_hasta,
+    }
+    if asincrono:
+        trabajo = trabajos.encolar("exportar_tareas", {"incluir_archivadas": incluir_archivadas, "filtros": filtros})
+        return trabajos.respuesta_aceptada(trabajo)
+    return StreamingResponse(
+        _generar_csv(incluir_archivadas, filtros),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=tareas.csv"}
+    )
+
+@trabajos.tipo("exportar_tareas")
+def _trabajo_exportar_tareas(parametros: dict, progreso: trabajos.Progreso) -> dict:
+    """Escribir la exportación CSV en TRABAJOS_DIR (archivo temporal y rename: un reintento lo reescribe)."""
+    filtros = parametros["filtros"]
+    for clave in ("vence_desde", "vence_hasta"):
+        if filtros[clave] is not None:
+            filtros[clave] = datetime.fromisoformat(filtros[clave])
+    
+    filas = 0
+    def _contar(filas_escritas):
+        nonlocal filas
+        filas = filas_escritas
+        progreso(filas_escritas)
+    
+    os.makedirs(trabajos.TRABAJOS_DIR, exist_ok=True)
+    ruta = trabajos.archivo_resultado(progreso.trabajo_id, "csv")
+    with open(f"{ruta}.parcial", "w", newline="", encoding="utf-8") as archivo:
+        for bloque in _generar_csv(parametros["incluir_archivadas"], filtros, _contar):
+            archivo.write(bloque)
+    os.replace(f"{ruta}.parcial", ruta)
+    
+    return {
+        "archivo": "tareas.csv",
+        "formato": "csv",
+        "media_type": "text/csv",
+        "filas": filas,
+        "bytes": os.path.getsize(ruta),
+        "descarga": f"/api/v1/jobs/{progreso.trabajo_id}/archivo",
+    }
+
+def _tareas_abiertas_con_vencimiento(db: Session, proyecto_id, usuario_responsable_id, desde, hasta):
+    """Tareas no completadas con vencimiento en el rango (usa los índices parciales)."""
+    consulta = db.query(Tarea).filter(
+        Tarea.estado != "completada",
+        Tarea.fecha_vencimiento.isnot(None)
+    )
+    consulta = _filtrar_tareas(
+        consulta, Tarea,
+        proyecto_id=proyecto_id,
+        usuario_responsable_id=usuario_responsable_id,
+        vence_desde=desde
+    )
+    return consulta.filter(Tarea.fecha_vencimiento < hasta).order_by(Tarea.fecha_vencimiento, Tarea.id)
+
+def _paginar_vencimientos(skip, limit, proyecto_id, usuario_responsable_id, desde, hasta):
+    """Página de tareas abiertas por vencimiento, combinada entre shards."""
+    def _pagina(db, offset, limite):
+        consulta = _tareas_abiertas_con_vencimiento(db, proyecto_id, usuario_responsable_id, desde, hasta)
+        return _lista_tareas_adapter.validate_python(
+            consulta.offset(offset).limit(limite).all(), from_attributes=True
+        )
+    
+    return paginar_shards(
+        _pagina, skip, limit,
+        clave=lambda tarea: (tarea.fecha_vencimiento, tarea.id),
+        indices=indices_para_proyecto(proyecto_id)
+    )
+
+@router.get("/vencidas", response_model=List[TareaResponse])
+async def listar_tareas_vencidas(
+    skip: int = 0,
+    limit: int = 100,
+    proyecto_id: int = None,
+    usuario_responsable_id: int = None
+):
+    """
+    Obtener las tareas abiertas cuya fecha de vencimiento ya pasó.
+    Ordenadas por vencimiento (las más atrasadas primero).
+    
+    - **proyecto_id**: Filtrar por proyecto específico
+    - **usuario_responsable_id**: Filtrar por usuario responsable
+    """
+    ahora = datetime.now(timezone.utc)
+    return _paginar_vencimientos(skip, limit, proyecto_id, usuario_responsable_id, None, ahora)
+
+@router.get("/vencen_pronto", response_model=List[TareaResponse])
+async def listar_tareas_vencen_pronto(
+    dias: int = Query(7, ge=1, le=90, description="Ventana en días a partir de ahora"),
+    skip: int = 0,
+    limit: int = 100,
+    proyecto_id: int = None,
+    usuario_responsable_id: int = None
+):
+    """
+    Obtener las tareas abiertas que vencen en los próximos días (por defecto, esta semana).
+    
+    - **dias**: Ventana en días (1-90, default: 7)
+    - **proyecto_id**: Filtrar por proyecto específico
+    - **usuario_responsable_id**: Filtrar por usuario responsable
+    """
+    ahora = datetime.now(timezone.utc)
+    return _paginar_vencimientos(
+        skip, limit, proyecto_id, usuario_responsable_id, ahora, ahora + timedelta(days=dias)
+    )
+
+@router.get("/vencimientos/resumen", response_model=ResumenVencimientosResponse)
+async def resumen_vencimientos(
+    proyecto_id: int = None,
+    usuario_responsable_id: int = None
+):
+    """
+    Contadores precalculados de tareas vencidas y por vencer por proyecto y usuario.
+    Los recalcula periódicamente el escáner de vencimientos (ver calculado_en).
+    
+    - **proyecto_id**: Filtrar por proyecto específico
+    - **usuario_responsable_id**: Filtrar por usuario responsable
+    """
+    def _consultar(db):
+        consulta = db.query(ResumenVencimientos)
+        if proyecto_id:
+            consulta = consulta.filter(ResumenVencimientos.proyecto_id == proyecto_id)
+        if usuario_responsable_id:
+            consulta = consulta.filter(ResumenVencimientos.usuario_responsable_id == usuario_responsable_id)
+        return [(fila.calculado_en, ResumenVencimientosItem.model_validate(fila)) for fila in consulta]
+    
+    # Cada shard guarda el resumen de sus propios proyectos
+    filas = [
+        fila for parte in consultar_shards(_consultar, indices_para_proyecto(proyecto_id))
+        for fila in parte
+    ]
+    detalle = [item for _, item in filas]
+    
+    return ResumenVencimientosResponse(
+        calculado_en=max((calculado_en for calculado_en, _ in filas), default=None),
+        vencidas=sum(item.vencidas for item in detalle),
+        vencen_pronto=sum(item.vencen_pronto for item in detalle),
+        detalle=detalle
+    )
 
 @router.get("/{tarea_id}", response_model=TareaResponse)
 async def obtener_tarea(
     tarea_id: int,
-    db: Session = Depends(get_db)
+    response: Response,
+    incluir_archivadas: bool = False,
+    db: Session = Depends(get_db_tarea)
 ):
     """
     Obtener información detallada de una tarea específica.
     Incluye información del usuario responsable si está asignado.
+    La versión se devuelve en el header ETag (para usar con If-Match en PUT).
     
     - **tarea_id**: ID único de la tarea
+    - **incluir_archivadas**: Buscar también entre las tareas archivadas
     """
-    tarea = db.query(Tarea).filter(Tarea.id == tarea_id).first()
+    tarea = consultas.obtener(db, Tarea, tarea_id)
+    
+    if not tarea and incluir_archivadas:
+        tarea = consultas.obtener(db, TareaArchivada, tarea_id)
     
     if not tarea:
         raise HTTPException(
@@ -113,18 +400,22 @@ async def obtener_tarea(
             detail=f"Tarea con ID {tarea_id} no encontrada"
         )
     
+    response.headers["ETag"] = etag(tarea.version)
     return tarea
 
 @router.put("/{tarea_id}", response_model=TareaResponse)
 async def actualizar_tarea(
     tarea_id: int,
     tarea_update: TareaUpdate,
-    db: Session = Depends(get_db)
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db_tarea)
 ):
     """
     Actualizar información de una tarea existente.
     Solo actualiza los campos proporcionados (PATCH semantics).
     Valida proyecto_id si se proporciona.
+    Con If-Match, responde 412 si la tarea cambió desde que se leyó (ETag).
     
     - **tarea_id**: ID único de la tarea
     - **titulo**: Nuevo título (opcional)
@@ -135,7 +426,7 @@ async def actualizar_tarea(
     - **proyecto_id**: Nuevo proyecto (opcional)
     """
     # Buscar tarea existente
-    db_tarea = db.query(Tarea).filter(Tarea.id == tarea_id).first()
+    db_tarea = consultas.obtener(db, Tarea, tarea_id)
     
     if not db_tarea:
         raise HTTPException(
@@ -143,28 +434,45 @@ async def actualizar_tarea(
             detail=f"Tarea con ID {tarea_id} no encontrada"
         )
     
+    verificar_if_match(if_match, db_tarea.version)
+    
     try:
         # Actualizar solo los campos proporcionados
         update_data = tarea_update.model_dump(exclude_unset=True)
         
         # Validar proyecto_id si se está actualizando
         if "proyecto_id" in update_data:
-            proyecto = db.query(Proyecto).filter(Proyecto.id == update_data["proyecto_id"]).first()
-            if not proyecto:
+            if shard_de_id(update_data["proyecto_id"]) != shard_de_id(tarea_id):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="No se puede mover la tarea a un proyecto alojado en otro shard"
+                )
+            if not consultas.existe(db, Proyecto, update_data["proyecto_id"]):
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"Proyecto con ID {update_data['proyecto_id']} no encontrado"
                 )
         
         # Aplicar actualizaciones
+        proyecto_anterior_id = db_tarea.proyecto_id
         for field, value in update_data.items():
             setattr(db_tarea, field, value)
         
-        db.commit()  # Commit explícito para ACID
+        if db_tarea.proyecto_id != proyecto_anterior_id:
+            # La tarea cambia de proyecto: sale de un tablero y entra en otro
+            eventos.registrar_evento(db, proyecto_anterior_id, "tarea_eliminada", {"tarea_id": tarea_id})
+            eventos.registrar_evento(db, db_tarea.proyecto_id, "tarea_creada", _datos_evento_tarea(db_tarea))
+        else:
+            eventos.registrar_evento(db, db_tarea.proyecto_id, "tarea_actualizada", _datos_evento_tarea(db_tarea))
+        db.commit()  # Commit explícito para ACID (UPDATE ... WHERE id = ? AND version = ?)
         db.refresh(db_tarea)
         
+        response.headers["ETag"] = etag(db_tarea.version)
         return db_tarea
         
+    except StaleDataError:
+        db.rollback()
+        raise conflicto_concurrente(if_match)
     except IntegrityError:
         db.rollback()
         raise HTTPException(
@@ -175,23 +483,27 @@ async def actualizar_tarea(
 @router.delete("/{tarea_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def eliminar_tarea(
     tarea_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_tarea)
 ):
     """
     Eliminar una tarea del sistema.
+    Un único DELETE ... RETURNING, sin cargar la tarea en la sesión.
     
     - **tarea_id**: ID único de la tarea a eliminar
     """
-    db_tarea = db.query(Tarea).filter(Tarea.id == tarea_id).first()
-    
-    if not db_tarea:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Tarea con ID {tarea_id} no encontrada"
-        )
-    
     try:
-        db.delete(db_tarea)
+        eliminada = db.execute(
+            delete(Tarea).where(Tarea.id == tarea_id).returning(Tarea.proyecto_id)
+        ).first()
+        
+        if eliminada is None:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Tarea con ID {tarea_id} no encontrada"
+            )
+        
+        eventos.registrar_evento(db, eliminada.proyecto_id, "tarea_eliminada", {"tarea_id": tarea_id})
         db.commit()  # Commit explícito para ACID
         
     except IntegrityError:
@@ -205,7 +517,7 @@ async def eliminar_tarea(
 async def asignar_usuario_tarea(
     tarea_id: int,
     asignacion: AsignarUsuarioTarea,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_tarea)
 ):
     """
     Asignar un usuario responsable a una tarea.
@@ -216,7 +528,7 @@ async def asignar_usuario_tarea(
     - **usuario_id**: ID único del usuario a asignar como responsable
     """
     # Verificar que la tarea existe
-    tarea = db.query(Tarea).filter(Tarea.id == tarea_id).first()
+    tarea = consultas.obtener(db, Tarea, tarea_id)
     if not tarea:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -224,7 +536,7 @@ async def asignar_usuario_tarea(
         )
     
     # Verificar que el usuario existe (validación cruzada con GestorUsuarios)
-    usuario = db.query(Usuario).filter(Usuario.id == asignacion.usuario_id).first()
+    usuario = consultas.obtener(db, Usuario, asignacion.usuario_id)
     if not usuario:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -234,7 +546,7 @@ async def asignar_usuario_tarea(
     # Verificar que el usuario está asignado al proyecto de la tarea
     # (validación cruzada completa entre los tres componentes)
     proyecto = tarea.proyecto
-    if usuario not in proyecto.usuarios:
+    if not consultas.es_miembro(db, proyecto.id, usuario.id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"El usuario {usuario.nombre} no está asignado al proyecto {proyecto.nombre}. " +
@@ -243,7 +555,7 @@ async def asignar_usuario_tarea(
     
     # Verificar si la tarea ya tiene un responsable asignado
     if tarea.usuario_responsable_id is not None:
-        usuario_actual = db.query(Usuario).filter(Usuario.id == tarea.usuario_responsable_id).first()
+        usuario_actual = consultas.obtener(db, Usuario, tarea.usuario_responsable_id)
         if usuario_actual:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -254,6 +566,7 @@ async def asignar_usuario_tarea(
     try:
         # Asignar usuario responsable a la tarea
         tarea.usuario_responsable_id = asignacion.usuario_id
+        eventos.registrar_evento(db, tarea.proyecto_id, "tarea_asignada", _datos_evento_tarea(tarea))
         db.commit()  # Commit explícito para ACID
         
         return SuccessResponse(
@@ -267,6 +580,9 @@ async def asignar_usuario_tarea(
             }
         )
         
+    except StaleDataError:
+        db.rollback()  # Otra petición modificó la tarea después de leerla
+        raise conflicto_concurrente(None)
     except IntegrityError:
         db.rollback()
         raise HTTPException(
@@ -274,10 +590,246 @@ async def asignar_usuario_tarea(
             detail="Error al asignar usuario responsable a la tarea"
         )
 
+def _asignar_en_shard(db: Session, asignacion: AsignarUsuarioTareas, tarea_ids: List[int]):
+    """Asignación masiva sobre las tareas de un shard; devuelve (estado previo, IDs asignados)."""
+    try:
+        # Estado previo de las tareas solicitadas (solo columnas necesarias)
+        previas = {
+            fila.id: fila.usuario_responsable_id
+            for fila in db.execute(
+                select(Tarea.id, Tarea.usuario_responsable_id).where(Tarea.id.in_(tarea_ids))
+            )
+        }
+        
+        # Un único UPDATE valida la pertenencia al proyecto con una subconsulta
+        proyectos_del_usuario = select(proyecto_usuario_association.c.proyecto_id).where(
+            proyecto_usuario_association.c.usuario_id == asignacion.usuario_id
+        )
+        asignacion_stmt = update(Tarea).where(
+            Tarea.id.in_(tarea_ids),
+            Tarea.proyecto_id.in_(proyectos_del_usuario),
+            Tarea.usuario_responsable_id.is_distinct_from(asignacion.usuario_id)
+        )
+        if not asignacion.reasignar:
+            asignacion_stmt = asignacion_stmt.where(Tarea.usuario_responsable_id.is_(None))
+        asignacion_stmt = asignacion_stmt.values(
+            usuario_responsable_id=asignacion.usuario_id,
+            version=Tarea.version + 1
+        ).returning(Tarea.id, Tarea.proyecto_id).execution_options(synchronize_session=False)
+        
+        asignadas_por_proyecto = {}
+        for fila in db.execute(asignacion_stmt):
+            asignadas_por_proyecto.setdefault(fila.proyecto_id, []).append(fila.id)
+        asignadas = {tarea_id for ids in asignadas_por_proyecto.values() for tarea_id in ids}
+        
+        for proyecto_id, ids in asignadas_por_proyecto.items():
+            eventos.registrar_evento(db, proyecto_id, "tarea_asignada", {
+                "tarea_ids": sorted(ids),
+                "usuario_responsable_id": asignacion.usuario_id
+            })
+        db.commit()  # Commit explícito para ACID
+        
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Error al asignar usuario responsable a las tareas"
+        )
+    
+    return previas, asignadas
+
+def _asignar_usuario_tareas(asignacion: AsignarUsuarioTareas, progreso=None) -> OperacionMasivaResponse:
+    """Asignación masiva shard por shard; `progreso`, si se indica, recibe las tareas procesadas."""
+    tarea_ids = list(dict.fromkeys(asignacion.tarea_ids))  # Quitar duplicados conservando el orden
+    
+    # Cada shard se actualiza en su propia transacción (no hay atomicidad entre shards)
+    previas, asignadas, procesadas = {}, set(), 0
+    for indice, ids_shard in agrupar_por_shard(tarea_ids).items():
+        with sesion_shard(indice) as db_shard:
+            previas_shard, asignadas_shard = _asignar_en_shard(db_shard, asignacion, ids_shard)
+        previas.update(previas_shard)
+        asignadas |= asignadas_shard
+        procesadas += len(ids_shard)
+        if progreso is not None:
+            progreso(procesadas, len(tarea_ids))
+    
+    resultados = []
+    for tarea_id in tarea_ids:
+        if tarea_id in asignadas:
+            resultados.append(ResultadoItem(id=tarea_id, resultado="asignada"))
+        elif tarea_id not in previas:
+            resultados.append(ResultadoItem(
+                id=tarea_id, resultado="tarea_no_encontrada",
+                detalle=f"Tarea con ID {tarea_id} no encontrada"
+            ))
+        elif previas[tarea_id] == asignacion.usuario_id:
+            resultados.append(ResultadoItem(
+                id=tarea_id, resultado="sin_cambios",
+                detalle="El usuario ya es responsable de la tarea"
+            ))
+        elif previas[tarea_id] is not None and not asignacion.reasignar:
+            resultados.append(ResultadoItem(
+                id=tarea_id, resultado="ya_tiene_responsable",
+                detalle="La tarea ya tiene responsable. Use reasignar=true para reemplazarlo."
+            ))
+        else:
+            resultados.append(ResultadoItem(
+                id=tarea_id, resultado="usuario_no_en_proyecto",
+                detalle="El usuario no está asignado al proyecto de la tarea"
+            ))
+    
+    return OperacionMasivaResponse(
+        message=f"Usuario {asignacion.usuario_id} asignado como responsable de {len(asignadas)} de {len(tarea_ids)} tareas",
+        procesados=len(tarea_ids),
+        exitosos=len(asignadas),
+        resultados=resultados
+    )
+
+@trabajos.tipo("asignar_usuario_tareas")
+def _trabajo_asignar_usuario_tareas(parametros: dict, progreso: trabajos.Progreso) -> dict:
+    return _asignar_usuario_tareas(AsignarUsuarioTareas(**parametros), progreso).model_dump()
+
+@router.post("/asignar_usuario", response_model=OperacionMasivaResponse)
+async def asignar_usuario_tareas(
+    asignacion: AsignarUsuarioTareas,
+    asincrono: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Asignar (o reasignar) un usuario responsable a varias tareas en una operación.
+    La pertenencia del usuario al proyecto de cada tarea se valida dentro de un único
+    UPDATE ... WHERE id IN (...), sin cargar tareas ni proyectos en la sesión.
+    
+    - **usuario_id**: ID único del usuario responsable
+    - **tarea_ids**: IDs de las tareas (máximo 1000)
+    - **reasignar**: Reemplazar al responsable actual si la tarea ya tiene uno
+    - **asincrono**: Ejecutar en segundo plano; responde 202 con el trabajo
+      (el resultado por tarea queda en GET /api/v1/jobs/{id})
+    """
+    # Verificar que el usuario existe (validación cruzada con GestorUsuarios)
+    if not consultas.existe(db, Usuario, asignacion.usuario_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Usuario con ID {asignacion.usuario_id} no encontrado"
+        )
+    
+    if asincrono:
+        return trabajos.respuesta_aceptada(trabajos.encolar("asignar_usuario_tareas", asignacion.model_dump()))
+    return _asignar_usuario_tareas(asignacion)
+
+# Estados desde los que una transición masiva puede llevar a cada estado.
+# Reabrir tareas completadas en bloque las devuelve a en_progreso, no a pendiente.
+ORIGENES_PERMITIDOS = {
+    "pendiente": ("en_progreso",),
+    "en_progreso": ("pendiente", "completada"),
+    "completada": ("pendiente", "en_progreso"),
+}
+
+def _transicionar_en_shard(db: Session, stmt, cambios: dict) -> dict:
+    """Ejecutar el UPDATE ... RETURNING en un shard; devuelve los IDs modificados por proyecto."""
+    try:
+        por_proyecto = {}
+        for fila in db.execute(stmt):
+            por_proyecto.setdefault(fila.proyecto_id, []).append(fila.id)
+        
+        for proyecto_id, ids in por_proyecto.items():
+            eventos.registrar_evento(db, proyecto_id, "tareas_actualizadas", {
+                "tarea_ids": sorted(ids),
+                "campos": cambios
+            })
+        db.commit()  # Commit explícito para ACID
+        
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Error al actualizar las tareas"
+        )
+    
+    return por_proyecto
+
+@router.post("/transiciones", response_model=TransicionTareasResponse)
+async def transicionar_tareas(
+    transicion: TransicionTareas
+):
+    """
+    Cambiar estado y/o prioridad de varias tareas con un único UPDATE ... RETURNING
+    (uno por shard afectado).
+    Las tareas se eligen por lista de IDs o por filtro (proyecto, estado actual,
+    responsable, ids). El estado solo cambia en las tareas cuyo estado actual
+    permite la transición; la prioridad se aplica a todas las elegidas,
+    independientemente del estado. Las que ya tienen los valores pedidos no se tocan.
+    
+    - **tarea_ids**: IDs de las tareas (máximo 1000), o bien
+    - **filtro**: proyecto_id, estado, usuario_responsable_id y/o ids
+    - **estado**: Nuevo estado (opcional)
+    - **prioridad**: Nueva prioridad (opcional)
+    - **devolver_ids**: Incluir en la respuesta los IDs modificados (default: true)
+    """
+    filtro = transicion.filtro
+    if transicion.estado and filtro and filtro.estado \
+            and filtro.estado not in ORIGENES_PERMITIDOS[transicion.estado]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Transición no permitida: {filtro.estado} -> {transicion.estado}"
+        )
+    
+    stmt = update(Tarea)
+    ids = transicion.tarea_ids
+    if ids is None:
+        stmt = _filtrar_tareas(
+            stmt, Tarea,
+            proyecto_id=filtro.proyecto_id,
+            estado=filtro.estado,
+            usuario_responsable_id=filtro.usuario_responsable_id
+        )
+        ids = filtro.ids
+    
+    cambios = {}
+    valores = {}
+    condiciones = []
+    if transicion.estado:
+        cambios["estado"] = transicion.estado
+        admite_transicion = Tarea.estado.in_(ORIGENES_PERMITIDOS[transicion.estado])
+        condiciones.append(admite_transicion)
+        valores["estado"] = transicion.estado
+    if transicion.prioridad:
+        cambios["prioridad"] = transicion.prioridad
+        condiciones.append(Tarea.prioridad.is_distinct_from(transicion.prioridad))
+        valores["prioridad"] = transicion.prioridad
+        if transicion.estado:
+            # Tareas que solo cambian de prioridad conservan su estado
+            valores["estado"] = case((admite_transicion, transicion.estado), else_=Tarea.estado)
+    stmt = stmt.where(or_(*condiciones))
+    
+    # RETURNING también alimenta los eventos por proyecto
+    stmt = stmt.values(**valores, version=Tarea.version + 1) \
+        .returning(Tarea.id, Tarea.proyecto_id).execution_options(synchronize_session=False)
+    
+    # Un UPDATE por shard afectado: los IDs se reparten por shard; sin IDs, el filtro
+    # por proyecto apunta a un solo shard y, sin él, se recorren todos
+    if ids:
+        objetivos = {indice: stmt.where(Tarea.id.in_(grupo)) for indice, grupo in agrupar_por_shard(ids).items()}
+    else:
+        indices = indices_para_proyecto(filtro.proyecto_id) or range(NUM_SHARDS)
+        objetivos = {indice: stmt for indice in indices}
+    
+    por_proyecto = {}
+    for indice, stmt_shard in objetivos.items():
+        with sesion_shard(indice) as db:
+            por_proyecto.update(_transicionar_en_shard(db, stmt_shard, cambios))
+    
+    actualizadas = sorted(tarea_id for ids in por_proyecto.values() for tarea_id in ids)
+    return TransicionTareasResponse(
+        message=f"{len(actualizadas)} tareas actualizadas",
+        actualizadas=len(actualizadas),
+        tarea_ids=actualizadas if transicion.devolver_ids else None
+    )
+
 @router.delete("/{tarea_id}/desasignar_usuario", response_model=SuccessResponse)
 async def desasignar_usuario_tarea(
     tarea_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_tarea)
 ):
     """
     Desasignar el usuario responsable de una tarea.
@@ -285,7 +837,7 @@ async def desasignar_usuario_tarea(
     - **tarea_id**: ID único de la tarea
     """
     # Verificar que la tarea existe
-    tarea = db.query(Tarea).filter(Tarea.id == tarea_id).first()
+    tarea = consultas.obtener(db, Tarea, tarea_id)
     if not tarea:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -306,6 +858,7 @@ async def desasignar_usuario_tarea(
     try:
         # Desasignar usuario responsable
         tarea.usuario_responsable_id = None
+        eventos.registrar_evento(db, tarea.proyecto_id, "tarea_desasignada", _datos_evento_tarea(tarea))
         db.commit()  # Commit explícito para ACID
         
         return SuccessResponse(
@@ -317,6 +870,9 @@ async def desasignar_usuario_tarea(
             }
         )
         
+    except StaleDataError:
+        db.rollback()  # Otra petición modificó la tarea después de leerla
+        raise conflicto_concurrente(None)
     except IntegrityError:
         db.rollback()
         raise HTTPException(
@@ -4,14 +4,22 @@ Implementa endpoints CRUD con validación y manejo de errores.
 Servicio sin estado (stateless) - cada request es independiente.
 """
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response, status
+from sqlalchemy import select, update, delete, and_, case, func
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 
-from app.database import get_db
-from app.models import Usuario
-from app.schemas import UsuarioCreate, UsuarioUpdate, UsuarioResponse, ErrorResponse
+from app.database import get_db, sesion_proyecto, sesion_shard, consultar_shards, replicar_usuario, NUM_SHARDS
+from app import autocompletado, consultas, eventos, trabajos
+from app.versiones import etag, verificar_if_match, conflicto_concurrente
+from app.models import Usuario, Proyecto, Tarea, proyecto_usuario_association
+from app.routers.tareas import _datos_evento_tarea
+from app.schemas import (
+    UsuarioCreate, UsuarioUpdate, UsuarioResponse, UsuarioSugerencia, ErrorResponse, CargaUsuario, CargaProyecto
+)
 
 router = APIRouter(
     prefix="/usuarios",
@@ -19,6 +27,45 @@ router = APIRouter(
     responses={404: {"model": ErrorResponse}},
 )
 
+logger = logging.getLogger(__name__)
+
+@trabajos.tipo("replicar_usuario")
+def _trabajo_replicar_usuario(parametros: dict, progreso: trabajos.Progreso) -> dict:
+    replicar_usuario(parametros["usuario_id"])
+    return {"usuario_id": parametros["usuario_id"]}
+
+def _replicar(usuario_id: int):
+    """
+    Propagar el usuario a las réplicas de los demás shards (claves foráneas de tareas y
+    miembros). La escritura principal ya está confirmada: un fallo no cambia la respuesta,
+    sino que deja la replicación como trabajo en segundo plano (y el arranque reconcilia).
+    """
+    if NUM_SHARDS == 1:
+        return
+    try:
+        replicar_usuario(usuario_id)
+    except Exception:
+        try:
+            trabajos.encolar("replicar_usuario", {"usuario_id": usuario_id})
+        except Exception:
+            logger.exception("No se pudo encolar la replicación del usuario %s", usuario_id)
+
+def _desasignar_tareas(db: Session, usuario_id: int):
+    """
+    Dejar sin responsable las tareas del usuario en el shard de la sesión, como haría el
+    SET NULL de la base, pero registrando un evento tarea_desasignada por cada una.
+    """
+    filas = db.execute(
+        update(Tarea)
+        .where(Tarea.usuario_responsable_id == usuario_id)
+        .values(usuario_responsable_id=None, version=Tarea.version + 1)
+        .returning(Tarea.id, Tarea.proyecto_id, Tarea.titulo, Tarea.estado, Tarea.prioridad,
+                   Tarea.fecha_vencimiento, Tarea.usuario_responsable_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    for fila in filas:
+        eventos.registrar_evento(db, fila.proyecto_id, "tarea_desasignada", _datos_evento_tarea(fila))
+
 @router.post("/", response_model=UsuarioResponse, status_code=status.HTTP_201_CREATED)
 async def crear_usuario(
     usuario: UsuarioCreate,
@@ -33,8 +80,7 @@ async def crear_usuario(
     """
     try:
         # Verificar si el email ya existe
-        db_usuario_existante = db.query(Usuario).filter(Usuario.email == usuario.email).first()
-        if db_usuario_existante:
+        if consultas.email_en_uso(db, usuario.email):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"El email {usuario.email} ya está registrado"
@@ -46,14 +92,18 @@ async def crear_usuario(
         db.commit()  # Commit explícito para ACID
         db.refresh(db_usuario)
         
-        return db_usuario
-        
     except IntegrityError:
         db.rollback()  # Rollback en caso de error para mantener ACID
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Error de integridad en la base de datos"
         )
+    
+    # Cada shard guarda una réplica de usuarios
+    _replicar(db_usuario.id)
+    autocompletado.indice.guardar(db_usuario.id, db_usuario.nombre, db_usuario.email, db_usuario.rol)
+    
+    return db_usuario
 
 @router.get("/", response_model=List[UsuarioResponse])
 async def listar_usuarios(
@@ -71,17 +121,159 @@ async def listar_usuarios(
     usuarios = db.query(Usuario).offset(skip).limit(limit).all()
     return usuarios
 
+def _consultar_carga(db: Session, usuarios) -> List[CargaUsuario]:
+    """
+    Carga de trabajo de los usuarios del subquery `usuarios` en una única consulta:
+    tareas abiertas agrupadas por responsable, proyecto y prioridad, solo en los
+    proyectos de los que el usuario sigue siendo miembro.
+    """
+    pu = proyecto_usuario_association
+    carga = (
+        select(
+            Tarea.usuario_responsable_id.label("usuario_id"),
+            Tarea.proyecto_id,
+            func.sum(case((Tarea.prioridad == "alta", 1), else_=0)).label("alta"),
+            func.sum(case((Tarea.prioridad == "media", 1), else_=0)).label("media"),
+            func.sum(case((Tarea.prioridad == "baja", 1), else_=0)).label("baja"),
+            func.count().label("total"),
+        )
+        .join(pu, and_(
+            pu.c.usuario_id == Tarea.usuario_responsable_id,
+            pu.c.proyecto_id == Tarea.proyecto_id
+        ))
+        .where(
+            Tarea.estado != "completada",
+            Tarea.usuario_responsable_id.in_(select(usuarios.c.id))
+        )
+        .group_by(Tarea.usuario_responsable_id, Tarea.proyecto_id)
+        .subquery()
+    )
+    filas = db.execute(
+        select(
+            usuarios.c.id, usuarios.c.nombre,
+            carga.c.proyecto_id, Proyecto.nombre.label("proyecto_nombre"),
+            carga.c.alta, carga.c.media, carga.c.baja, carga.c.total
+        )
+        .outerjoin(carga, carga.c.usuario_id == usuarios.c.id)
+        .outerjoin(Proyecto, Proyecto.id == carga.c.proyecto_id)
+        .order_by(usuarios.c.id, carga.c.proyecto_id)
+    ).all()
+
+    # Agrupar filas (usuario, proyecto) por usuario conservando el orden de la página
+    resultado = {}
+    for fila in filas:
+        item = resultado.get(fila.id)
+        if item is None:
+            item = resultado[fila.id] = CargaUsuario(
+                usuario_id=fila.id, nombre=fila.nombre, total_abiertas=0, proyectos=[]
+            )
+        if fila.proyecto_id is not None:
+            item.proyectos.append(CargaProyecto(
+                proyecto_id=fila.proyecto_id, proyecto_nombre=fila.proyecto_nombre,
+                alta=fila.alta, media=fila.media, baja=fila.baja, total=fila.total
+            ))
+            item.total_abiertas += fila.total
+    return list(resultado.values())
+
+def _consultar_carga_shards(usuarios) -> List[CargaUsuario]:
+    """
+    _consultar_carga en cada shard (todos tienen la réplica de usuarios) y
+    combinación por usuario: se suman los totales y se unen los proyectos.
+    """
+    partes = consultar_shards(lambda db: _consultar_carga(db, usuarios))
+    if NUM_SHARDS == 1:
+        return partes[0]
+    
+    resultado = {item.usuario_id: item for item in partes[0]}
+    for parte in partes[1:]:
+        for item in parte:
+            base = resultado.setdefault(item.usuario_id, item)
+            if base is not item:
+                base.proyectos.extend(item.proyectos)
+                base.total_abiertas += item.total_abiertas
+    for item in resultado.values():
+        item.proyectos.sort(key=lambda carga: carga.proyecto_id)
+    return sorted(resultado.values(), key=lambda item: item.usuario_id)
+
+@router.get("/carga", response_model=List[CargaUsuario])
+async def listar_carga_usuarios(
+    skip: int = 0,
+    limit: int = 100
+):
+    """
+    Obtener la carga de trabajo de todo el equipo: tareas abiertas de cada
+    usuario agrupadas por proyecto y prioridad. Paginado por usuario.
+    
+    - **skip**: Número de usuarios a omitir (default: 0)
+    - **limit**: Número máximo de usuarios a devolver (default: 100)
+    """
+    usuarios = (
+        select(Usuario.id, Usuario.nombre)
+        .order_by(Usuario.id)
+        .offset(skip)
+        .limit(limit)
+        .subquery()
+    )
+    return _consultar_carga_shards(usuarios)
+
+@router.get("/autocompletar", response_model=List[UsuarioSugerencia])
+async def autocompletar_usuarios(
+    q: str = Query(..., min_length=1, max_length=100),
+    proyecto_id: Optional[int] = Query(None, gt=0),
+    limit: int = Query(10, ge=1, le=autocompletado.LIMITE_MAXIMO)
+):
+    """
+    Sugerencias de usuarios para selectores con búsqueda mientras se escribe.
+    Coinciden los usuarios cuyo nombre, alguna palabra del nombre o el email empieza
+    por `q` (sin distinguir mayúsculas); primero las coincidencias al inicio del nombre.
+    
+    - **q**: Texto escrito por el usuario
+    - **proyecto_id**: Sugerir solo miembros de este proyecto
+    - **limit**: Número máximo de sugerencias (default: 10, máximo 50)
+    """
+    # Los usuarios están replicados en todos los shards: todo se resuelve en el del proyecto
+    with sesion_proyecto(proyecto_id) as db:
+        if proyecto_id is not None and not consultas.existe(db, Proyecto, proyecto_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Proyecto con ID {proyecto_id} no encontrado"
+            )
+        return autocompletado.buscar(db, q, limit, proyecto_id)
+
+@router.get("/{usuario_id}/carga", response_model=CargaUsuario)
+async def obtener_carga_usuario(
+    usuario_id: int
+):
+    """
+    Obtener la carga de trabajo de un usuario: sus tareas abiertas en todos
+    sus proyectos, agrupadas por proyecto y prioridad.
+    
+    - **usuario_id**: ID único del usuario
+    """
+    usuarios = select(Usuario.id, Usuario.nombre).where(Usuario.id == usuario_id).subquery()
+    carga = _consultar_carga_shards(usuarios)
+    
+    if not carga:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Usuario con ID {usuario_id} no encontrado"
+        )
+    
+    return carga[0]
+
 @router.get("/{usuario_id}", response_model=UsuarioResponse)
 async def obtener_usuario(
     usuario_id: int,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """
     Obtener información detallada de un usuario específico.
+    La versión se devuelve en el header ETag (para usar con If-Match en PUT).
     
     - **usuario_id**: ID único del usuario
     """
-    usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
+    usuario = consultas.obtener(db, Usuario, usuario_id)
     
     if not usuario:
         raise HTTPException(
@@ -89,17 +281,21 @@ async def obtener_usuario(
             detail=f"Usuario con ID {usuario_id} no encontrado"
         )
     
+    response.headers["ETag"] = etag(usuario.version)
     return usuario
 
 @router.put("/{usuario_id}", response_model=UsuarioResponse)
 async def actualizar_usuario(
     usuario_id: int,
     usuario_update: UsuarioUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     """
     Actualizar información de un usuario existente.
     Solo actualiza los campos proporcionados (PATCH semantics).
+    Con If-Match, responde 412 si el usuario cambió desde que se leyó (ETag).
     
     - **usuario_id**: ID único del usuario
     - **nombre**: Nuevo nombre (opcional)
@@ -107,7 +303,7 @@ async def actualizar_usuario(
     - **rol**: Nuevo rol (opcional)
     """
     # Buscar usuario existente
-    db_usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
+    db_usuario = consultas.obtener(db, Usuario, usuario_id)
     
     if not db_usuario:
         raise HTTPException(
@@ -115,17 +311,15 @@ async def actualizar_usuario(
             detail=f"Usuario con ID {usuario_id} no encontrado"
         )
     
+    verificar_if_match(if_match, db_usuario.version)
+    
     try:
         # Actualizar solo los campos proporcionados
         update_data = usuario_update.model_dump(exclude_unset=True)
         
         # Verificar email único si se está actualizando
         if "email" in update_data:
-            existing_email = db.query(Usuario).filter(
-                Usuario.email == update_data["email"],
-                Usuario.id != usuario_id
-            ).first()
-            if existing_email:
+            if consultas.email_en_uso(db, update_data["email"], excluir_id=usuario_id):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"El email {update_data['email']} ya está en uso"
@@ -135,17 +329,24 @@ async def actualizar_usuario(
         for field, value in update_data.items():
             setattr(db_usuario, field, value)
         
-        db.commit()  # Commit explícito para ACID
+        db.commit()  # Commit explícito para ACID (UPDATE ... WHERE id = ? AND version = ?)
         db.refresh(db_usuario)
         
-        return db_usuario
-        
+    except StaleDataError:
+        db.rollback()
+        raise conflicto_concurrente(if_match)
     except IntegrityError:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Error de integridad en la base de datos"
         )
+    
+    _replicar(usuario_id)
+    autocompletado.indice.guardar(db_usuario.id, db_usuario.nombre, db_usuario.email, db_usuario.rol)
+    
+    response.headers["ETag"] = etag(db_usuario.version)
+    return db_usuario
 
 @router.delete("/{usuario_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def eliminar_usuario(
@@ -154,20 +355,26 @@ async def eliminar_usuario(
 ):
     """
     Eliminar un usuario del sistema.
-    Las tareas asignadas se marcarán sin responsable (SET NULL).
+    Las tareas asignadas quedan sin responsable, con un evento tarea_desasignada por tarea
+    (un UPDATE ... RETURNING por shard); el DELETE del usuario deja a la base de datos
+    el CASCADE de sus asignaciones a proyectos, sin cargar tareas ni proyectos.
     
     - **usuario_id**: ID único del usuario a eliminar
     """
-    db_usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
-    
-    if not db_usuario:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Usuario con ID {usuario_id} no encontrado"
-        )
-    
     try:
-        db.delete(db_usuario)
+        # Antes del DELETE, en la misma transacción: el SET NULL de la base no emite eventos
+        _desasignar_tareas(db, usuario_id)
+        eliminado = db.execute(
+            delete(Usuario).where(Usuario.id == usuario_id).returning(Usuario.id)
+        ).first()
+        
+        if eliminado is None:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Usuario con ID {usuario_id} no encontrado"
+            )
+        
         db.commit()  # Commit explícito para ACID
         
     except IntegrityError:
@@ -175,4 +382,18 @@ async def eliminar_usuario(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No se puede eliminar el usuario debido a dependencias"
-        )
\ No newline at end of file
+        )
+    
+    # Tareas de los demás shards, antes de que la replicación elimine allí al usuario
+    for indice in range(1, NUM_SHARDS):
+        try:
+            with sesion_shard(indice) as db_shard:
+                _desasignar_tareas(db_shard, usuario_id)
+                db_shard.commit()
+        except Exception:
+            # El DELETE de la réplica las deja igualmente sin responsable (SET NULL), sin eventos
+            logger.exception("No se pudieron desasignar las tareas del usuario %s en el shard %s", usuario_id, indice)
+    
+    # En las réplicas, el DELETE aplica también CASCADE sobre sus asignaciones a proyectos
+    _replicar(usuario_id)
+    autocompletado.indice.quitar(usuario_id)
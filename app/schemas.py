@@ -3,9 +3,10 @@ Schemas Pydantic para validación de datos de entrada y salida.
 Implementa validación estricta para mantener integridad de datos (ACID).
 """
 
+import json
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
+from typing import Any, List, Optional
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, field_validator, model_validator
 
 # ===== SCHEMAS PARA USUARIOS =====
 
@@ -30,9 +31,17 @@ class UsuarioResponse(UsuarioBase):
     id: int
     fecha_creacion: datetime
     fecha_actualizacion: Optional[datetime] = None
+    version: int
     
     model_config = ConfigDict(from_attributes=True)
 
+class UsuarioSugerencia(BaseModel):
+    """Usuario sugerido por el autocompletado (solo los campos que muestra un selector)"""
+    id: int
+    nombre: str
+    email: str
+    rol: str
+
 # ===== SCHEMAS PARA PROYECTOS =====
 
 class ProyectoBase(BaseModel):
@@ -53,20 +62,46 @@ class ProyectoUpdate(BaseModel):
     estado: Optional[str] = Field(None, pattern="^(activo|pausado|completado)$")
     fecha_fin: Optional[datetime] = None
 
-class ProyectoResponse(ProyectoBase):
-    """Schema de respuesta para proyecto"""
+class ClonarProyecto(BaseModel):
+    """Schema para crear un proyecto como copia de otro (plantilla)"""
+    nombre: str = Field(..., min_length=3, max_length=200, description="Nombre del nuevo proyecto")
+    descripcion: Optional[str] = Field(None, max_length=1000, description="Descripción (por defecto, la de la plantilla)")
+    fecha_fin: Optional[datetime] = Field(None, description="Fecha de finalización estimada")
+    incluir_usuarios: bool = Field(default=True, description="Copiar los usuarios asignados")
+    incluir_tareas: bool = Field(default=True, description="Copiar las tareas")
+    incluir_completadas: bool = Field(default=True, description="Copiar también las tareas completadas")
+    reiniciar_estado: bool = Field(default=True, description="Dejar las tareas copiadas en estado pendiente")
+    conservar_responsables: bool = Field(default=False, description="Mantener el responsable de cada tarea")
+    conservar_vencimientos: bool = Field(default=False, description="Mantener las fechas de vencimiento")
+    
+    @model_validator(mode="after")
+    def validar_opciones(self):
+        if self.conservar_responsables and not (self.incluir_usuarios and self.incluir_tareas):
+            raise ValueError("conservar_responsables requiere incluir_usuarios e incluir_tareas")
+        return self
+
+class ProyectoDetalle(ProyectoBase):
+    """Schema de proyecto sin relaciones"""
     id: int
     fecha_inicio: datetime
     fecha_creacion: datetime
     fecha_actualizacion: Optional[datetime] = None
-    usuarios: List[UsuarioResponse] = []
+    version: int
     
     model_config = ConfigDict(from_attributes=True)
 
+class ProyectoResponse(ProyectoDetalle):
+    """Schema de respuesta para proyecto"""
+    usuarios: List[UsuarioResponse] = []
+
 class AsignarUsuarioProyecto(BaseModel):
     """Schema para asignar usuario a proyecto"""
     usuario_id: int = Field(..., gt=0, description="ID del usuario a asignar")
 
+class AsignarUsuariosProyecto(BaseModel):
+    """Schema para asignar o desasignar varios usuarios de un proyecto en una operación"""
+    usuario_ids: List[int] = Field(..., min_length=1, max_length=1000, description="IDs de los usuarios")
+
 # ===== SCHEMAS PARA TAREAS =====
 
 class TareaBase(BaseModel):
@@ -91,20 +126,141 @@ class TareaUpdate(BaseModel):
     fecha_vencimiento: Optional[datetime] = None
     proyecto_id: Optional[int] = Field(None, gt=0)
 
-class TareaResponse(TareaBase):
-    """Schema de respuesta para tarea"""
+class TareaDetalle(TareaBase):
+    """Schema de tarea sin relaciones (el responsable se referencia por ID)"""
     id: int
     usuario_responsable_id: Optional[int] = None
     fecha_creacion: datetime
     fecha_actualizacion: Optional[datetime] = None
-    usuario_responsable: Optional[UsuarioResponse] = None
+    version: int
     
     model_config = ConfigDict(from_attributes=True)
 
+class TareaResponse(TareaDetalle):
+    """Schema de respuesta para tarea"""
+    usuario_responsable: Optional[UsuarioResponse] = None
+    archivada: bool = False
+
+class ProyectoCompuestoResponse(BaseModel):
+    """Documento compuesto de un proyecto: cada usuario aparece una sola vez en `usuarios`"""
+    proyecto: ProyectoDetalle
+    usuario_ids: Optional[List[int]] = Field(None, description="Miembros del proyecto (include=usuarios)")
+    tareas: Optional[List[TareaDetalle]] = Field(None, description="Página de tareas (include=tareas)")
+    usuarios: List[UsuarioResponse] = Field(default=[], description="Miembros y responsables referenciados")
+
+class ColumnaTablero(BaseModel):
+    """Columna del tablero: primeras tareas de un estado y total de la columna"""
+    estado: str
+    total: int
+    tareas: List[TareaDetalle]
+
+class TableroResponse(BaseModel):
+    """Tablero de un proyecto: una columna por estado (pendiente, en_progreso, completada)"""
+    proyecto_id: int
+    limite: int
+    columnas: List[ColumnaTablero]
+
 class AsignarUsuarioTarea(BaseModel):
     """Schema para asignar usuario responsable a tarea"""
     usuario_id: int = Field(..., gt=0, description="ID del usuario responsable")
 
+class ResumenVencimientosItem(BaseModel):
+    """Contadores de vencimiento de un proyecto y usuario responsable"""
+    proyecto_id: int
+    usuario_responsable_id: Optional[int] = None
+    vencidas: int
+    vencen_pronto: int
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class ResumenVencimientosResponse(BaseModel):
+    """Schema de respuesta para el resumen precalculado de vencimientos"""
+    calculado_en: Optional[datetime] = None
+    vencidas: int
+    vencen_pronto: int
+    detalle: List[ResumenVencimientosItem]
+
+class AsignarUsuarioTareas(BaseModel):
+    """Schema para asignar un usuario responsable a varias tareas en una operación"""
+    usuario_id: int = Field(..., gt=0, description="ID del usuario responsable")
+    tarea_ids: List[int] = Field(..., min_length=1, max_length=1000, description="IDs de las tareas")
+    reasignar: bool = Field(default=False, description="Reemplazar al responsable actual si la tarea ya tiene uno")
+
+class FiltroTareas(BaseModel):
+    """Criterios de selección de tareas para operaciones masivas (se combinan con AND)"""
+    proyecto_id: Optional[int] = Field(None, gt=0)
+    estado: Optional[str] = Field(None, pattern="^(pendiente|en_progreso|completada)$", description="Estado actual")
+    usuario_responsable_id: Optional[int] = Field(None, gt=0)
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=1000)
+
+    @model_validator(mode="after")
+    def al_menos_un_criterio(self):
+        if not self.model_dump(exclude_none=True):
+            raise ValueError("El filtro debe incluir al menos un criterio")
+        return self
+
+class TransicionTareas(BaseModel):
+    """Schema para cambiar estado y/o prioridad de varias tareas en una operación"""
+    tarea_ids: Optional[List[int]] = Field(None, min_length=1, max_length=1000, description="IDs de las tareas")
+    filtro: Optional[FiltroTareas] = Field(None, description="Alternativa a tarea_ids")
+    estado: Optional[str] = Field(None, pattern="^(pendiente|en_progreso|completada)$", description="Nuevo estado")
+    prioridad: Optional[str] = Field(None, pattern="^(alta|media|baja)$", description="Nueva prioridad")
+    devolver_ids: bool = Field(default=True, description="Incluir en la respuesta los IDs de las tareas modificadas")
+
+    @model_validator(mode="after")
+    def validar_operacion(self):
+        if (self.tarea_ids is None) == (self.filtro is None):
+            raise ValueError("Indique tarea_ids o filtro (uno de los dos)")
+        if self.estado is None and self.prioridad is None:
+            raise ValueError("Indique el nuevo estado y/o la nueva prioridad")
+        return self
+
+class TransicionTareasResponse(BaseModel):
+    """Schema de respuesta para transiciones masivas de tareas"""
+    message: str
+    actualizadas: int
+    tarea_ids: Optional[List[int]] = None
+
+class CargaProyecto(BaseModel):
+    """Tareas abiertas de un usuario en un proyecto, por prioridad"""
+    proyecto_id: int
+    proyecto_nombre: str
+    alta: int
+    media: int
+    baja: int
+    total: int
+
+class CargaUsuario(BaseModel):
+    """Carga de trabajo de un usuario en todos sus proyectos"""
+    usuario_id: int
+    nombre: str
+    total_abiertas: int
+    proyectos: List[CargaProyecto]
+
+# ===== SCHEMAS PARA TRABAJOS EN SEGUNDO PLANO =====
+
+class TrabajoResponse(BaseModel):
+    """Estado, progreso y resultado de un trabajo en segundo plano"""
+    id: str
+    tipo: str
+    estado: str = Field(..., description="pendiente, en_curso, completado o fallido")
+    progreso: int
+    total: Optional[int] = None
+    resultado: Optional[Any] = None
+    error: Optional[str] = None
+    intentos: int
+    fecha_creacion: datetime
+    fecha_inicio: Optional[datetime] = None
+    fecha_fin: Optional[datetime] = None
+    
+    model_config = ConfigDict(from_attributes=True)
+    
+    @field_validator("resultado", mode="before")
+    @classmethod
+    def decodificar_resultado(cls, valor):
+        # Se guarda como JSON en texto
+        return json.loads(valor) if isinstance(valor, str) else valor
+
 # ===== SCHEMAS DE RESPUESTA GENÉRICA =====
 
 class ErrorResponse(BaseModel):
@@ -115,4 +271,17 @@ class ErrorResponse(BaseModel):
 class SuccessResponse(BaseModel):
     """Schema para respuestas exitosas"""
     message: str
-    data: Optional[dict] = None
\ No newline at end of file
+    data: Optional[dict] = None
+
+class ResultadoItem(BaseModel):
+    """Resultado individual dentro de una operación masiva"""
+    id: int
+    resultado: str
+    detalle: Optional[str] = None
+
+class OperacionMasivaResponse(BaseModel):
+    """Schema de respuesta para operaciones masivas (un resultado por elemento)"""
+    message: str
+    procesados: int
+    exitosos: int
+    resultados: List[ResultadoItem]
\ No newline at end of file
@@ -0,0 +1,282 @@
+"""
+Trabajos en segundo plano para operaciones largas.
+
+Los endpoints pesados (con ?asincrono=true) registran un trabajo en la tabla
+`trabajos` y responden 202 con su ID; GET /api/v1/jobs/{id} informa progreso y
+resultado. Un ejecutor asyncio dentro del servicio reclama trabajos pendientes
+y los ejecuta en hilos (asyncio.to_thread) con concurrencia acotada.
+
+Cada trabajo reclamado queda reservado TRABAJOS_RESERVA_SEGUNDOS y la reserva se
+renueva con cada informe de progreso. Si el proceso muere, la reserva vence y
+otro ejecutor (o el mismo tras reiniciar) lo retoma: las funciones de trabajo
+deben poder repetirse sin efectos duplicados (p. ej. borrar por lotes).
+
+Las funciones se registran con @tipo("nombre") y reciben (parametros, progreso).
+Una HTTPException marca el trabajo como fallido sin reintentos; cualquier otra
+excepción se reintenta hasta TRABAJOS_MAX_INTENTOS.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, update, delete, or_, and_
+
+from app.database import SessionLocal
+from app.models import Trabajo
+from app.schemas import TrabajoResponse
+
+logger = logging.getLogger(__name__)
+
+TRABAJOS_HABILITADO = os.getenv("TRABAJOS_HABILITADO", "1") == "1"
+TRABAJOS_CONCURRENCIA = int(os.getenv("TRABAJOS_CONCURRENCIA", "2"))
+TRABAJOS_INTERVALO_SEGUNDOS = float(os.getenv("TRABAJOS_INTERVALO_SEGUNDOS", "2"))
+TRABAJOS_RESERVA_SEGUNDOS = float(os.getenv("TRABAJOS_RESERVA_SEGUNDOS", "60"))
+TRABAJOS_MAX_INTENTOS = int(os.getenv("TRABAJOS_MAX_INTENTOS", "3"))
+
+# Filas por lote en los trabajos que procesan tablas grandes
+TRABAJOS_LOTE = int(os.getenv("TRABAJOS_LOTE", "1000"))
+
+# Archivos generados (exportaciones) y tiempo que se conservan los trabajos terminados
+TRABAJOS_DIR = os.getenv("TRABAJOS_DIR", "/tmp/trabajos")
+TRABAJOS_RETENCION_HORAS = float(os.getenv("TRABAJOS_RETENCION_HORAS", "168"))
+
+_TIPOS: Dict[str, Callable] = {}
+
+def tipo(nombre: str):
+    """Registrar una función de trabajo: funcion(parametros: dict, progreso: Progreso) -> resultado JSON."""
+    def registrar(funcion: Callable) -> Callable:
+        _TIPOS[nombre] = funcion
+        return funcion
+    return registrar
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+def archivo_resultado(trabajo_id: str, extension: str) -> str:
+    """Ruta del archivo generado por un trabajo."""
+    return os.path.join(TRABAJOS_DIR, f"{trabajo_id}.{extension}")
+
+class Progreso:
+    """Informe de avance de un trabajo en curso; cada informe renueva la reserva."""
+
+    def __init__(self, trabajo_id: str):
+        self.trabajo_id = trabajo_id
+
+    def __call__(self, progreso: int, total: Optional[int] = None):
+        valores = {"progreso": progreso, "reservado_hasta": _ahora() + timedelta(seconds=TRABAJOS_RESERVA_SEGUNDOS)}
+        if total is not None:
+            valores["total"] = total
+        with SessionLocal() as db:
+            db.execute(
+                update(Trabajo)
+                .where(Trabajo.id == self.trabajo_id, Trabajo.estado == "en_curso")
+                .values(**valores)
+            )
+            db.commit()
+
+# ===== OPERACIONES DE BASE DE DATOS (se ejecutan en hilos) =====
+
+def encolar(tipo_trabajo: str, parametros: dict) -> Trabajo:
+    """Registrar un trabajo pendiente y avisar al ejecutor local."""
+    if tipo_trabajo not in _TIPOS:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo_trabajo}")
+    with SessionLocal() as db:
+        trabajo = Trabajo(id=uuid.uuid4().hex, tipo=tipo_trabajo, parametros=json.dumps(parametros, default=str))
+        db.add(trabajo)
+        db.commit()
+        db.refresh(trabajo)
+    if _ejecutor is not None:
+        _ejecutor.despertar()
+    return trabajo
+
+def reclamar() -> Optional[dict]:
+    """
+    Reservar el trabajo pendiente más antiguo, o uno en curso cuya reserva venció
+    (su ejecutor murió). SKIP LOCKED permite varias instancias sin reclamar dos veces.
+    """
+    with SessionLocal() as db:
+        ahora = _ahora()
+        fila = db.execute(
+            select(Trabajo.id, Trabajo.tipo, Trabajo.parametros, Trabajo.intentos)
+            .where(or_(
+                Trabajo.estado == "pendiente",
+                and_(Trabajo.estado == "en_curso", Trabajo.reservado_hasta < ahora)
+            ))
+            .order_by(Trabajo.fecha_creacion)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).first()
+        if fila is None:
+            return None
+        # Condicionado a `intentos`: sin bloqueo de filas (SQLite) gana una sola instancia
+        reclamado = db.execute(
+            update(Trabajo)
+            .where(Trabajo.id == fila.id, Trabajo.intentos == fila.intentos)
+            .values(
+                estado="en_curso",
+                intentos=Trabajo.intentos + 1,
+                reservado_hasta=ahora + timedelta(seconds=TRABAJOS_RESERVA_SEGUNDOS),
+                fecha_inicio=ahora
+            )
+        )
+        db.commit()
+        if reclamado.rowcount == 0:
+            return None
+        return {**fila._asdict(), "intentos": fila.intentos + 1}
+
+def completar(trabajo_id: str, resultado):
+    with SessionLocal() as db:
+        db.execute(
+            update(Trabajo)
+            .where(Trabajo.id == trabajo_id)
+            .values(
+                estado="completado",
+                resultado=json.dumps(resultado, default=str),
+                reservado_hasta=None,
+                fecha_fin=_ahora()
+            )
+        )
+        db.commit()
+
+def registrar_fallo(trabajo_id: str, error: str, reintentar: bool):
+    """Devolver el trabajo a pendiente para reintentarlo, o marcarlo fallido."""
+    valores = {"error": error[:1000], "reservado_hasta": None}
+    if reintentar:
+        valores["estado"] = "pendiente"
+    else:
+        valores.update(estado="fallido", fecha_fin=_ahora())
+    with SessionLocal() as db:
+        db.execute(update(Trabajo).where(Trabajo.id == trabajo_id).values(**valores))
+        db.commit()
+
+def liberar(trabajo_ids):
+    """Devolver a pendiente los trabajos en curso de este proceso (apagado ordenado)."""
+    with SessionLocal() as db:
+        db.execute(
+            update(Trabajo)
+            .where(Trabajo.id.in_(trabajo_ids), Trabajo.estado == "en_curso")
+            .values(estado="pendiente", reservado_hasta=None)
+        )
+        db.commit()
+
+def purgar_terminados() -> int:
+    """Eliminar los trabajos terminados hace más de TRABAJOS_RETENCION_HORAS y sus archivos."""
+    corte = _ahora() - timedelta(hours=TRABAJOS_RETENCION_HORAS)
+    with SessionLocal() as db:
+        ids = list(db.scalars(
+            delete(Trabajo)
+            .where(Trabajo.estado.in_(("completado", "fallido")), Trabajo.fecha_fin < corte)
+            .returning(Trabajo.id)
+        ))
+        db.commit()
+    for trabajo_id in ids:
+        for extension in ("csv",):
+            try:
+                os.remove(archivo_resultado(trabajo_id, extension))
+            except FileNotFoundError:
+                pass
+    return len(ids)
+
+# ===== EJECUTOR =====
+
+class EjecutorTrabajos:
+    """Bucle asyncio que reclama trabajos y los ejecuta en hilos con concurrencia acotada."""
+
+    def __init__(self, concurrencia: int):
+        self._semaforo = asyncio.Semaphore(concurrencia)
+        self._despertador = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._en_curso: Dict[str, asyncio.Task] = {}
+
+    def despertar(self):
+        """Adelantar el próximo sondeo (se puede llamar desde cualquier hilo)."""
+        self._loop.call_soon_threadsafe(self._despertador.set)
+
+    async def ejecutar(self):
+        ultima_purga = 0.0
+        try:
+            while True:
+                if self._loop.time() - ultima_purga > 3600:
+                    ultima_purga = self._loop.time()
+                    try:
+                        await asyncio.to_thread(purgar_terminados)
+                    except Exception:
+                        logger.exception("Error al purgar trabajos terminados")
+
+                await self._semaforo.acquire()
+                try:
+                    trabajo = await asyncio.to_thread(reclamar)
+                except Exception:
+                    logger.exception("Error al reclamar trabajos")
+                    trabajo = None
+                if trabajo is None:
+                    self._semaforo.release()
+                    try:
+                        await asyncio.wait_for(self._despertador.wait(), TRABAJOS_INTERVALO_SEGUNDOS)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._despertador.clear()
+                    continue
+                tarea = asyncio.create_task(self._procesar(trabajo))
+                self._en_curso[trabajo["id"]] = tarea
+                tarea.add_done_callback(lambda _, trabajo_id=trabajo["id"]: self._fin(trabajo_id))
+        finally:
+            if self._en_curso:
+                # Los hilos no se pueden interrumpir: se liberan para que otro proceso los retome
+                await asyncio.to_thread(liberar, list(self._en_curso))
+
+    def _fin(self, trabajo_id: str):
+        self._en_curso.pop(trabajo_id, None)
+        self._semaforo.release()
+
+    async def _procesar(self, trabajo: dict):
+        funcion = _TIPOS.get(trabajo["tipo"])
+        try:
+            if funcion is None:
+                raise HTTPException(status_code=500, detail=f"Tipo de trabajo desconocido: {trabajo['tipo']}")
+            resultado = await asyncio.to_thread(funcion, json.loads(trabajo["parametros"]), Progreso(trabajo["id"]))
+            await asyncio.to_thread(completar, trabajo["id"], resultado)
+            logger.info("Trabajo %s (%s) completado", trabajo["id"], trabajo["tipo"])
+        except HTTPException as error:
+            await asyncio.to_thread(registrar_fallo, trabajo["id"], str(error.detail), False)
+        except Exception as error:
+            logger.exception("Error en el trabajo %s (%s)", trabajo["id"], trabajo["tipo"])
+            reintentar = trabajo["intentos"] < TRABAJOS_MAX_INTENTOS
+            await asyncio.to_thread(registrar_fallo, trabajo["id"], repr(error), reintentar)
+
+_ejecutor: Optional[EjecutorTrabajos] = None
+_tarea: Optional[asyncio.Task] = None
+
+def iniciar():
+    """Arrancar el ejecutor de trabajos en segundo plano."""
+    global _ejecutor, _tarea
+    if TRABAJOS_HABILITADO:
+        _ejecutor = EjecutorTrabajos(TRABAJOS_CONCURRENCIA)
+        _tarea = asyncio.create_task(_ejecutor.ejecutar())
+
+async def detener():
+    """Cancelar el ejecutor; los trabajos en curso vuelven a pendiente."""
+    global _ejecutor, _tarea
+    if _tarea is not None:
+        _tarea.cancel()
+        try:
+            await _tarea
+        except asyncio.CancelledError:
+            pass
+        _tarea = None
+        _ejecutor = None
+
+def respuesta_aceptada(trabajo: Trabajo) -> JSONResponse:
+    """Respuesta 202 de un endpoint que delegó su trabajo: estado inicial y Location para consultarlo."""
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=TrabajoResponse.model_validate(trabajo).model_dump(mode="json"),
+        headers={"Location": f"/api/v1/jobs/{trabajo.id}"}
+    )
@@ -0,0 +1,85 @@
+"""
+Escáner periódico de vencimientos.
+
+Recalcula en una sola consulta agregada (sobre el índice parcial de tareas
+abiertas con vencimiento) los contadores de tareas vencidas y por vencer por
+proyecto y usuario responsable, y los guarda en resumen_vencimientos. Las vistas
+de resumen se vuelven búsquedas por índice en una tabla pequeña.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select, insert, delete, func, case, literal
+
+from app.database import sesion_shard, NUM_SHARDS
+from app.models import Tarea, ResumenVencimientos
+
+logger = logging.getLogger(__name__)
+
+VENCIMIENTOS_HABILITADO = os.getenv("VENCIMIENTOS_HABILITADO", "1") == "1"
+VENCIMIENTOS_INTERVALO_SEGUNDOS = float(os.getenv("VENCIMIENTOS_INTERVALO_SEGUNDOS", "300"))
+
+# Ventana de "vencen pronto" en días
+VENCIMIENTOS_DIAS_PROXIMOS = float(os.getenv("VENCIMIENTOS_DIAS_PROXIMOS", "7"))
+
+def recalcular_resumen(indice: int = 0) -> int:
+    """Reemplazar los contadores del shard `indice` en una transacción; devuelve las filas generadas."""
+    db = sesion_shard(indice)
+    try:
+        ahora = datetime.now(timezone.utc)
+        limite = ahora + timedelta(days=VENCIMIENTOS_DIAS_PROXIMOS)
+
+        agregado = select(
+            Tarea.proyecto_id,
+            Tarea.usuario_responsable_id,
+            func.sum(case((Tarea.fecha_vencimiento < ahora, 1), else_=0)),
+            func.sum(case((Tarea.fecha_vencimiento >= ahora, 1), else_=0)),
+            literal(ahora, ResumenVencimientos.calculado_en.type),
+        ).where(
+            Tarea.estado != "completada",
+            Tarea.fecha_vencimiento.isnot(None),
+            Tarea.fecha_vencimiento < limite
+        ).group_by(Tarea.proyecto_id, Tarea.usuario_responsable_id)
+
+        db.execute(delete(ResumenVencimientos))
+        resultado = db.execute(
+            insert(ResumenVencimientos).from_select(
+                ["proyecto_id", "usuario_responsable_id", "vencidas", "vencen_pronto", "calculado_en"],
+                agregado
+            )
+        )
+        db.commit()
+        return resultado.rowcount
+    finally:
+        db.close()
+
+async def _escanear_periodicamente():
+    while True:
+        try:
+            for indice in range(NUM_SHARDS):
+                await asyncio.to_thread(recalcular_resumen, indice)
+        except Exception:
+            logger.exception("Error al recalcular el resumen de vencimientos")
+        await asyncio.sleep(VENCIMIENTOS_INTERVALO_SEGUNDOS)
+
+_tarea: Optional[asyncio.Task] = None
+
+def iniciar():
+    """Arrancar el escáner periódico de vencimientos."""
+    global _tarea
+    if VENCIMIENTOS_HABILITADO:
+        _tarea = asyncio.create_task(_escanear_periodicamente())
+
+async def detener():
+    global _tarea
+    if _tarea is not None:
+        _tarea.cancel()
+        try:
+            await _tarea
+        except asyncio.CancelledError:
+            pass
+        _tarea = None
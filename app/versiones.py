@@ -0,0 +1,44 @@
+"""
+Concurrencia optimista con la columna `version` de los modelos.
+
+Los modelos declaran `version` como version_id_col: cada UPDATE del ORM se
+emite como `UPDATE ... WHERE id = ? AND version = ?` e incrementa la versión,
+sin bloquear filas. Si otra transacción cambió la fila, el UPDATE no afecta
+filas y SQLAlchemy lanza StaleDataError.
+
+La versión se expone como ETag; los PUT aceptan If-Match y responden 412 si
+no coincide con la versión actual.
+"""
+
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+def verificar_if_match(if_match: Optional[str], version: int):
+    """Lanzar 412 si el header If-Match no incluye la versión actual."""
+    if if_match is None:
+        return
+    etiquetas = [etiqueta.strip() for etiqueta in if_match.split(",")]
+    if "*" in etiquetas:
+        return
+    # Comparación débil: W/"3" equivale a "3"
+    if etag(version) not in (etiqueta.removeprefix("W/") for etiqueta in etiquetas):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"La versión actual es {version}; el recurso fue modificado"
+        )
+
+def conflicto_concurrente(if_match: Optional[str]) -> HTTPException:
+    """Error para un UPDATE que perdió la carrera contra otra edición concurrente."""
+    if if_match is not None:
+        return HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="El recurso fue modificado por otra petición"
+        )
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="El recurso fue modificado por otra petición; vuelva a intentarlo"
+    )
@@ -0,0 +1,98 @@
+"""
+Benchmark del autocompletado de usuarios (GET /usuarios/autocompletar).
+
+Siembra N usuarios con nombres y apellidos combinados y un proyecto con 500
+miembros, y mide por texto buscado:
+- memoria: búsqueda en el índice de prefijos (app.autocompletado.IndicePrefijos).
+- sql: la consulta LIKE equivalente sobre SQLite (sin índices de trigramas; en
+  PostgreSQL los índices GIN pg_trgm evitan el recorrido completo).
+Con alcance de proyecto, la medición en memoria incluye la consulta de miembros; sin
+alcance, los prefijos con muchas coincidencias se sirven de la caché tras la primera búsqueda.
+Antes de medir comprueba que ambas implementaciones devuelven lo mismo.
+
+Uso: python -m benchmarks.bench_autocompletar [--usuarios 100000] [--limite 10]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+
+from sqlalchemy import insert, select
+
+from app.autocompletado import IndicePrefijos, consulta_sql, normalizar
+from app.models import Proyecto, Usuario, proyecto_usuario_association
+from benchmarks.comun import crear_motor_sqlite, medir
+
+NOMBRES = [
+    "María", "José", "Ana", "Juan", "Lucía", "Carlos", "Marta", "Pedro", "Laura", "Diego",
+    "Sofía", "Pablo", "Elena", "Javier", "Carmen", "Miguel", "Paula", "Andrés", "Valeria", "Martín",
+]
+APELLIDOS = [
+    "García", "Fernández", "González", "Rodríguez", "López", "Martínez", "Sánchez", "Pérez",
+    "Gómez", "Martín", "Jiménez", "Ruiz", "Hernández", "Díaz", "Moreno", "Álvarez", "Romero",
+    "Alonso", "Gutiérrez", "Navarro", "Torres", "Domínguez", "Vázquez", "Ramos", "Gil",
+]
+TEXTOS = ["m", "ma", "mar", "maría g", "garc", "lopez", "usuario12", "zz"]
+
+def _sembrar(Sesion, cantidad: int) -> int:
+    aleatorio = random.Random(42)
+    with Sesion() as db:
+        db.execute(insert(Usuario), [
+            {
+                "nombre": f"{aleatorio.choice(NOMBRES)} {aleatorio.choice(APELLIDOS)} {aleatorio.choice(APELLIDOS)}",
+                "email": f"usuario{i}@ejemplo.com",
+            }
+            for i in range(cantidad)
+        ])
+        proyecto = Proyecto(nombre="Proyecto de benchmark")
+        db.add(proyecto)
+        db.flush()
+        db.execute(insert(proyecto_usuario_association), [
+            {"proyecto_id": proyecto.id, "usuario_id": usuario_id}
+            for usuario_id in aleatorio.sample(range(1, cantidad + 1), 500)
+        ])
+        db.commit()
+        return proyecto.id
+
+def main():
+    parser = argparse.ArgumentParser(description="Autocompletado de usuarios: índice en memoria vs. SQL")
+    parser.add_argument("--usuarios", type=int, default=100_000)
+    parser.add_argument("--limite", type=int, default=10)
+    opciones = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        motor, Sesion = crear_motor_sqlite(os.path.join(directorio, "autocompletar.db"))
+        proyecto_id = _sembrar(Sesion, opciones.usuarios)
+        with Sesion() as db:
+            indice = IndicePrefijos()
+            indice.reemplazar(db.execute(select(Usuario.id, Usuario.nombre, Usuario.email, Usuario.rol)))
+            consulta_miembros = select(proyecto_usuario_association.c.usuario_id).where(
+                proyecto_usuario_association.c.proyecto_id == proyecto_id
+            )
+
+            print(f"{opciones.usuarios} usuarios, límite {opciones.limite}\n")
+            print(f"{'texto':<10} | {'alcance':<8} | {'memoria ms':>10} | {'sql ms':>8} | resultados")
+            print("-" * 60)
+            for texto in TEXTOS:
+                texto = normalizar(texto)
+                for alcance, filtro in (("todos", None), ("proyecto", proyecto_id)):
+                    # Con alcance de proyecto, la búsqueda en memoria incluye la consulta de miembros
+                    def _en_memoria():
+                        permitidos = set(db.scalars(consulta_miembros)) if filtro else None
+                        return indice.buscar(texto, opciones.limite, permitidos)
+
+                    en_memoria = _en_memoria()
+                    consulta = consulta_sql(texto, opciones.limite, filtro)
+                    en_sql = [dict(fila._mapping) for fila in db.execute(consulta)]
+                    if [u["id"] for u in en_memoria] != [u["id"] for u in en_sql]:
+                        raise SystemExit(f"Resultados distintos para {texto!r} ({alcance})")
+
+                    memoria = medir(_en_memoria, rondas=3)
+                    sql = medir(lambda: db.execute(consulta).all(), rondas=3, duracion_ronda=0.5)
+                    print(f"{texto:<10} | {alcance:<8} | {memoria['min_us'] / 1000:>10.3f} | "
+                          f"{sql['min_us'] / 1000:>8.2f} | {len(en_memoria)}")
+        motor.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark de borrado de proyectos según la cantidad de tareas.
+
+Compara:
+- orm_cascade: comportamiento anterior (cargar la colección de tareas en la
+  sesión y borrar fila por fila, como hacía cascade="all, delete-orphan").
+- delete_pasivo: DELETE del proyecto y ON DELETE CASCADE en la base de datos,
+  como hace ahora eliminar_proyecto.
+
+Uso: python -m benchmarks.bench_borrados [N1 N2 ...]
+"""
+
+import os
+import sys
+import tempfile
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import selectinload
+
+from app.models import Proyecto, Tarea
+from benchmarks.comun import crear_motor_sqlite, medir_una_vez
+
+def _sembrar(Sesion, cantidad_tareas: int) -> int:
+    with Sesion() as db:
+        proyecto = Proyecto(nombre=f"Proyecto {cantidad_tareas}")
+        db.add(proyecto)
+        db.flush()
+        db.execute(insert(Tarea), [
+            {"titulo": f"Tarea {i}", "proyecto_id": proyecto.id} for i in range(cantidad_tareas)
+        ])
+        db.commit()
+        return proyecto.id
+
+def borrar_orm_cascade(Sesion, proyecto_id: int):
+    with Sesion() as db:
+        proyecto = db.query(Proyecto).options(selectinload(Proyecto.tareas)).filter(Proyecto.id == proyecto_id).one()
+        for tarea in list(proyecto.tareas):
+            db.delete(tarea)
+        db.delete(proyecto)
+        db.commit()
+
+def borrar_delete_pasivo(Sesion, proyecto_id: int):
+    with Sesion() as db:
+        db.execute(delete(Proyecto).where(Proyecto.id == proyecto_id))
+        db.commit()
+
+def main(tamanos):
+    print(f"{'tareas':>8} | {'estrategia':<14} | {'tiempo (ms)':>11} | {'memoria pico (KiB)':>18}")
+    print("-" * 62)
+    with tempfile.TemporaryDirectory() as directorio:
+        _, Sesion = crear_motor_sqlite(os.path.join(directorio, "bench.db"))
+        for cantidad in tamanos:
+            for nombre, estrategia in (("orm_cascade", borrar_orm_cascade), ("delete_pasivo", borrar_delete_pasivo)):
+                proyecto_id = _sembrar(Sesion, cantidad)
+                segundos, memoria = medir_una_vez(lambda: estrategia(Sesion, proyecto_id))
+                print(f"{cantidad:>8} | {nombre:<14} | {segundos * 1000:>11.1f} | {memoria / 1024:>18.1f}")
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [100, 1000, 10000, 50000])
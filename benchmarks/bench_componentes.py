@@ -0,0 +1,159 @@
+"""
+Microbenchmarks de los componentes que dominan la CPU en el camino de una request.
+
+Casos:
+- tarea_create: validación Pydantic de TareaCreate.
+- usuario_create: validación de UsuarioCreate (incluye EmailStr).
+- proyecto_response: conversión ORM -> ProyectoResponse con 10 usuarios anidados.
+- listar_tareas_construir: construcción de la consulta de listar_tareas con filtros.
+- listar_tareas_ejecutar: consulta + serialización de una página de 100 tareas.
+- get_db: resolución de la dependencia get_db por FastAPI (threadpool incluido).
+
+Las fixtures viven en SQLite en memoria. Los tiempos son microsegundos por
+operación (mínimo y mediana de varias rondas con el GC desactivado).
+
+Uso:
+    python -m benchmarks.bench_componentes [casos...] [--json salida.json] [--comparar base.json]
+
+--comparar marca como regresión los casos cuyo mínimo empeora más que --umbral
+(por defecto 10 %) respecto de la línea base, y termina con código 1.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+from contextlib import AsyncExitStack
+
+from fastapi import Depends
+from fastapi.dependencies.utils import get_dependant, solve_dependencies
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, selectinload
+from starlette.requests import Request
+
+from app.database import get_db
+from app.models import Proyecto, Tarea, Usuario
+from app.routers.tareas import _filtrar_tareas, _lista_tareas_adapter
+from app.schemas import ProyectoResponse, TareaCreate, UsuarioCreate
+from benchmarks.comun import crear_motor_sqlite, medir
+
+def _sembrar(Sesion) -> int:
+    """10 usuarios asignados a un proyecto con 1000 tareas."""
+    with Sesion() as db:
+        usuarios = [Usuario(nombre=f"Usuario {i}", email=f"usuario{i}@ejemplo.com") for i in range(10)]
+        proyecto = Proyecto(nombre="Proyecto de benchmark", usuarios=usuarios)
+        db.add(proyecto)
+        db.flush()
+        db.execute(insert(Tarea), [
+            {
+                "titulo": f"Tarea {i}",
+                "estado": ("pendiente", "en_progreso", "completada")[i % 3],
+                "proyecto_id": proyecto.id,
+                "usuario_responsable_id": usuarios[i % 10].id,
+            }
+            for i in range(1000)
+        ])
+        db.commit()
+        return proyecto.id
+
+def _casos(Sesion, proyecto_id: int) -> dict:
+    datos_tarea = {
+        "titulo": "Revisar el informe trimestral",
+        "descripcion": "Comparar con el trimestre anterior",
+        "estado": "en_progreso",
+        "prioridad": "alta",
+        "fecha_vencimiento": "2030-01-31T12:00:00Z",
+        "proyecto_id": proyecto_id,
+    }
+    datos_usuario = {"nombre": "Ana Pérez", "email": "ana.perez@ejemplo.com", "rol": "manager"}
+
+    db = Sesion()
+    proyecto = db.query(Proyecto).options(selectinload(Proyecto.usuarios)).filter(Proyecto.id == proyecto_id).one()
+    filtros = {"proyecto_id": proyecto_id, "estado": "pendiente", "usuario_responsable_id": None}
+
+    def construir_listar_tareas():
+        return _filtrar_tareas(db.query(Tarea), Tarea, **filtros).offset(0).limit(100).statement
+
+    def ejecutar_listar_tareas():
+        tareas = _filtrar_tareas(db.query(Tarea), Tarea, **filtros).offset(0).limit(100).all()
+        return _lista_tareas_adapter.dump_json(_lista_tareas_adapter.validate_python(tareas, from_attributes=True))
+
+    # Resolver get_db como lo hace FastAPI para un endpoint con `db: Session = Depends(get_db)`
+    async def _endpoint(db: Session = Depends(get_db)):
+        pass
+
+    dependant = get_dependant(path="/", call=_endpoint)
+    bucle = asyncio.new_event_loop()
+
+    async def _resolver():
+        async with AsyncExitStack() as pila:
+            request = Request({"type": "http", "method": "GET", "path": "/", "headers": [],
+                               "query_string": b"", "fastapi_astack": pila})
+            await solve_dependencies(request=request, dependant=dependant)
+
+    return {
+        "tarea_create": lambda: TareaCreate.model_validate(datos_tarea),
+        "usuario_create": lambda: UsuarioCreate.model_validate(datos_usuario),
+        "proyecto_response": lambda: ProyectoResponse.model_validate(proyecto),
+        "listar_tareas_construir": construir_listar_tareas,
+        "listar_tareas_ejecutar": ejecutar_listar_tareas,
+        "get_db": lambda: bucle.run_until_complete(_resolver()),
+    }
+
+def _comparar(resultados: dict, base: dict, umbral: float) -> list:
+    regresiones = []
+    print(f"\n{'caso':<24} | {'base (us)':>10} | {'actual (us)':>11} | {'cambio':>8}")
+    print("-" * 62)
+    for nombre, actual in resultados.items():
+        anterior = base.get("casos", {}).get(nombre)
+        if anterior is None:
+            print(f"{nombre:<24} | {'-':>10} | {actual['min_us']:>11.2f} | {'nuevo':>8}")
+            continue
+        cambio = actual["min_us"] / anterior["min_us"] - 1
+        marca = "  REGRESIÓN" if cambio > umbral else ""
+        print(f"{nombre:<24} | {anterior['min_us']:>10.2f} | {actual['min_us']:>11.2f} | {cambio:>+8.1%}{marca}")
+        if cambio > umbral:
+            regresiones.append(nombre)
+    return regresiones
+
+def main(argumentos=None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks de componentes del camino caliente")
+    parser.add_argument("casos", nargs="*", help="Casos a ejecutar (por defecto, todos)")
+    parser.add_argument("--rondas", type=int, default=7)
+    parser.add_argument("--json", dest="salida", help="Guardar los resultados en este archivo")
+    parser.add_argument("--comparar", help="Archivo JSON de una ejecución anterior (línea base)")
+    parser.add_argument("--umbral", type=float, default=0.10, help="Empeoramiento tolerado (0.10 = 10 %%)")
+    opciones = parser.parse_args(argumentos)
+
+    _, Sesion = crear_motor_sqlite()
+    casos = _casos(Sesion, _sembrar(Sesion))
+    desconocidos = set(opciones.casos) - set(casos)
+    if desconocidos:
+        parser.error(f"Casos desconocidos: {', '.join(sorted(desconocidos))}")
+
+    resultados = {}
+    print(f"{'caso':<24} | {'iteraciones':>11} | {'min (us)':>10} | {'mediana (us)':>12} | {'desv (us)':>9}")
+    print("-" * 78)
+    for nombre, funcion in casos.items():
+        if opciones.casos and nombre not in opciones.casos:
+            continue
+        resultado = medir(funcion, rondas=opciones.rondas)
+        resultados[nombre] = resultado
+        print(f"{nombre:<24} | {resultado['iteraciones']:>11} | {resultado['min_us']:>10.2f} | "
+              f"{resultado['mediana_us']:>12.2f} | {resultado['desviacion_us']:>9.2f}")
+
+    if opciones.salida:
+        with open(opciones.salida, "w", encoding="utf-8") as archivo:
+            json.dump({"python": platform.python_version(), "casos": resultados}, archivo, indent=2)
+
+    if opciones.comparar:
+        with open(opciones.comparar, encoding="utf-8") as archivo:
+            regresiones = _comparar(resultados, json.load(archivo), opciones.umbral)
+        if regresiones:
+            print(f"\nRegresiones por encima del {opciones.umbral:.0%}: {', '.join(regresiones)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
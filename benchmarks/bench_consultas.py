@@ -0,0 +1,104 @@
+"""
+Benchmark de las consultas calientes por clave primaria (app/consultas.py).
+
+Compara, por operación, la forma anterior de los routers con la actual:
+- obtener: db.query(M).filter(M.id == x).first() vs. lambda_stmt con la
+  sentencia compilada en caché.
+- existe: db.query(M.id).filter(...).first() vs. SELECT EXISTS(...) con lambda_stmt.
+- es_miembro: cargar proyecto y usuario y comprobar con la colección de
+  miembros (`usuario in proyecto.usuarios`) vs. con un EXISTS sobre la tabla
+  de asociación.
+- email_en_uso: cargar el usuario con ese email vs. EXISTS.
+
+Cada operación vacía el identity map después, como una sesión nueva por request.
+La base es SQLite en memoria, de modo que la diferencia es casi toda del lado de
+Python (construcción, compilación y carga de entidades).
+
+Uso: python -m benchmarks.bench_consultas [--miembros 100] [--rondas 5]
+"""
+
+import argparse
+
+from sqlalchemy import insert
+
+from app import consultas
+from app.models import Proyecto, Usuario, proyecto_usuario_association
+from benchmarks.comun import crear_motor_sqlite, medir
+
+def _sembrar(Sesion, miembros: int) -> tuple:
+    with Sesion() as db:
+        db.execute(insert(Usuario), [
+            {"nombre": f"Usuario {i}", "email": f"usuario{i}@ejemplo.com"} for i in range(miembros)
+        ])
+        proyecto = Proyecto(nombre="Proyecto de benchmark")
+        db.add(proyecto)
+        db.flush()
+        db.execute(insert(proyecto_usuario_association), [
+            {"proyecto_id": proyecto.id, "usuario_id": usuario_id} for usuario_id in range(1, miembros + 1)
+        ])
+        db.commit()
+        return proyecto.id, miembros  # El último usuario: el más caro de encontrar en la colección
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas por clave primaria: ORM Query vs. lambda_stmt/EXISTS")
+    parser.add_argument("--miembros", type=int, default=100, help="Usuarios asignados al proyecto")
+    parser.add_argument("--rondas", type=int, default=5)
+    opciones = parser.parse_args()
+
+    motor, Sesion = crear_motor_sqlite()
+    proyecto_id, usuario_id = _sembrar(Sesion, opciones.miembros)
+    email = f"usuario{usuario_id - 1}@ejemplo.com"
+    db = Sesion()
+
+    def _por_request(funcion):
+        def _ejecutar():
+            funcion()
+            db.expunge_all()
+        return _ejecutar
+
+    def _miembro_con_colecciones():
+        proyecto = db.query(Proyecto).filter(Proyecto.id == proyecto_id).first()
+        usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
+        return usuario in proyecto.usuarios
+
+    def _miembro_con_exists():
+        # La ruta sigue cargando proyecto y usuario para los mensajes; solo cambia la comprobación
+        proyecto = consultas.obtener(db, Proyecto, proyecto_id)
+        usuario = consultas.obtener(db, Usuario, usuario_id)
+        return consultas.es_miembro(db, proyecto.id, usuario.id)
+
+    casos = {
+        "obtener": (
+            lambda: db.query(Proyecto).filter(Proyecto.id == proyecto_id).first(),
+            lambda: consultas.obtener(db, Proyecto, proyecto_id),
+        ),
+        "existe": (
+            lambda: db.query(Proyecto.id).filter(Proyecto.id == proyecto_id).first() is not None,
+            lambda: consultas.existe(db, Proyecto, proyecto_id),
+        ),
+        "es_miembro": (
+            _miembro_con_colecciones,
+            _miembro_con_exists,
+        ),
+        "email_en_uso": (
+            lambda: db.query(Usuario).filter(Usuario.email == email).first() is not None,
+            lambda: consultas.email_en_uso(db, email),
+        ),
+    }
+
+    print(f"Proyecto con {opciones.miembros} miembros, SQLite en memoria\n")
+    print(f"{'operación':<14} | {'antes (us)':>10} | {'ahora (us)':>10} | {'ahorro (us)':>11} | {'mejora':>7}")
+    print("-" * 64)
+    for nombre, (antes, ahora) in casos.items():
+        if bool(antes()) != bool(ahora()):
+            raise SystemExit(f"Resultados distintos en {nombre}")
+        db.expunge_all()
+        t_antes = medir(_por_request(antes), rondas=opciones.rondas)["min_us"]
+        t_ahora = medir(_por_request(ahora), rondas=opciones.rondas)["min_us"]
+        print(f"{nombre:<14} | {t_antes:>10.1f} | {t_ahora:>10.1f} | {t_antes - t_ahora:>11.1f} | "
+              f"{t_antes / t_ahora:>6.1f}x")
+    db.close()
+    motor.dispose()
+
+if __name__ == "__main__":
+    main()
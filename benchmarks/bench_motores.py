@@ -0,0 +1,161 @@
+"""
+Benchmark de carga concurrente por motor de base de datos.
+
+Varios hilos ejecutan durante un tiempo fijo una mezcla de lecturas (página
+de 50 tareas filtradas por estado) y escrituras (alta de una tarea y cambio de
+estado de otra, en una transacción). Motores comparados:
+- sqlite_base: SQLite en archivo con la configuración por defecto (solo claves foráneas).
+- sqlite_ajustado: SQLite con el modo de app.modo_sqlite (WAL, pragmas, escritor único).
+- postgres: solo con --postgres URL. Usar una base dedicada: se crean y
+  eliminan las tablas de la aplicación.
+
+Por motor se reportan operaciones por segundo, latencias p50/p99 de lectura y
+escritura y la cantidad de errores (p. ej. "database is locked").
+
+Uso: python -m benchmarks.bench_motores [--hilos 8] [--segundos 3] [--lecturas 0.8] [--postgres URL]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import modo_sqlite
+from app.database import Base
+from app.models import Proyecto, Tarea
+from app.routers.tareas import _filtrar_tareas
+from benchmarks.comun import crear_motor_sqlite
+
+ESTADOS = ("pendiente", "en_progreso", "completada")
+
+def _motor_sqlite_ajustado(ruta: str):
+    url = f"sqlite:///{ruta}"
+    motor = create_engine(url, **modo_sqlite.opciones_motor(url))
+    modo_sqlite.configurar(motor)
+    Base.metadata.create_all(bind=motor)
+    return motor, sessionmaker(autocommit=False, autoflush=False, bind=motor)
+
+def _motor_postgres(url: str):
+    motor = create_engine(url, pool_size=32, max_overflow=0)
+    Base.metadata.drop_all(bind=motor)
+    Base.metadata.create_all(bind=motor)
+    return motor, sessionmaker(autocommit=False, autoflush=False, bind=motor)
+
+def _sembrar(Sesion, cantidad_tareas: int = 1000) -> int:
+    with Sesion() as db:
+        proyecto = Proyecto(nombre="Proyecto de carga")
+        db.add(proyecto)
+        db.flush()
+        db.execute(insert(Tarea), [
+            {"titulo": f"Tarea {i}", "estado": ESTADOS[i % 3], "proyecto_id": proyecto.id}
+            for i in range(cantidad_tareas)
+        ])
+        db.commit()
+        return proyecto.id
+
+def _leer(Sesion, proyecto_id: int):
+    with Sesion() as db:
+        filtros = {"proyecto_id": proyecto_id, "estado": random.choice(ESTADOS), "usuario_responsable_id": None}
+        _filtrar_tareas(db.query(Tarea), Tarea, **filtros).offset(0).limit(50).all()
+
+def _escribir(Sesion, proyecto_id: int, cantidad_tareas: int):
+    with Sesion() as db:
+        db.add(Tarea(titulo="Tarea concurrente", proyecto_id=proyecto_id))
+        db.execute(
+            update(Tarea)
+            .where(Tarea.id == random.randint(1, cantidad_tareas))
+            .values(estado=random.choice(ESTADOS), version=Tarea.version + 1)
+        )
+        db.commit()
+
+def ejecutar_carga(Sesion, proyecto_id: int, hilos: int, segundos: float, fraccion_lecturas: float,
+                   cantidad_tareas: int = 1000) -> dict:
+    """Ejecutar la mezcla de operaciones en `hilos` hilos durante `segundos`."""
+    latencias = {"lectura": [], "escritura": []}
+    errores = []
+    fin = time.perf_counter() + segundos
+    barrera = threading.Barrier(hilos)
+
+    def _trabajador():
+        locales = {"lectura": [], "escritura": []}
+        barrera.wait()
+        while time.perf_counter() < fin:
+            tipo = "lectura" if random.random() < fraccion_lecturas else "escritura"
+            inicio = time.perf_counter()
+            try:
+                if tipo == "lectura":
+                    _leer(Sesion, proyecto_id)
+                else:
+                    _escribir(Sesion, proyecto_id, cantidad_tareas)
+                locales[tipo].append(time.perf_counter() - inicio)
+            except OperationalError as error:
+                errores.append(str(error.orig))
+        for tipo, valores in locales.items():
+            latencias[tipo].extend(valores)
+
+    trabajadores = [threading.Thread(target=_trabajador) for _ in range(hilos)]
+    for trabajador in trabajadores:
+        trabajador.start()
+    for trabajador in trabajadores:
+        trabajador.join()
+
+    def _percentil(valores, p):
+        return statistics.quantiles(valores, n=100)[p - 1] * 1000 if len(valores) > 1 else 0.0
+
+    operaciones = len(latencias["lectura"]) + len(latencias["escritura"])
+    return {
+        "ops_s": operaciones / segundos,
+        "lectura_p50_ms": _percentil(latencias["lectura"], 50),
+        "lectura_p99_ms": _percentil(latencias["lectura"], 99),
+        "escritura_p50_ms": _percentil(latencias["escritura"], 50),
+        "escritura_p99_ms": _percentil(latencias["escritura"], 99),
+        "errores": len(errores),
+        "ejemplo_error": errores[0] if errores else "",
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga concurrente por motor de base de datos")
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--segundos", type=float, default=3.0)
+    parser.add_argument("--lecturas", type=float, default=0.8, help="Fracción de operaciones de lectura")
+    parser.add_argument("--postgres", help="URL de una base PostgreSQL dedicada para comparar")
+    opciones = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        motores = {
+            "sqlite_base": lambda: crear_motor_sqlite(os.path.join(directorio, "base.db")),
+            "sqlite_ajustado": lambda: _motor_sqlite_ajustado(os.path.join(directorio, "ajustado.db")),
+        }
+        if opciones.postgres:
+            motores["postgres"] = lambda: _motor_postgres(opciones.postgres)
+
+        print(f"{opciones.hilos} hilos, {opciones.segundos:.0f} s, {opciones.lecturas:.0%} lecturas\n")
+        print(f"{'motor':<16} | {'ops/s':>8} | {'lect p50':>9} | {'lect p99':>9} | "
+              f"{'escr p50':>9} | {'escr p99':>9} | {'errores':>7}")
+        print("-" * 84)
+        for nombre, crear in motores.items():
+            motor, Sesion = crear()
+            try:
+                resultado = ejecutar_carga(
+                    Sesion, _sembrar(Sesion), opciones.hilos, opciones.segundos, opciones.lecturas
+                )
+            finally:
+                if nombre == "postgres":
+                    Base.metadata.drop_all(bind=motor)
+                motor.dispose()
+            print(f"{nombre:<16} | {resultado['ops_s']:>8.0f} | {resultado['lectura_p50_ms']:>9.2f} | "
+                  f"{resultado['lectura_p99_ms']:>9.2f} | {resultado['escritura_p50_ms']:>9.2f} | "
+                  f"{resultado['escritura_p99_ms']:>9.2f} | {resultado['errores']:>7}")
+            if resultado["errores"]:
+                print(f"{'':<16}   p. ej.: {resultado['ejemplo_error']}")
+        print("\nLatencias en milisegundos.")
+
+if __name__ == "__main__":
+    main()
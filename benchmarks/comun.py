@@ -0,0 +1,80 @@
+"""
+Utilidades compartidas por los benchmarks: motores SQLite aislados y medición.
+Los benchmarks nunca usan DATABASE_URL, para no tocar una base de datos real.
+"""
+
+import gc
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+import app.models  # noqa: F401  Registrar los modelos en Base.metadata
+
+def crear_motor_sqlite(ruta: str = None):
+    """Motor SQLite con claves foráneas activas; en memoria si no se indica ruta."""
+    if ruta is None:
+        motor = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+    else:
+        motor = create_engine(f"sqlite:///{ruta}")
+
+    @event.listens_for(motor, "connect")
+    def _activar_claves_foraneas(conexion_dbapi, _registro):
+        conexion_dbapi.execute("PRAGMA foreign_keys=ON")
+
+    Base.metadata.create_all(bind=motor)
+    return motor, sessionmaker(autocommit=False, autoflush=False, bind=motor)
+
+def medir_una_vez(funcion):
+    """Ejecutar `funcion` una vez y devolver (segundos, pico de memoria Python en bytes)."""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    try:
+        funcion()
+        return time.perf_counter() - inicio, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def medir(funcion, rondas: int = 7, duracion_ronda: float = 0.2) -> dict:
+    """
+    Microbenchmark estilo timeit: calibra las iteraciones para que cada ronda dure
+    al menos `duracion_ronda` segundos y devuelve microsegundos por operación
+    (mínimo, mediana y desviación entre rondas). El GC se desactiva durante las
+    rondas para que los números sean comparables entre ejecuciones.
+    """
+    iteraciones = 1
+    while True:
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            funcion()
+        transcurrido = time.perf_counter() - inicio
+        if transcurrido >= duracion_ronda / 10:
+            break
+        iteraciones *= 2
+    iteraciones = max(1, round(iteraciones * duracion_ronda / transcurrido))
+
+    tiempos = []
+    gc_activo = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rondas):
+            inicio = time.perf_counter()
+            for _ in range(iteraciones):
+                funcion()
+            tiempos.append((time.perf_counter() - inicio) / iteraciones * 1e6)
+    finally:
+        if gc_activo:
+            gc.enable()
+
+    return {
+        "iteraciones": iteraciones,
+        "min_us": min(tiempos),
+        "mediana_us": statistics.median(tiempos),
+        "desviacion_us": statistics.stdev(tiempos) if len(tiempos) > 1 else 0.0,
+    }
@@ -4,6 +4,9 @@
 -- Crear extensión UUID para generar IDs únicos (opcional)
 -- CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- Índices de trigramas para el autocompletado de usuarios
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Configurar timezone
 SET timezone = 'UTC';
 
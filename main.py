@@ -8,14 +8,23 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import logging
 import uvicorn
 import os
 
 # Importar configuración de base de datos y modelos
 from app.database import create_tables
+from app.admision import ControlAdmision, ADMISION_HABILITADA
+from app.idempotencia import ControlIdempotencia
+from app.perfilado import ControlPerfilado, PERFILADO_HABILITADO
+from app.registro import RegistroAcceso, LOG_ACCESO_HABILITADO
+from app.plazos import ControlPlazos, PLAZOS_HABILITADO
+from app import eventos, outbox, idempotencia, archivo, vencimientos, registro, trabajos, autocompletado
 
 # Importar routers de cada componente
-from app.routers import usuarios, proyectos, tareas
+from app.routers import usuarios, proyectos, tareas, jobs
+
+logger = logging.getLogger("app")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -23,15 +32,47 @@ async def lifespan(app: FastAPI):
     Gestión del ciclo de vida de la aplicación.
     Crea las tablas al inicio y limpia recursos al final.
     """
+    # Logging JSON a través de una cola (la escritura ocurre en un hilo aparte)
+    registro.configurar()
+    
     # Startup: Crear tablas de base de datos
     create_tables()
-    print(" Tablas de base de datos creadas/verificadas")
-    print(" API Mini Gestor de Proyectos iniciada")
+    logger.info("Tablas de base de datos creadas/verificadas")
+    
+    # Bus de eventos para el stream SSE (LISTEN/NOTIFY en PostgreSQL)
+    eventos.iniciar()
+    
+    # Despachador de webhooks del outbox (solo si WEBHOOK_URLS está configurado)
+    outbox.iniciar()
+    
+    # Purga periódica de claves Idempotency-Key expiradas
+    idempotencia.iniciar()
+    
+    # Archivado en lotes de tareas completadas antiguas
+    archivo.iniciar()
+    
+    # Escáner periódico de tareas vencidas / por vencer
+    vencimientos.iniciar()
+    
+    # Ejecutor de trabajos en segundo plano (endpoints con ?asincrono=true)
+    trabajos.iniciar()
+    
+    # Índice en memoria para el autocompletado de usuarios
+    autocompletado.iniciar()
+    logger.info("API Mini Gestor de Proyectos iniciada")
     
     yield
     
     # Shutdown: Limpiar recursos si es necesario
-    print(" API Mini Gestor de Proyectos detenida")
+    await autocompletado.detener()
+    await trabajos.detener()
+    await vencimientos.detener()
+    await archivo.detener()
+    await idempotencia.detener()
+    await outbox.detener()
+    eventos.detener()
+    logger.info("API Mini Gestor de Proyectos detenida")
+    registro.detener()
 
 # Crear instancia de FastAPI con configuración
 app = FastAPI(
@@ -76,6 +117,22 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Perfilado bajo demanda (X-Perfilar); deshabilitado no se registra y no tiene coste
+if PERFILADO_HABILITADO:
+    app.add_middleware(ControlPerfilado)
+
+# Idempotency-Key en endpoints POST: reintentos reciben la respuesta original
+app.add_middleware(ControlIdempotencia)
+
+# Plazo por sentencia según la clase de ruta y cancelación de consultas si el cliente se desconecta
+if PLAZOS_HABILITADO:
+    app.add_middleware(ControlPlazos)
+
+# Control de admisión: límites de concurrencia y tasa por clase de ruta (lecturas/escrituras)
+# Se registra antes que CORS para que los rechazos 429/503 también lleven headers CORS
+if ADMISION_HABILITADA:
+    app.add_middleware(ControlAdmision)
+
 # Configurar CORS para permitir requests desde diferentes orígenes
 # Útil para desarrollo y testing con Postman/Frontend
 app.add_middleware(
@@ -86,6 +143,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Log de acceso estructurado; se registra último para medir también los rechazos y CORS
+if LOG_ACCESO_HABILITADO:
+    app.add_middleware(RegistroAcceso)
+
 # Registrar routers de cada componente con prefijos específicos
 app.include_router(
     usuarios.router,
@@ -105,6 +166,12 @@ app.include_router(
     tags=["GestorTareas"] 
 )
 
+app.include_router(
+    jobs.router,
+    prefix="/api/v1",
+    tags=["Trabajos"]
+)
+
 # Endpoint raíz para verificación de estado
 @app.get("/", tags=["Sistema"])
 async def root():
@@ -121,7 +188,8 @@ async def root():
         "componentes": [
             "GestorUsuarios (/api/v1/usuarios)",
             "GestorProyectos (/api/v1/proyectos)", 
-            "GestorTareas (/api/v1/tareas)"
+            "GestorTareas (/api/v1/tareas)",
+            "Trabajos (/api/v1/jobs)"
         ]
     }
 
@@ -168,5 +236,6 @@ if __name__ == "__main__":
         host="0.0.0.0",  # Escuchar en todas las interfaces (necesario para Docker)
         port=8000,
         reload=True,     # Recarga automática en desarrollo
-        log_level="info"
+        log_level="info",
+        access_log=False  # Reemplazado por el log de acceso estructurado (app.registro)
     )
\ No newline at end of file
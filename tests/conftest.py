@@ -0,0 +1,23 @@
+"""
+Configuración común de las pruebas: base SQLite temporal y tareas de fondo
+desactivadas. Las variables de entorno se fijan antes de importar `app`, que
+las lee al cargarse.
+"""
+
+import os
+import sys
+import tempfile
+
+_directorio = tempfile.mkdtemp(prefix="gestor-pruebas-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directorio, 'pruebas.db')}"
+os.environ.pop("SHARD_URLS", None)
+for variable in ("ADMISION_HABILITADA", "ARCHIVO_HABILITADO", "VENCIMIENTOS_HABILITADO",
+                 "LOG_ACCESO_HABILITADO", "TRABAJOS_HABILITADO"):
+    os.environ[variable] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import models  # noqa: F401  (registra las tablas en Base.metadata)
+from app.database import create_tables
+
+create_tables()
@@ -0,0 +1,156 @@
+"""
+Despachador de webhooks (app/outbox.py) contra un receptor HTTP local:
+entrega, backoff tras un fallo, reintento solo a los destinos pendientes y dead-letter.
+"""
+
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from sqlalchemy import delete, select, update
+
+from app import outbox
+from app.database import sesion_shard
+from app.models import EventoOutbox
+
+class Receptor:
+    """Servidor HTTP en un hilo que registra los lotes recibidos por ruta."""
+
+    def __init__(self):
+        self.recibidos = {}  # ruta -> lista de listas de IDs de evento
+        self.codigos = {}    # ruta -> código de respuesta (200 por defecto)
+        receptor = self
+
+        class _Manejador(BaseHTTPRequestHandler):
+            def do_POST(self):
+                cuerpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                receptor.recibidos.setdefault(self.path, []).append(
+                    [evento["id"] for evento in cuerpo["eventos"]]
+                )
+                self.send_response(receptor.codigos.get(self.path, 200))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Manejador)
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+
+    def url(self, ruta: str) -> str:
+        return f"http://127.0.0.1:{self._servidor.server_port}{ruta}"
+
+    def cerrar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+@pytest.fixture
+def receptor():
+    receptor = Receptor()
+    yield receptor
+    receptor.cerrar()
+
+@pytest.fixture(autouse=True)
+def outbox_vacio():
+    db = sesion_shard(0)
+    try:
+        db.execute(delete(EventoOutbox))
+        db.commit()
+    finally:
+        db.close()
+
+def _encolar(*evento_ids: str):
+    db = sesion_shard(0)
+    try:
+        for evento_id in evento_ids:
+            db.add(EventoOutbox(
+                evento_id=evento_id, tipo="tarea_creada", proyecto_id=1,
+                payload=json.dumps({"id": evento_id, "tipo": "tarea_creada", "proyecto_id": 1}),
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+def _filas():
+    db = sesion_shard(0)
+    try:
+        return db.execute(select(EventoOutbox).order_by(EventoOutbox.id)).scalars().all()
+    finally:
+        db.close()
+
+def _vencer_reintentos():
+    """Adelantar los reintentos programados para no esperar el backoff."""
+    db = sesion_shard(0)
+    try:
+        db.execute(update(EventoOutbox).values(proximo_intento=datetime.now(timezone.utc) - timedelta(seconds=1)))
+        db.commit()
+    finally:
+        db.close()
+
+def _despachar(urls):
+    """Reclamar un lote y entregarlo como lo hace el bucle del despachador."""
+    async def _ejecutar():
+        lote = await asyncio.to_thread(outbox.reclamar_lote, 100, 0)
+        if lote:
+            despachador = outbox.DespachadorWebhooks(urls, 100, 1)
+            async with httpx.AsyncClient(timeout=5) as cliente:
+                await despachador._entregar_lote(cliente, lote, 0)
+        return lote
+    return asyncio.run(_ejecutar())
+
+def test_entrega_a_todos_los_destinos(receptor):
+    _encolar("e1", "e2")
+
+    lote = _despachar([receptor.url("/a"), receptor.url("/b")])
+
+    assert len(lote) == 2
+    assert receptor.recibidos == {"/a": [["e1", "e2"]], "/b": [["e1", "e2"]]}
+    assert _filas() == []
+
+def test_fallo_programa_reintento_solo_al_destino_pendiente(receptor):
+    _encolar("e1")
+    receptor.codigos["/b"] = 500
+    urls = [receptor.url("/a"), receptor.url("/b")]
+
+    antes = datetime.now(timezone.utc).replace(tzinfo=None)
+    _despachar(urls)
+
+    (fila,) = _filas()
+    assert fila.estado == "pendiente"
+    assert fila.intentos == 1
+    assert "HTTP 500" in fila.ultimo_error
+    assert json.loads(fila.destinos_entregados) == [receptor.url("/a")]
+    # Backoff de 2 s tras el primer fallo: todavía no se puede reclamar
+    assert fila.proximo_intento.replace(tzinfo=None) >= antes + timedelta(seconds=2)
+    assert _despachar(urls) == []
+
+    receptor.codigos["/b"] = 200
+    _vencer_reintentos()
+    _despachar(urls)
+
+    assert receptor.recibidos["/a"] == [["e1"]]  # Sin duplicado en el destino que ya confirmó
+    assert receptor.recibidos["/b"] == [["e1"], ["e1"]]
+    assert _filas() == []
+
+def test_dead_letter_al_agotar_los_intentos(receptor, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_INTENTOS", 3)
+    _encolar("e1")
+    receptor.codigos["/a"] = 503
+    urls = [receptor.url("/a")]
+
+    for _ in range(3):
+        _vencer_reintentos()
+        assert len(_despachar(urls)) == 1
+
+    (fila,) = _filas()
+    assert fila.estado == "descartado"
+    assert fila.intentos == 3
+    assert "HTTP 503" in fila.ultimo_error
+    _vencer_reintentos()
+    assert _despachar(urls) == []  # Los descartados no se vuelven a reclamar
+    assert len(receptor.recibidos["/a"]) == 3